@@ -0,0 +1,283 @@
+from functools import partial
+
+import numpy as np
+import scipy.sparse as sp
+
+# Solver-agnostic battery model built from sparse matrices.
+# Every constraint family is assembled as a block of T rows with scipy.sparse, then the same
+# (c, A, sense, rhs, bounds, integrality) model is emitted either to scipy's HiGHS milp, which
+# needs no license, or to the Gurobi matrix API. It uses the exact linear formulation of the
+# charge/discharge limits (see battery_model.py), with relax=True giving the LP.
+# Prices are in $/MWh as in the CSV files, demand is in kWh per period.
+
+# Variable blocks, each of length T
+VARIABLES = ('E01', 'E02', 'E10', 'E12', 'battery_power', 'y2tch', 'y2td')
+
+# Status codes, the same values as gurobipy.GRB so the scripts do not need gurobipy to check them
+OPTIMAL = 2
+INFEASIBLE = 3
+INF_OR_UNBD = 4
+UNBOUNDED = 5
+SUBOPTIMAL = 13  # a feasible solution that is not proven optimal, e.g. solve_fleet_decomposed()
+OTHER = 0
+
+SOLVERS = ('highs', 'gurobi')
+BUILDERS = ('tupledict', 'matrix')
+
+_HIGHS_STATUS = {0: OPTIMAL, 2: INFEASIBLE, 3: UNBOUNDED}
+
+
+def _block_rows(T, blocks):
+    empty = sp.csr_matrix((T, T))
+    return sp.hstack([blocks.get(name, empty) for name in VARIABLES])
+
+
+def battery_families(T, Beta_max, DC_AC_efficiency=1):
+    # (name, {variable: T x T block}, sense, rhs) of each constraint family
+    identity = sp.identity(T, format='csr')
+    previous = sp.eye(T, k=-1, format='csr')  # row t picks period t-1
+    eta = DC_AC_efficiency
+
+    return [
+        # Fulfill load demand, the right-hand side is the demand
+        ('LoadDemand', {'E02': identity, 'E12': identity}, '=', 0),
+        # ESS does not charge and discharge simultaneously
+        ('ChargeDischarge', {'y2tch': identity, 'y2td': identity}, '<', 1),
+        # ESS discharge does not exceed its current power
+        ('DischargeLimit', {'E10': identity, 'E12': identity, 'battery_power': -eta * identity}, '<', 0),
+        ('DischargeLimit_M', {'E10': identity, 'E12': identity, 'y2td': -eta * Beta_max * identity}, '<', 0),
+        # ESS charge does not exceed what’s left
+        ('ChargeLimit', {'E01': eta * identity, 'battery_power': identity}, '<', Beta_max),
+        ('ChargeLimit_M', {'E01': eta * identity, 'y2tch': -Beta_max * identity}, '<', 0),
+        # ESS min charge/discharge 1MWh
+        ('ChargeConstraint', {'E01': identity, 'y2tch': -identity}, '>', 0),
+        ('DischargeConstraint', {'E12': identity, 'y2td': -identity}, '>', 0),
+        # ESS current power is based on previous round power, row 0 is the initial power
+        ('PowerUpdate', {'battery_power': identity - previous, 'E01': -eta * previous,
+                         'E10': previous / eta, 'E12': previous / eta}, '=', 0),
+    ]
+
+
+def battery_upper_bounds(Beta_max, DC_AC_efficiency=1, resell=True):
+    # ChargeLimit_2 and the power bounds are plain variable bounds
+    return {'E01': Beta_max / DC_AC_efficiency, 'E02': np.inf, 'E10': np.inf if resell else 0, 'E12': np.inf,
+            'battery_power': Beta_max, 'y2tch': 1, 'y2td': 1}
+
+
+def build_battery_matrices(T, Beta_max, DC_AC_efficiency=1, resell=True, relax=False):
+    families = battery_families(T, Beta_max, DC_AC_efficiency)
+
+    A = sp.vstack([_block_rows(T, blocks) for _, blocks, _, _ in families], format='csr')
+    sense = np.repeat([s for _, _, s, _ in families], T)
+    rhs = np.repeat([float(r) for _, _, _, r in families], T)
+    rows = {name: np.arange(i * T, (i + 1) * T) for i, (name, _, _, _) in enumerate(families)}
+
+    upper = battery_upper_bounds(Beta_max, DC_AC_efficiency, resell)
+    lb = np.zeros(len(VARIABLES) * T)
+    ub = np.concatenate([np.full(T, upper[name], dtype=float) for name in VARIABLES])
+    integrality = np.zeros(len(VARIABLES) * T, dtype=int)
+    if not relax:
+        integrality[VARIABLES.index('y2tch') * T:(VARIABLES.index('y2td') + 1) * T] = 1
+
+    return A, sense, rhs, rows, lb, ub, integrality
+
+
+def make_battery_model(prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9, DC_AC_efficiency=1,
+                       formulation='bilinear', resell=True, solver='gurobi', name="Optimization", env=None,
+                       fast_path=False, builder=None, cache=None):
+    # builder picks the Gurobi model: 'tupledict' (battery_model.py, per-constraint) or 'matrix'
+    # (this module, the four used flows, bounds as variable bounds, bilinear through its exact
+    # linear form). The default keeps the tupledict model for the bilinear formulation only.
+    # cache is a result_cache.ResultCache or directory, None for BATTERY_CACHE or False for none.
+    from result_cache import CachedModel, get_cache
+    cache = get_cache(cache)
+    if cache is not None:
+        # Solved inputs are read from the cache, the model below is only built on a miss
+        build = partial(make_battery_model, prices, demand, Beta_max, total_battery_cost, selling_price_discount,
+                        DC_AC_efficiency, formulation, resell, solver, name, env, fast_path, builder, cache=False)
+        return CachedModel(cache, build, prices, demand, Beta_max=Beta_max, total_battery_cost=total_battery_cost,
+                           selling_price_discount=selling_price_discount, DC_AC_efficiency=DC_AC_efficiency,
+                           formulation=formulation, resell=resell, solver=solver, fast_path=fast_path)
+    if fast_path and DC_AC_efficiency == 1:
+        # Solver-free dispatch (fast_dispatch.py), the model below is only built when its assumptions fail
+        from fast_dispatch import ArbitrageModel
+        fallback = partial(make_battery_model, prices, demand, Beta_max, total_battery_cost, selling_price_discount,
+                           DC_AC_efficiency, formulation, resell, solver, name, env, builder=builder, cache=False)
+        return ArbitrageModel(prices, demand, Beta_max, total_battery_cost, selling_price_discount, resell, fallback)
+    if builder is None:
+        builder = 'tupledict' if formulation == 'bilinear' else 'matrix'
+    if builder not in BUILDERS:
+        raise ValueError(f"Unknown builder {builder!r}, expected one of {BUILDERS}")
+    if solver == 'gurobi' and builder == 'tupledict':
+        # gurobipy is only imported when the Gurobi model is used
+        from battery_model import BatteryModel
+        return BatteryModel(prices, demand, Beta_max, total_battery_cost, selling_price_discount, DC_AC_efficiency,
+                            formulation, resell, name, env)
+    # HiGHS only takes the matrix model, the bilinear formulation is solved through its exact linear form
+    return MatrixBatteryModel(prices, demand, Beta_max, total_battery_cost, selling_price_discount, DC_AC_efficiency,
+                              formulation == 'lp', resell, solver, name, env)
+
+
+class MatrixModel:
+    # (c, A, sense, rhs, lb, ub, integrality) model solved by HiGHS or Gurobi.
+    # Subclasses build the matrices, fill in c and rhs and call push_data() after changing them.
+
+    def __init__(self, objective_constant=0, solver='highs', name="Optimization", env=None):
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver!r}, expected one of {SOLVERS}")
+        self.objective_constant = objective_constant
+        self.solver = solver
+        self.name = name
+        self.env = env
+        self.Status = OTHER
+        self.objVal = None
+        self.solution_x = None
+        self.highs_result = None
+        self.gurobi_model = None
+        self.gurobi_vars = None
+        self.gurobi_constrs = None
+        self.gurobi_params = {}
+
+    def set_param(self, name, value):
+        # Gurobi parameter, kept until the Gurobi model is built, HiGHS milp ignores them
+        self.gurobi_params[name] = value
+        if self.gurobi_model is not None:
+            self.gurobi_model.setParam(name, value)
+
+    def push_data(self):
+        if self.gurobi_model is not None:
+            self.gurobi_vars.Obj = self.c
+            self.gurobi_vars.UB = self.ub
+            self.gurobi_model.setAttr('RHS', self.gurobi_constrs.tolist(), self.rhs.tolist())
+
+    def set_coefficients(self, A):
+        # New values for a matrix with the same sparsity pattern, only the changed ones are sent to Gurobi
+        A = sp.csr_matrix(A)
+        if not (np.array_equal(A.indptr, self.A.indptr) and np.array_equal(A.indices, self.A.indices)):
+            raise ValueError("The new matrix must have the same sparsity pattern")
+        if self.gurobi_model is not None:
+            rows = np.repeat(np.arange(A.shape[0]), np.diff(A.indptr))
+            constrs, variables = self.gurobi_constrs.tolist(), self.gurobi_vars.tolist()
+            for k in np.nonzero(A.data != self.A.data)[0]:
+                self.gurobi_model.chgCoeff(constrs[rows[k]], variables[A.indices[k]], A.data[k])
+        self.A = A
+
+    def optimize(self):
+        if self.solver == 'highs':
+            self._optimize_highs()
+        else:
+            self._optimize_gurobi()
+        return self.Status
+
+    def _optimize_highs(self):
+        from scipy.optimize import Bounds, LinearConstraint, milp
+
+        row_lower = np.where(self.sense == '<', -np.inf, self.rhs)
+        row_upper = np.where(self.sense == '>', np.inf, self.rhs)
+        result = milp(self.c, integrality=self.integrality, bounds=Bounds(self.lb, self.ub),
+                      constraints=LinearConstraint(self.A, row_lower, row_upper))
+        self.highs_result = result
+
+        self.Status = _HIGHS_STATUS.get(result.status, OTHER)
+        if self.Status == OPTIMAL:
+            self.solution_x = result.x
+            self.objVal = result.fun + self.objective_constant
+
+    def build_gurobi(self):
+        # One addMVar and one addMConstr call for the whole model, done on the first Gurobi solve
+        import gurobipy as gp
+
+        model = gp.Model(self.name, env=self.env) if self.env is not None else gp.Model(self.name)
+        model.setParam('OutputFlag', False)
+        for param, value in self.gurobi_params.items():
+            model.setParam(param, value)
+        vtype = np.where(self.integrality == 1, gp.GRB.BINARY, gp.GRB.CONTINUOUS)
+        self.gurobi_vars = model.addMVar(len(self.c), lb=self.lb, ub=self.ub, vtype=vtype, obj=self.c)
+        model.ObjCon = self.objective_constant
+        self.gurobi_constrs = model.addMConstr(self.A, self.gurobi_vars, self.sense, self.rhs)
+        model.update()
+        self.gurobi_model = model
+        return model
+
+    def _optimize_gurobi(self):
+        if self.gurobi_model is None:
+            self.build_gurobi()
+
+        self.gurobi_model.optimize()
+        self.Status = self.gurobi_model.Status
+        if self.gurobi_model.SolCount > 0:
+            self.solution_x = self.gurobi_vars.X
+            self.objVal = self.gurobi_model.ObjVal
+
+
+class MatrixBatteryModel(MatrixModel):
+
+    def __init__(self, prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9,
+                 DC_AC_efficiency=1, relax=False, resell=True, solver='highs', name="Optimization", env=None):
+        if relax and DC_AC_efficiency != 1:
+            raise ValueError("The LP formulation is only exact when DC_AC_efficiency is 1")
+        super().__init__(total_battery_cost, solver, name, env)
+
+        self.T = T = len(prices)
+        self.Beta_max = Beta_max
+        self.DC_AC_efficiency = DC_AC_efficiency
+        self.selling_price_discount = selling_price_discount
+        self.resell = resell
+        self.relax = relax
+        self.A, self.sense, self.rhs, self.rows, self.lb, self.ub, self.integrality = build_battery_matrices(
+            T, Beta_max, DC_AC_efficiency, resell, relax)
+        self.c = np.zeros(len(VARIABLES) * T)
+
+        self.update(prices, demand)
+
+    def _block(self, name):
+        i = VARIABLES.index(name)
+        return slice(i * self.T, (i + 1) * self.T)
+
+    def update(self, prices=None, demand=None, initial_power=None):
+        if prices is not None:
+            self.price_kwh = price_kwh = np.asarray(prices, dtype=float)[:self.T] / 1000
+            self.c[self._block('E01')] = price_kwh
+            self.c[self._block('E02')] = price_kwh
+            self.c[self._block('E10')] = -self.selling_price_discount * price_kwh
+        if demand is not None:
+            self.rhs[self.rows['LoadDemand']] = np.broadcast_to(np.asarray(demand, dtype=float), (self.T,))
+        if initial_power is not None:
+            self.rhs[self.rows['PowerUpdate'][0]] = initial_power
+        self.push_data()
+
+    def set_battery(self, Beta_max=None, DC_AC_efficiency=None, selling_price_discount=None, total_battery_cost=None):
+        # Resize the battery in place, the sparsity pattern of the model does not depend on it
+        if Beta_max is not None or DC_AC_efficiency is not None:
+            self.Beta_max = self.Beta_max if Beta_max is None else Beta_max
+            self.DC_AC_efficiency = self.DC_AC_efficiency if DC_AC_efficiency is None else DC_AC_efficiency
+            if self.relax and self.DC_AC_efficiency != 1:
+                raise ValueError("The LP formulation is only exact when DC_AC_efficiency is 1")
+            A, _, rhs, _, _, self.ub, _ = build_battery_matrices(self.T, self.Beta_max, self.DC_AC_efficiency,
+                                                                 self.resell, self.relax)
+            self.set_coefficients(A)
+            self.rhs[self.rows['ChargeLimit']] = rhs[self.rows['ChargeLimit']]
+        if selling_price_discount is not None:
+            self.selling_price_discount = selling_price_discount
+            self.c[self._block('E10')] = -selling_price_discount * self.price_kwh
+        if total_battery_cost is not None:
+            self.objective_constant = total_battery_cost
+            if self.gurobi_model is not None:
+                self.gurobi_model.ObjCon = total_battery_cost
+        self.push_data()
+
+    def shift_start(self, periods):
+        # Move the previous solution `periods` steps earlier as the Gurobi MIP start for the next
+        # rolling-horizon window, HiGHS milp takes no start
+        if self.gurobi_model is None or self.solution_x is None:
+            return
+        x = self.solution_x.reshape(-1, self.T)
+        shifted = np.zeros_like(x)
+        shifted[:, :self.T - periods] = x[:, periods:]
+        self.gurobi_vars.Start = shifted.ravel()
+
+    def solution(self):
+        blocks = {name: self.solution_x[self._block(name)] for name in VARIABLES}
+        E = np.zeros((3, 3, self.T))
+        E[0, 1], E[0, 2], E[1, 0], E[1, 2] = blocks['E01'], blocks['E02'], blocks['E10'], blocks['E12']
+        return {'battery_power': blocks['battery_power'], 'y2tch': blocks['y2tch'], 'y2td': blocks['y2td'], 'E': E}
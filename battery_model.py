@@ -0,0 +1,147 @@
+import numpy as np
+from gurobipy import Model, GRB
+
+# Charge/discharge/resell battery model (m1/m2 formulation) that is built once and re-solved.
+# Between solves only the sampled data changes: the LoadDemand right-hand sides and the
+# price coefficients of the objective. The previous solution is passed as a MIP start.
+# Prices are in $/MWh as in the CSV files, demand is in kWh per period.
+#
+# formulation selects how the binary charge/discharge states enter the model:
+#   'bilinear' - the original constraints, battery_power * y2td etc. (nonconvex MIQCP)
+#   'linear'   - exact big-M reformulation bounded by Beta_max (MILP)
+#   'lp'       - 'linear' with y2tch/y2td relaxed to [0, 1], only allowed when DC_AC_efficiency == 1 (LP)
+# With resell=False the ESS cannot discharge to the grid, as in m0.
+
+FORMULATIONS = ('bilinear', 'linear', 'lp')
+
+
+class BatteryModel:
+
+    def __init__(self, prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9,
+                 DC_AC_efficiency=1, formulation='bilinear', resell=True, name="Optimization", env=None):
+        if formulation not in FORMULATIONS:
+            raise ValueError(f"Unknown formulation {formulation!r}, expected one of {FORMULATIONS}")
+        if formulation == 'lp' and DC_AC_efficiency != 1:
+            raise ValueError("The LP formulation is only exact when DC_AC_efficiency is 1")
+
+        self.T = T = len(prices)
+        self.Beta_max = Beta_max
+        self.selling_price_discount = selling_price_discount
+        self.DC_AC_efficiency = DC_AC_efficiency
+        self.formulation = formulation
+        self.start = None
+        self.solution_vars = None
+
+        model = Model(name, env=env) if env is not None else Model(name)
+        model.setParam('OutputFlag', False)
+        self.model = model
+
+        # ----------------------------------------------------------------
+        E = model.addVars(3, 3, T, name="E")  # Energy variables Eijt
+        y_type = GRB.CONTINUOUS if formulation == 'lp' else GRB.BINARY
+        y2tch = model.addVars(T, vtype=y_type, ub=1, name="y2tch")  # Binary variables for ESS charge state
+        y2td = model.addVars(T, vtype=y_type, ub=1, name="y2td")  # Binary variables for ESS discharge state
+        # ESS power does not exceed its max capacity and is non-negative, as variable bounds
+        battery_power = model.addVars(T, ub=Beta_max, name="battery_power")  # Current power of ESS
+        for t in range(T):
+            E[0, 1, t].UB = Beta_max / DC_AC_efficiency  # ChargeLimit_2
+            if not resell:
+                E[1, 0, t].UB = 0
+        self.E, self.y2tch, self.y2td, self.battery_power = E, y2tch, y2td, battery_power
+
+        # ----------------------------------------------------------------
+        # Price coefficients are set in update(), the battery cost is the objective constant
+        model.ModelSense = GRB.MINIMIZE
+        model.ObjCon = total_battery_cost
+
+        # ----------------------------------------------------------------
+        # Fulfill load demand, right-hand sides are set in update()
+        self.load_demand = model.addConstrs((E[0, 2, t] + E[1, 2, t] == 0 for t in range(T)), "LoadDemand")
+
+        # ESS does not charge and discharge simultaneously
+        model.addConstrs((y2tch[t] + y2td[t] <= 1 for t in range(T)), "ChargeDischarge")
+
+        # ESS discharge does not exceed its current power
+        # ESS charge does not exceed what’s left
+        if formulation == 'bilinear':
+            model.addConstrs((E[1, 2, t] + E[1, 0, t] <= DC_AC_efficiency * battery_power[t] * y2td[t] for t in range(T)), "DischargeLimit")
+            model.addConstrs((DC_AC_efficiency * E[0, 1, t] <= (Beta_max - battery_power[t]) * y2tch[t] for t in range(T)), "ChargeLimit")
+        else:
+            # x <= b * y with 0 <= b <= Beta_max and y binary is x <= b together with x <= Beta_max * y
+            model.addConstrs((E[1, 2, t] + E[1, 0, t] <= DC_AC_efficiency * battery_power[t] for t in range(T)), "DischargeLimit")
+            model.addConstrs((E[1, 2, t] + E[1, 0, t] <= DC_AC_efficiency * Beta_max * y2td[t] for t in range(T)), "DischargeLimit_M")
+            model.addConstrs((DC_AC_efficiency * E[0, 1, t] <= Beta_max - battery_power[t] for t in range(T)), "ChargeLimit")
+            model.addConstrs((DC_AC_efficiency * E[0, 1, t] <= Beta_max * y2tch[t] for t in range(T)), "ChargeLimit_M")
+
+        # ESS min charge/discharge 1MWh
+        model.addConstrs((E[0, 1, t] >= y2tch[t] for t in range(T)), "ChargeConstraint")
+        model.addConstrs((E[1, 2, t] >= y2td[t] for t in range(T)), "DischargeConstraint")
+
+        # ESS current power is based on previous round power
+        # The limits above already force the flows to 0 when y is 0, so the linear forms drop the products
+        for t in range(1, T):
+            if formulation == 'bilinear':
+                model.addConstr(battery_power[t] == battery_power[t-1] - (E[1, 2, t-1] + E[1, 0, t-1]) * y2td[t-1] / DC_AC_efficiency +
+                                DC_AC_efficiency * E[0, 1, t-1] * y2tch[t-1], "PowerUpdate")
+            else:
+                model.addConstr(battery_power[t] == battery_power[t-1] - (E[1, 2, t-1] + E[1, 0, t-1]) / DC_AC_efficiency +
+                                DC_AC_efficiency * E[0, 1, t-1], "PowerUpdate")
+
+        # Battery fully discharged at t=1, update(initial_power=...) carries a state in instead
+        self.initial_discharge = model.addConstr(battery_power[0] == 0, "InitialDischarge")
+
+        self.update(prices, demand)
+
+    def set_param(self, name, value):
+        self.model.setParam(name, value)
+
+    def update(self, prices=None, demand=None, initial_power=None):
+        T = self.T
+        if prices is not None:
+            price_kwh = np.asarray(prices, dtype=float)[:T] / 1000
+            buy = [self.E[0, 2, t] for t in range(T)] + [self.E[0, 1, t] for t in range(T)]
+            sell = [self.E[1, 0, t] for t in range(T)]
+            self.model.setAttr('Obj', buy + sell,
+                               np.concatenate([price_kwh, price_kwh, -self.selling_price_discount * price_kwh]).tolist())
+        if demand is not None:
+            demand = np.broadcast_to(np.asarray(demand, dtype=float), (T,))
+            self.model.setAttr('RHS', [self.load_demand[t] for t in range(T)], demand.tolist())
+        if initial_power is not None:
+            self.initial_discharge.RHS = initial_power
+
+    @property
+    def Status(self):
+        return self.model.Status
+
+    @property
+    def objVal(self):
+        return self.model.objVal
+
+    def shift_start(self, periods):
+        # Move the MIP start `periods` steps earlier for the next rolling-horizon window.
+        # Every variable group is T long with t last, the freed tail starts idle.
+        if self.start is None:
+            return
+        start = np.array(self.start).reshape(-1, self.T)
+        shifted = np.zeros_like(start)
+        shifted[:, :self.T - periods] = start[:, periods:]
+        self.start = shifted.ravel().tolist()
+
+    def optimize(self):
+        model = self.model
+        if self.start is not None:
+            model.setAttr('Start', model.getVars(), self.start)
+        model.optimize()
+        if model.SolCount > 0:
+            self.start = model.getAttr('X', model.getVars())
+        return model.Status
+
+    def solution(self):
+        # All values in one getAttr call, in the order battery_power, y2tch, y2td, E[i,j]
+        T = self.T
+        if self.solution_vars is None:
+            self.solution_vars = ([self.battery_power[t] for t in range(T)] + [self.y2tch[t] for t in range(T)]
+                                  + [self.y2td[t] for t in range(T)]
+                                  + [self.E[i, j, t] for i in range(3) for j in range(3) for t in range(T)])
+        x = np.array(self.model.getAttr('X', self.solution_vars)).reshape(12, T)
+        return {'battery_power': x[0], 'y2tch': x[1], 'y2td': x[2], 'E': x[3:].reshape(3, 3, T)}
@@ -0,0 +1,205 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import resource
+import subprocess
+import time
+import tracemalloc
+
+import numpy as np
+
+from battery_matrix import OPTIMAL, make_battery_model
+from dp_engine import charge_discharge_actions, resell_actions, solve
+from price_store import select_prices
+
+# Benchmark of model build, solve and result extraction for every model and solver path.
+# Each (case, path, T, samples) point runs once to warm up, then `repeat` times. Timings are
+# the best and median run, and peak memory is the tracemalloc peak of one extra run (Python
+# and numpy allocations, not the solver's own memory). Every run appends one record per point
+# to the history file, and points more than `threshold` slower than the last record on the
+# same machine are reported.
+#
+#   python benchmark.py --periods 48 336 --samples 1 10 --paths fast highs:linear
+#
+# Cases: m0, m1, m1_demand (demand samples), m2 (price samples), dp (dynamic_programming.py)
+# and m3 (m3_dp_resell_48.py). Paths apply to m0-m2: 'fast' (solver-free dispatch) or
+# 'solver:formulation[:builder]'. The DP cases have one path and ignore the sample count.
+
+PRICE_FILES = {24: './data/USEP_08Nov2023.csv', 48: './data/USEP_08Nov2023.csv',
+               336: './data/USEP_08Nov2023_to_14Nov2023.csv', 1488: './data/WEP_10Oct2023_to_09Nov2023.csv'}
+CASES = ('m0', 'm1', 'm1_demand', 'm2', 'dp', 'm3')
+PATHS = ('fast', 'highs:linear', 'gurobi:linear', 'gurobi:linear:tupledict', 'gurobi:bilinear')
+PHASES = ('build', 'solve', 'extract')
+
+Ed = 111.87 * 0.5
+Beta_max = 150
+battery_cost = 11.35
+consumption_std_dev = 4.93
+price_rmse = 40.0  # $/MWh, about the m2 forecast error
+
+
+def load_prices(T):
+    return select_prices(PRICE_FILES[T], 'USEP', unit='MWh')[:T]
+
+
+# ----------------------------------------------------------------
+# Cases, each returns the seconds spent in every phase
+
+def _milp_case(case, path, prices, samples, seed=2023):
+    solver, formulation, builder = (path.split(':') + [None, None])[:3]
+    T = len(prices)
+    resell = case != 'm0'
+    times = dict.fromkeys(PHASES, 0.0)
+
+    start = time.perf_counter()
+    battery_model = make_battery_model(prices, Ed, Beta_max, battery_cost, 0.9 if resell else 0, 1,
+                                       formulation or 'linear', resell, 'highs' if solver == 'fast' else solver,
+                                       fast_path=solver == 'fast', builder=builder, cache=False)
+    if solver == 'gurobi' and hasattr(battery_model, 'build_gurobi'):
+        battery_model.build_gurobi()
+    times['build'] = time.perf_counter() - start
+
+    rng = np.random.default_rng(seed)
+    for _ in range(samples if case in ('m1_demand', 'm2') else 1):
+        start = time.perf_counter()
+        if case == 'm1_demand':
+            battery_model.update(demand=rng.normal(Ed, consumption_std_dev, T))
+        elif case == 'm2':
+            battery_model.update(prices=rng.normal(prices, price_rmse))
+        if battery_model.optimize() != OPTIMAL:
+            raise RuntimeError(f"Solve ended with status {battery_model.Status}")
+        times['solve'] += time.perf_counter() - start
+
+        start = time.perf_counter()
+        battery_model.solution()
+        times['extract'] += time.perf_counter() - start
+    return times
+
+
+def _dp_case(case, path, prices, samples):
+    T = len(prices)
+    times = dict.fromkeys(PHASES, 0.0)
+
+    start = time.perf_counter()
+    if case == 'dp':
+        demand = np.random.default_rng(2023).normal(111.87, 9.86, T)
+        actions, n_states = charge_discharge_actions(Beta_max, 0.5, 1.41), 1501
+    else:
+        demand = np.full(T, Ed)
+        actions, n_states = resell_actions(Beta_max, 0.9), 2
+    times['build'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solve(prices / 1000, demand, actions, Beta_max, n_states)
+    times['solve'] = time.perf_counter() - start
+    return times
+
+
+def run_case(case, path, prices, samples):
+    if case in ('dp', 'm3'):
+        return _dp_case(case, path, prices, samples)
+    return _milp_case(case, path, prices, samples)
+
+
+def measure(case, path, prices, samples, repeat=3):
+    run_case(case, path, prices, samples)  # warm-up, lazy imports and caches
+    runs = [run_case(case, path, prices, samples) for _ in range(repeat)]
+    record = {}
+    for phase in PHASES + ('total',):
+        seconds = [sum(run.values()) if phase == 'total' else run[phase] for run in runs]
+        record[phase] = {'min': min(seconds), 'median': float(np.median(seconds))}
+
+    tracemalloc.start()
+    run_case(case, path, prices, samples)
+    record['peak_memory_mb'] = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    return record
+
+
+# ----------------------------------------------------------------
+# History
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def read_history(file_path):
+    if not os.path.exists(file_path):
+        return []
+    with open(file_path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def _key(record):
+    return record['machine'], record['case'], record['path'], record['T'], record['samples']
+
+
+def regressions(records, history, threshold=0.2):
+    # (record, previous record, ratio) of the points slower than the last successful run of the same point
+    previous = {_key(record): record for record in history if 'error' not in record}
+    slower = []
+    for record in records:
+        last = previous.get(_key(record))
+        if last is None or 'error' in record:
+            continue
+        ratio = record['total']['median'] / max(last['total']['median'], 1e-9)
+        if ratio > 1 + threshold:
+            slower.append((record, last, ratio))
+    return slower
+
+
+def run_benchmarks(cases=CASES, paths=PATHS, periods=(24, 48, 336, 1488), samples=(1, 10), repeat=3,
+                   history_file='./data/benchmark_history.jsonl', threshold=0.2):
+    stamp = {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'commit': _commit(),
+             'machine': platform.node(), 'python': platform.python_version()}
+    history = read_history(history_file)
+    records = []
+    for case, T in itertools.product(cases, periods):
+        prices = load_prices(T)
+        case_paths = ('dp',) if case in ('dp', 'm3') else paths
+        case_samples = samples if case in ('m1_demand', 'm2') else (1,)
+        for path, n in itertools.product(case_paths, case_samples):
+            record = dict(stamp, case=case, path=path, T=T, samples=n)
+            try:
+                record.update(measure(case, path, prices, n, repeat))
+                print(f"{case:10} {path:24} T={T:<5} samples={n:<4} total {record['total']['median']:9.4f} s  "
+                      f"build {record['build']['median']:.4f}  solve {record['solve']['median']:.4f}  "
+                      f"extract {record['extract']['median']:.4f}  peak {record['peak_memory_mb']:.1f} MB")
+            except Exception as error:  # e.g. a size-limited Gurobi license
+                record['error'] = f"{type(error).__name__}: {error}"
+                print(f"{case:10} {path:24} T={T:<5} samples={n:<4} failed: {record['error']}")
+            records.append(record)
+
+    if history_file:
+        with open(history_file, 'a') as f:
+            for record in records:
+                f.write(json.dumps(record) + '\n')
+    for record, last, ratio in regressions(records, history, threshold):
+        print(f"Regression: {record['case']} {record['path']} T={record['T']} samples={record['samples']} "
+              f"{ratio:.2f}x slower than {last['commit']} ({last['timestamp']})")
+    print(f"Max resident memory {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} MB")
+    return records
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the battery models")
+    parser.add_argument('--cases', nargs='+', default=CASES, choices=CASES)
+    parser.add_argument('--paths', nargs='+', default=PATHS)
+    parser.add_argument('--periods', nargs='+', type=int, default=(24, 48, 336, 1488), choices=sorted(PRICE_FILES))
+    parser.add_argument('--samples', nargs='+', type=int, default=(1, 10))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--history', default='./data/benchmark_history.jsonl', help="history file, '' for none")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative slowdown reported as a regression")
+    args = parser.parse_args(argv)
+    run_benchmarks(args.cases, args.paths, args.periods, args.samples, args.repeat, args.history, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
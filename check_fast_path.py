@@ -0,0 +1,69 @@
+import csv
+import glob
+
+import numpy as np
+
+from battery_matrix import MatrixBatteryModel
+from dp_engine import resell_actions, solve
+from fast_dispatch import arbitrage_schedule
+from price_store import select_prices
+
+# Check the solver-free fast paths against the stored model outputs and against the solver
+# (LP formulation, exact with DC_AC_efficiency 1) on every day of every price file in data/.
+
+T = 48  # 1 day, every 30 minutes
+Ed = 111.87 * 0.5
+Beta_max = 150
+total_battery_cost = 11.35
+selling_price_discount = 0.9
+tolerance = 1e-6
+
+mismatches = 0
+
+
+def check(name, ok):
+    global mismatches
+    mismatches += not ok
+    print(f"{name}: {'ok' if ok else 'MISMATCH'}")
+
+
+def read_output(file_path):
+    with open(file_path, newline='') as csv_file:
+        rows = list(csv.reader(csv_file))
+    return rows[0], rows[1:]
+
+
+# 1. m0/m1 outputs: Time, Electricity Price, Battery Power, ESS Charge, ESS Discharge, E[i,j]
+ctb = select_prices('./data/USEP_08Nov2023.csv', 'USEP', unit='MWh')
+for file_path, resell in (('./data/m0_output_data_48.csv', False), ('./data/m1_output_data_48.csv', True)):
+    _, rows = read_output(file_path)
+    stored = np.array(rows, dtype=float)
+    cost, solution = arbitrage_schedule(ctb, Ed, Beta_max, total_battery_cost, selling_price_discount, resell)
+    fast = np.column_stack([np.arange(T), ctb / 1000, solution['battery_power'], solution['y2tch'], solution['y2td'],
+                            solution['E'].reshape(9, T).T])
+    check(f"{file_path} (cost {cost})", np.allclose(fast, stored, atol=tolerance))
+
+# 2. m3 output: the 2-level DP against the stored 1501-level run
+_, rows = read_output('./data/m3_dp_resell_48.csv')
+prices = select_prices('./data/USEP_08Nov2023.csv', 'USEP')
+min_cost, decisions, levels = solve(prices, [Ed] * T, resell_actions(Beta_max, selling_price_discount), Beta_max, 2)
+check('./data/m3_dp_resell_48.csv', decisions == [row[3] for row in rows]
+      and np.allclose(levels, [float(row[2]) for row in rows]))
+
+# 3. Every day of every price file, with and without resell
+for file_path in sorted(glob.glob('./data/USEP_*.csv') + glob.glob('./data/WEP_*.csv')):
+    column = 'WEP' if '/WEP_' in file_path else 'USEP'
+    prices = select_prices(file_path, column, unit='MWh')
+
+    for day in range(len(prices) // T):
+        ctb = prices[day * T:(day + 1) * T]
+        for resell in (False, True):
+            result = arbitrage_schedule(ctb, Ed, Beta_max, total_battery_cost, selling_price_discount, resell)
+            battery_model = MatrixBatteryModel(ctb, Ed, Beta_max, total_battery_cost, selling_price_discount,
+                                               relax=True, resell=resell)
+            battery_model.optimize()
+            check(f"{file_path} day {day} resell {resell}",
+                  result is not None and abs(result[0] - battery_model.objVal) <= tolerance * abs(battery_model.objVal))
+
+print(f'Mismatches: {mismatches}')
+assert mismatches == 0
@@ -0,0 +1,47 @@
+import glob
+
+from battery_model import BatteryModel
+from price_store import select_prices
+
+# Check that the linear formulations give the same objective as the original bilinear one
+# on every day of every price file in data/.
+
+T = 48  # 1 day, every 30 minutes
+Ed = 111.87 * 0.5
+Beta_max = 150
+total_battery_cost = 11.35
+selling_price_discount = 0.9
+tolerance = 1e-6
+
+cases = [
+    # (name, DC_AC_efficiency, resell)
+    ('m0', 1, False),
+    ('m1', 1, True),
+    ('m1 efficiency', 0.94, True),
+]
+
+mismatches = 0
+for file_path in sorted(glob.glob('./data/USEP_*.csv') + glob.glob('./data/WEP_*.csv')):
+    column = 'WEP' if '/WEP_' in file_path else 'USEP'
+    prices = select_prices(file_path, column, unit='MWh').tolist()
+
+    for day in range(len(prices) // T):
+        ctb = prices[day * T:(day + 1) * T]
+        for name, DC_AC_efficiency, resell in cases:
+            objective = {}
+            for formulation in ('bilinear', 'linear', 'lp'):
+                if formulation == 'lp' and DC_AC_efficiency != 1:
+                    continue
+                battery_model = BatteryModel(ctb, Ed, Beta_max, total_battery_cost, selling_price_discount,
+                                             DC_AC_efficiency, formulation, resell)
+                battery_model.model.setParam('MIPGap', 0)
+                battery_model.optimize()
+                objective[formulation] = battery_model.model.objVal
+
+            difference = max(objective.values()) - min(objective.values())
+            status = 'ok' if difference <= tolerance * abs(objective['bilinear']) else 'MISMATCH'
+            mismatches += status != 'ok'
+            print(f"{file_path} day {day} {name}: {objective} {status}")
+
+print(f'Mismatches: {mismatches}')
+assert mismatches == 0
@@ -0,0 +1,31 @@
+import time
+
+from battery_matrix import MatrixBatteryModel
+from price_store import select_prices
+
+# Side-by-side solve times of the same sparse-matrix battery model on HiGHS and Gurobi,
+# one solve per day of the week price file.
+
+T = 48  # 1 day, every 30 minutes
+Ed = 111.87 * 0.5
+Beta_max = 150
+total_battery_cost = 11.35
+selling_price_discount = 0.9
+DC_AC_efficiency = 0.94
+
+prices = select_prices('./data/USEP_08Nov2023_to_14Nov2023.csv', 'USEP', unit='MWh').tolist()
+days = len(prices) // T
+
+for solver in ('highs', 'gurobi'):
+    try:
+        start = time.perf_counter()
+        objective = []
+        for day in range(days):
+            battery_model = MatrixBatteryModel(prices[day * T:(day + 1) * T], Ed, Beta_max, total_battery_cost,
+                                               selling_price_discount, DC_AC_efficiency, solver=solver)
+            battery_model.optimize()
+            objective.append(round(battery_model.objVal, 4))
+        elapsed = time.perf_counter() - start
+        print(f"{solver}: {days} solves in {elapsed:.3f} s ({elapsed / days * 1000:.1f} ms per solve), objectives {objective}")
+    except ImportError:
+        print(f"{solver}: not installed")
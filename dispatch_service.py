@@ -0,0 +1,205 @@
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from battery_matrix import OPTIMAL, make_battery_model
+from price_store import select_prices
+
+# Long-running dispatch service: one battery model (and one Gurobi Env) is built at start-up
+# and kept warm, every request only updates prices, demand and the current battery level and
+# re-solves from the previous solution. The latest price curve stays in memory, so a request
+# may send new prices, new demand, the battery level, or any of them.
+#
+#   POST /dispatch  {"prices": [...] ($/MWh), "demand": x or [...], "battery_level": kWh}
+#   POST /prices    {"prices": [...]}, replaces the price curve without solving
+#   GET  /schedule  last schedule
+#   GET  /stats     request counts, latency (ms) and throughput
+#
+#   python dispatch_service.py --prices ./data/USEP_08Nov2023.csv --solver highs --port 8050
+
+
+class DispatchService:
+
+    def __init__(self, prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9,
+                 DC_AC_efficiency=1, formulation='linear', resell=True, solver='gurobi', fast_path=True,
+                 latency_window=1000):
+        self.env = None
+        if solver == 'gurobi':
+            import gurobipy as gp
+
+            self.env = gp.Env(params={'OutputFlag': 0})
+        self.prices = np.asarray(prices, dtype=float)
+        self.T = len(self.prices)
+        self.demand = np.broadcast_to(np.asarray(demand, dtype=float), (self.T,))
+        self.battery_level = 0
+        self.Beta_max = Beta_max
+        self.battery_model = make_battery_model(self.prices, self.demand, Beta_max, total_battery_cost,
+                                                selling_price_discount, DC_AC_efficiency, formulation, resell,
+                                                solver, name="Dispatch", env=self.env, fast_path=fast_path)
+        self.schedule = None
+        self.lock = threading.Lock()
+
+        self.started = time.perf_counter()
+        self.counts = {'requests': 0, 'solves': 0, 'failures': 0, 'price_updates': 0}
+        self.latency = deque(maxlen=latency_window)  # seconds, most recent solves
+
+    def _check_periods(self, values, name, scalar=False):
+        # (T,) finite floats from a list of at least T periods, or from a number when scalar is
+        # allowed, ValueError otherwise. Nothing is stored before every input of a request passed
+        try:
+            values = np.asarray(values, dtype=float)
+        except TypeError:
+            raise ValueError(f"{name} must be numbers") from None
+        if values.ndim == 0 and scalar:
+            values = np.full(self.T, float(values))
+        elif values.ndim != 1:
+            raise ValueError(f"{name} must be a list of {self.T} periods{' or a number' if scalar else ''}")
+        elif len(values) < self.T:
+            raise ValueError(f"{name} has {len(values)} periods, the model needs {self.T}")
+        values = values[:self.T]
+        if not np.all(np.isfinite(values)):
+            raise ValueError(f"{name} must be finite")
+        return values
+
+    def set_prices(self, prices):
+        # Number of price updates so far, read under the lock with the update
+        prices = self._check_periods(prices, 'prices')
+        with self.lock:
+            self.prices = prices
+            self.counts['price_updates'] += 1
+            return self.counts['price_updates']
+
+    def dispatch(self, prices=None, demand=None, battery_level=None):
+        if prices is not None:
+            prices = self._check_periods(prices, 'prices')
+        if demand is not None:
+            demand = self._check_periods(demand, 'demand', scalar=True)
+        if battery_level is not None:
+            try:
+                battery_level = float(battery_level)
+            except TypeError:
+                raise ValueError("battery_level must be a number") from None
+            if not 0 <= battery_level <= self.Beta_max:
+                raise ValueError(f"battery_level {battery_level:g} is outside [0, {self.Beta_max:g}] kWh")
+        with self.lock:
+            self.counts['requests'] += 1
+            if prices is not None:
+                self.prices = prices
+                self.counts['price_updates'] += 1
+            if demand is not None:
+                self.demand = demand
+            if battery_level is not None:
+                self.battery_level = battery_level
+
+            start = time.perf_counter()
+            self.battery_model.update(self.prices, self.demand, self.battery_level)
+            status = self.battery_model.optimize()
+            if status != OPTIMAL:
+                self.counts['failures'] += 1
+                self.latency.append(time.perf_counter() - start)
+                return {'status': status}
+            solution = self.battery_model.solution()
+            self.latency.append(time.perf_counter() - start)
+            self.counts['solves'] += 1
+
+            self.schedule = {'status': status, 'objVal': self.battery_model.objVal,
+                             'latency_ms': self.latency[-1] * 1000,
+                             **{name: np.asarray(value).tolist() for name, value in solution.items()}}
+            return self.schedule
+
+    def stats(self):
+        with self.lock:
+            latency = np.array(self.latency) * 1000
+            uptime = time.perf_counter() - self.started
+            stats = dict(self.counts, uptime_s=uptime, requests_per_s=self.counts['requests'] / uptime)
+        if len(latency):
+            stats['latency_ms'] = {'mean': float(latency.mean()), 'p50': float(np.percentile(latency, 50)),
+                                   'p95': float(np.percentile(latency, 95)), 'max': float(latency.max())}
+        return stats
+
+
+# ----------------------------------------------------------------
+# HTTP
+
+def make_handler(service):
+
+    class DispatchHandler(BaseHTTPRequestHandler):
+
+        def _reply(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == '/stats':
+                self._reply(200, service.stats())
+            elif self.path == '/schedule':
+                self._reply(200, service.schedule) if service.schedule else self._reply(404, {'error': 'no schedule'})
+            else:
+                self._reply(404, {'error': f'unknown path {self.path}'})
+
+        def do_POST(self):
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                if self.path == '/dispatch':
+                    self._reply(200, service.dispatch(request.get('prices'), request.get('demand'),
+                                                      request.get('battery_level')))
+                elif self.path == '/prices':
+                    self._reply(200, {'price_updates': service.set_prices(request['prices'])})
+                else:
+                    self._reply(404, {'error': f'unknown path {self.path}'})
+            except (ValueError, KeyError) as error:
+                self._reply(400, {'error': str(error)})
+
+        def log_message(self, format, *args):
+            pass
+
+    return DispatchHandler
+
+
+def serve(service, host='127.0.0.1', port=8050):
+    # Requests are handled in threads, the solves themselves are serialized on the one model
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Battery dispatch service")
+    parser.add_argument('--prices', default='./data/USEP_08Nov2023.csv', help="initial price curve ($/MWh)")
+    parser.add_argument('--periods', type=int, default=48)
+    parser.add_argument('--demand', type=float, default=111.87 * 0.5, help="kWh per period")
+    parser.add_argument('--capacity', type=float, default=150)
+    parser.add_argument('--battery-cost', type=float, default=11.35)
+    parser.add_argument('--selling-price-discount', type=float, default=0.9)
+    parser.add_argument('--efficiency', type=float, default=1)
+    parser.add_argument('--formulation', default='linear')
+    parser.add_argument('--solver', default='gurobi')
+    parser.add_argument('--no-fast-path', action='store_true')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    args = parser.parse_args(argv)
+
+    prices = select_prices(args.prices, 'USEP', unit='MWh')[:args.periods]
+    service = DispatchService(prices, args.demand, args.capacity, args.battery_cost, args.selling_price_discount,
+                              args.efficiency, args.formulation, solver=args.solver,
+                              fast_path=not args.no_fast_path)
+    service.dispatch()  # warm start
+    server = serve(service, args.host, args.port)
+    print(f"Dispatch service on http://{args.host}:{server.server_port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
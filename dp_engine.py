@@ -0,0 +1,322 @@
+import numpy as np
+
+# Backward-induction engine for the battery DP.
+#
+# The state of charge is discretized on a uniform grid from 0 to capacity and the
+# value table has shape (T+1, n_states). An action is a (name, fn) pair where
+# fn(price, demand, level) returns (stage_cost, next_level) for a whole array of
+# levels at once, so each Bellman update is a handful of NumPy operations.
+# Next levels that fall between grid points read the value table by linear interpolation.
+# The batch functions run the same recursion for S price/demand scenarios at once, with
+# (S, n_states) value rows; the action functions broadcast over the scenario axis unchanged.
+# dtype sets the value table type, float32 halves its memory. Policies are int16 indices.
+#
+# step_actions() builds partial charges and discharges in multiples of a step, with rate limits,
+# resell and DC_AC_efficiency, for any of the engines. When the step is a multiple of the grid
+# spacing every action moves the level by whole grid points, and step_induction() runs all
+# actions of a period as one (n_actions, n_states) array operation without interpolation.
+
+
+# ----------------------------------------------------------------
+# Action sets used by the scripts
+
+def charge_discharge_actions(battery_capacity, charge_fraction=0.5, battery_cost=0):
+    # dynamic_programming.py: charge a fixed fraction, discharge up to demand, or do nothing
+    def do_nothing(price, demand, level):
+        return demand * price + np.zeros_like(level), level
+
+    def charge(price, demand, level):
+        cost = charge_fraction * battery_capacity * price + demand * price + battery_cost
+        return cost + np.zeros_like(level), np.minimum(level + charge_fraction * battery_capacity, battery_capacity)
+
+    def discharge(price, demand, level):
+        discharge_amount = np.minimum(level, demand)
+        cost = (demand - discharge_amount) * price + battery_cost
+        return cost, np.maximum(level - discharge_amount, 0)
+
+    return [('Do Nothing', do_nothing), ('Charge', charge), ('Discharge', discharge)]
+
+
+def resell_actions(battery_capacity, selling_price_discount=0.9):
+    # m3_dp_resell_48.py: charge to full, discharge to load and resell the rest, or do nothing
+    def do_nothing(price, demand, level):
+        return demand * price + np.zeros_like(level), level
+
+    def charge(price, demand, level):
+        cost = battery_capacity * price + demand * price
+        return cost + np.zeros_like(level), np.minimum(level + battery_capacity, battery_capacity)
+
+    def discharge(price, demand, level):
+        discharge_amount = np.minimum(level, demand)
+        resell_amount = level - discharge_amount
+        cost = (demand - discharge_amount) * price - resell_amount * price * selling_price_discount
+        return cost, np.zeros_like(level)
+
+    return [('Do Nothing', do_nothing), ('Charge', charge), ('Discharge', discharge)]
+
+
+def _step_cost(price, demand, amount, selling_price_discount=0.9, DC_AC_efficiency=1, resell=True):
+    # Stage cost of moving the battery level by amount (kWh, > 0 charges). Charging a kWh of level
+    # buys 1 / DC_AC_efficiency kWh, discharging it delivers DC_AC_efficiency kWh, to the load first
+    # and resold at the discount after, as in battery_matrix.py. Reselling without resell costs inf.
+    bought = np.maximum(amount, 0) / DC_AC_efficiency
+    delivered = np.maximum(-amount, 0) * DC_AC_efficiency
+    to_load = np.minimum(delivered, demand)
+    resold = delivered - to_load
+    cost = (demand - to_load + bought) * price - resold * price * selling_price_discount
+    if not resell:
+        cost = np.where(resold > 0, np.inf, cost)
+    return cost
+
+
+def step_amounts(battery_capacity, step, max_charge=None, max_discharge=None):
+    # Level changes of step_actions(): 0, the charges, then the discharges, smallest first
+    max_charge = battery_capacity if max_charge is None else min(max_charge, battery_capacity)
+    max_discharge = battery_capacity if max_discharge is None else min(max_discharge, battery_capacity)
+    charges = step * np.arange(1, int(max_charge / step + 1e-9) + 1)
+    discharges = step * np.arange(1, int(max_discharge / step + 1e-9) + 1)
+    return np.concatenate([[0.0], charges, -discharges])
+
+
+def step_actions(battery_capacity, step, max_charge=None, max_discharge=None, selling_price_discount=0.9,
+                 DC_AC_efficiency=1, resell=True):
+    # Charge or discharge any multiple of step (kWh) up to the rate limits per period (kWh of
+    # battery level, the capacity by default). Moves past an empty or a full battery cost inf.
+    def do_nothing(price, demand, level):
+        return demand * price + np.zeros_like(level), level
+
+    def move(amount):
+        def action(price, demand, level):
+            next_level = level + amount
+            feasible = (next_level >= -1e-9) & (next_level <= battery_capacity + 1e-9)
+            cost = _step_cost(price, demand, amount, selling_price_discount, DC_AC_efficiency, resell)
+            return np.where(feasible, cost, np.inf), np.clip(next_level, 0, battery_capacity)
+        return action
+
+    actions = [('Do Nothing', do_nothing)]
+    for amount in step_amounts(battery_capacity, step, max_charge, max_discharge)[1:]:
+        actions.append((f"{'Charge' if amount > 0 else 'Discharge'} {abs(amount):g}", move(amount)))
+    return actions
+
+
+# ----------------------------------------------------------------
+# Engine
+
+def backward_induction(prices, demand, actions, battery_capacity, n_states=1501, dtype=np.float64):
+    T = len(prices)
+    grid = np.linspace(0, battery_capacity, n_states)
+
+    value = np.zeros((T + 1, n_states), dtype=dtype)
+    policy = np.zeros((T, n_states), dtype=np.int16)
+    totals = np.empty((len(actions), n_states))
+
+    for t in range(T - 1, -1, -1):
+        for a, (_, action) in enumerate(actions):
+            stage_cost, next_level = action(prices[t], demand[t], grid)
+            if next_level is grid:
+                totals[a] = stage_cost + value[t + 1]
+            else:
+                totals[a] = stage_cost + np.interp(next_level, grid, value[t + 1])
+        # Strict comparison keeps the earlier action on ties
+        best = totals[0].copy()
+        policy[t] = 0
+        for a in range(1, len(actions)):
+            better = totals[a] < best
+            best[better] = totals[a][better]
+            policy[t][better] = a
+        value[t] = best
+
+    return value, policy, grid
+
+
+def forward_pass(value, prices, demand, actions, battery_capacity, initial_level=0):
+    grid = np.linspace(0, battery_capacity, value.shape[1])
+    level = float(initial_level)
+    decisions, levels = [], []
+    cost = 0.0
+
+    for t in range(len(prices)):
+        best = None
+        for name, action in actions:
+            stage_cost, next_level = action(prices[t], demand[t], level)
+            total = stage_cost + np.interp(next_level, grid, value[t + 1])
+            if best is None or total < best[0]:
+                best = (total, name, float(next_level), float(stage_cost))
+        decisions.append(best[1])
+        levels.append(best[2])
+        level = best[2]
+        cost += best[3]
+
+    # The stage costs summed along the schedule, exact where value[0] interpolates between
+    # grid levels
+    return decisions, levels, cost
+
+
+def solve(prices, demand, actions, battery_capacity, n_states=1501, initial_level=0, dtype=np.float64):
+    prices = np.asarray(prices, dtype=float)
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), prices.shape)
+
+    value, _, _ = backward_induction(prices, demand, actions, battery_capacity, n_states, dtype)
+    decisions, levels, min_cost = forward_pass(value, prices, demand, actions, battery_capacity, initial_level)
+    return min_cost, decisions, levels
+
+
+# ----------------------------------------------------------------
+# Batched engine, prices and demand of shape (S, T)
+
+def _interp_uniform(level, table, battery_capacity):
+    # np.interp on the uniform grid for each row of table (S, n_states). A 1-D level, e.g. the
+    # next levels of an action that does not depend on the scenario, is shared by every row.
+    n_states = table.shape[1]
+    position = np.asarray(level, dtype=float) * ((n_states - 1) / battery_capacity)
+    np.clip(position, 0, n_states - 1, out=position)
+    lower = np.minimum(position.astype(np.intp), n_states - 2)
+    weight = position - lower
+    if position.ndim == 1:
+        value_lower, value_upper = table[:, lower], table[:, lower + 1]
+    else:
+        lower = np.broadcast_to(lower, np.broadcast_shapes(lower.shape, (len(table), 1)))
+        value_lower = np.take_along_axis(table, lower, axis=1)
+        value_upper = np.take_along_axis(table, lower + 1, axis=1)
+    value_upper -= value_lower
+    value_upper *= weight
+    value_upper += value_lower
+    return value_upper
+
+
+def backward_induction_batch(prices, demand, actions, battery_capacity, n_states=1501, dtype=np.float64):
+    S, T = prices.shape
+    grid = np.linspace(0, battery_capacity, n_states)
+
+    value = np.zeros((T + 1, S, n_states), dtype=dtype)
+    policy = np.zeros((T, S, n_states), dtype=np.int16)
+    totals = np.empty((len(actions), S, n_states))
+
+    for t in range(T - 1, -1, -1):
+        price, load = prices[:, t, None], demand[:, t, None]
+        for a, (_, action) in enumerate(actions):
+            stage_cost, next_level = action(price, load, grid)
+            if next_level is grid:
+                totals[a] = stage_cost + value[t + 1]
+            else:
+                totals[a] = stage_cost + _interp_uniform(next_level, value[t + 1], battery_capacity)
+        # argmin keeps the earlier action on ties
+        policy[t] = np.argmin(totals, axis=0)
+        value[t] = np.take_along_axis(totals, policy[t][None].astype(np.intp), axis=0)[0]
+
+    return value, policy, grid
+
+
+def forward_pass_batch(value, prices, demand, actions, battery_capacity, initial_level=0):
+    S, T = prices.shape
+    level = np.broadcast_to(np.asarray(initial_level, dtype=float), (S,)).copy()
+    decisions = np.zeros((S, T), dtype=np.int16)
+    levels = np.zeros((S, T))
+    cost = np.zeros(S)
+    totals = np.empty((len(actions), S))
+    stage_costs = np.empty((len(actions), S))
+    next_levels = np.empty((len(actions), S))
+
+    for t in range(T):
+        for a, (_, action) in enumerate(actions):
+            stage_cost, next_level = action(prices[:, t], demand[:, t], level)
+            stage_costs[a] = stage_cost
+            next_levels[a] = next_level
+            totals[a] = stage_costs[a] + _interp_uniform(next_levels[a][:, None], value[t + 1], battery_capacity)[:, 0]
+        decisions[:, t] = np.argmin(totals, axis=0)
+        level = next_levels[decisions[:, t], np.arange(S)]
+        levels[:, t] = level
+        cost += stage_costs[decisions[:, t], np.arange(S)]
+
+    return decisions, levels, cost
+
+
+def solve_batch(prices, demand, actions, battery_capacity, n_states=1501, initial_level=0, batch_size=None,
+                dtype=np.float64):
+    # Minimum cost (S,), decisions (S, T) as indices into actions and battery levels (S, T) of S
+    # scenarios. Scenarios are solved batch_size at a time, by default as many as keep the
+    # (T+1, batch, n_states) value table under 64 MB. The time grows with S * n_states, so a
+    # coarse grid is much faster when the actions only reach a few levels (2 for resell_actions).
+    prices = np.atleast_2d(np.asarray(prices, dtype=float))
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), prices.shape)
+    S, T = prices.shape
+    initial_level = np.broadcast_to(np.asarray(initial_level, dtype=float), (S,))
+    if batch_size is None:
+        batch_size = max(1, (64 << 20) // ((T + 1) * n_states * np.dtype(dtype).itemsize))
+
+    min_cost = np.zeros(S)
+    decisions = np.zeros((S, T), dtype=np.int16)
+    levels = np.zeros((S, T))
+    for start in range(0, S, batch_size):
+        batch = slice(start, start + batch_size)
+        value, _, _ = backward_induction_batch(prices[batch], demand[batch], actions, battery_capacity, n_states,
+                                               dtype)
+        decisions[batch], levels[batch], min_cost[batch] = forward_pass_batch(
+            value, prices[batch], demand[batch], actions, battery_capacity, initial_level[batch])
+
+    return min_cost, decisions, levels
+
+
+# ----------------------------------------------------------------
+# Grid-aligned step actions
+
+def step_induction(prices, demand, battery_capacity, step, n_states=None, max_charge=None, max_discharge=None,
+                   selling_price_discount=0.9, DC_AC_efficiency=1, resell=True, dtype=np.float32):
+    # backward_induction() for step_actions() on a grid of n_states levels (capacity / step + 1
+    # by default) whose spacing divides step. Returns the value table (T+1, n_states) of dtype,
+    # the policy (T, n_states) as int16 indices into step_actions() and the grid.
+    # (T=1488, 2001 levels, 51 actions) takes 18 MB and about a second.
+    prices = np.asarray(prices, dtype=float)
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), prices.shape)
+    T = len(prices)
+    if n_states is None:
+        n_states = int(round(battery_capacity / step)) + 1
+    grid = np.linspace(0, battery_capacity, n_states)
+    unit = step * (n_states - 1) / battery_capacity
+    if not np.isclose(unit, round(unit)):
+        raise ValueError(f"step {step} is not a multiple of the grid spacing {battery_capacity / (n_states - 1)}")
+
+    amounts = step_amounts(battery_capacity, step, max_charge, max_discharge)
+    shifts = np.rint(amounts / step).astype(np.intp) * int(round(unit))
+    # Stage costs of every period and action, next values read from an inf-padded row
+    costs = _step_cost(prices[:, None], demand[:, None], amounts, selling_price_discount, DC_AC_efficiency, resell)
+    pad = max(0, -shifts.min())
+    padded = np.full(pad + n_states + max(0, shifts.max()), np.inf)
+    next_index = pad + np.arange(n_states) + shifts[:, None]
+    states = np.arange(n_states)
+
+    value = np.zeros((T + 1, n_states), dtype=dtype)
+    policy = np.zeros((T, n_states), dtype=np.int16)
+    for t in range(T - 1, -1, -1):
+        padded[pad:pad + n_states] = value[t + 1]
+        totals = costs[t, :, None] + padded[next_index]
+        # argmin keeps the earlier action on ties
+        policy[t] = np.argmin(totals, axis=0)
+        value[t] = totals[policy[t], states]
+
+    return value, policy, grid
+
+
+def solve_steps(prices, demand, battery_capacity, step, n_states=None, max_charge=None, max_discharge=None,
+                selling_price_discount=0.9, DC_AC_efficiency=1, resell=True, initial_level=0, dtype=np.float32):
+    # Minimum cost, decisions (T,) as indices into step_actions() and battery levels (T,). The
+    # forward pass follows the policy table, levels stay on the grid, and the cost is summed
+    # along the schedule in float64.
+    prices = np.asarray(prices, dtype=float)
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), prices.shape)
+    value, policy, grid = step_induction(prices, demand, battery_capacity, step, n_states, max_charge,
+                                         max_discharge, selling_price_discount, DC_AC_efficiency, resell, dtype)
+
+    amounts = step_amounts(battery_capacity, step, max_charge, max_discharge)
+    shifts = np.rint(amounts / (grid[1] - grid[0])).astype(np.intp)
+    state = int(np.rint(initial_level / (grid[1] - grid[0])))
+    decisions = np.zeros(len(prices), dtype=np.int16)
+    levels = np.zeros(len(prices))
+    for t in range(len(prices)):
+        decisions[t] = policy[t, state]
+        state += shifts[decisions[t]]
+        levels[t] = grid[state]
+
+    moves = amounts[decisions]
+    min_cost = float(np.sum(_step_cost(prices, demand, moves, selling_price_discount, DC_AC_efficiency, resell)))
+    return min_cost, decisions, levels
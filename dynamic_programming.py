@@ -2,6 +2,7 @@ import math
 
 import numpy as np
 
+from dp_engine import charge_discharge_actions, solve
 from price_calculator import get_price_list
 
 # Constants and Inputs
@@ -20,46 +21,9 @@ prices = get_price_list('data/USEP_08Nov2023.csv')
 for i in range(len(prices)):
     prices[i] = prices[i] / 1000
 
-# Memoization Table
-memo = {}
-
-def find_min_cost(t, battery_level):
-    # Base case: end of the time horizon
-    if t == T:
-        return 0, [], []
-
-    # Check if the state has been computed before
-    if (t, battery_level) in memo:
-        return memo[(t, battery_level)]
-
-    # Decision 1: Charge the battery by 50%
-    cost_charge = 0.5 * battery_capacity * prices[t]
-    new_battery_level_charge = min(battery_level + 0.5 * battery_capacity, battery_capacity)
-    future_cost_charge, future_decisions_charge, future_charge_level = find_min_cost(t + 1, new_battery_level_charge)
-    total_cost_charge = cost_charge + demand[t] * prices[t] + future_cost_charge + battery_cost * number_of_battery
-
-    # Decision 2: Discharge all from the battery
-    discharge_amount = min(battery_level, demand[t])
-    new_battery_level_discharge = max(battery_level - discharge_amount, 0)
-    future_cost_discharge, future_decisions_discharge, future_discharge_level = find_min_cost(t + 1, new_battery_level_discharge)
-    total_cost_discharge = (demand[t] - discharge_amount) * prices[t] + future_cost_discharge + battery_cost * number_of_battery
-
-    # Decision 3: Do nothing
-    future_cost_do_nothing, future_decisions_do_nothing, future_do_nothing_level = find_min_cost(t + 1, battery_level)
-    total_cost_do_nothing = demand[t] * prices[t] + future_cost_do_nothing
-
-    target = min(total_cost_do_nothing, total_cost_charge, total_cost_discharge)
-    if target == total_cost_do_nothing:
-        memo[(t, battery_level)] = (total_cost_do_nothing, ["Do Nothing"] + future_decisions_do_nothing, [battery_level] + future_do_nothing_level)
-    elif target == total_cost_charge:
-        memo[(t, battery_level)] = (total_cost_charge, ["Charge"] + future_decisions_charge, [new_battery_level_charge] + future_charge_level)
-    else:
-        memo[(t, battery_level)] = (total_cost_discharge, ["Discharge"] + future_decisions_discharge, [new_battery_level_discharge] + future_discharge_level)
-
-    return memo[(t, battery_level)]
-
 # Compute the optimal decisions
-min_cost, optimal_decisions, battery_level = find_min_cost(0, 0)
+actions = charge_discharge_actions(battery_capacity, 0.5, battery_cost * number_of_battery)
+min_cost, optimal_decisions, battery_level = solve(prices, demand, actions, battery_capacity)
 
 # Output
 for i in range(len(optimal_decisions)):
@@ -0,0 +1,167 @@
+from collections import deque
+
+import numpy as np
+
+from battery_matrix import OPTIMAL
+
+# Exact solver-free dispatch of one battery with DC_AC_efficiency 1 and non-negative prices.
+# With no losses the model only depends on the battery level L_t: every period moves it by
+# Delta = L_t+1 - L_t, at price p for Delta > -Ed (charging, or discharging less than the load)
+# and at selling_price_discount * p beyond (resell). That cost is convex in Delta, so the
+# minimum cost W_t(L) of reaching level L at period t is convex on [0, Beta_max] and kept as
+# (slope, length) segments in increasing slope order. A period clamps the slopes to
+# [selling_price_discount * p, p] from both ends of the deque and shifts them by Ed, then a
+# backward pass picks the levels. O(T) amortized per period, no solver.
+# The ESS min charge/discharge of 1 kWh is checked on the result, None means it does not hold.
+
+
+def arbitrage_applies(prices, DC_AC_efficiency=1, selling_price_discount=0.9):
+    return DC_AC_efficiency == 1 and 0 <= selling_price_discount <= 1 and np.all(np.asarray(prices) >= 0)
+
+
+def _level_at(segments, slope):
+    # Leftmost level where the slope of W reaches `slope`
+    level = 0
+    for segment_slope, length in segments:
+        if segment_slope >= slope:
+            break
+        level += length
+    return level
+
+
+def arbitrage_schedule(prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9, resell=True,
+                       initial_power=0, tolerance=1e-9):
+    # (cost, solution) in the format of BatteryModel.solution(), or None when the schedule needs
+    # a charge or discharge below 1 kWh or the initial power is outside [0, Beta_max], the
+    # MILP decides those (infeasible for the latter)
+    if not 0 <= initial_power <= Beta_max:
+        return None
+    price_kwh = np.asarray(prices, dtype=float) / 1000
+    T = len(price_kwh)
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), (T,))
+
+    # W_0 is 0 at the initial power and infinite elsewhere
+    W = deque([[-np.inf, initial_power], [np.inf, Beta_max - initial_power]])
+    snapshots = []
+    for t in range(T):
+        snapshots.append(list(map(tuple, W)))
+        p = price_kwh[t]
+        low = selling_price_discount * p if resell else -np.inf
+
+        stored_below = 0
+        while W and W[0][0] < low:
+            stored_below += W.popleft()[1]
+        while W and W[-1][0] > p:
+            W.pop()
+
+        shift = stored_below - demand[t]
+        if shift > 0:
+            W.appendleft([low, shift])
+        else:
+            # The first -shift kWh can be discharged to the load at no loss
+            trim = -shift
+            while W and trim > 0:
+                if W[0][1] <= trim:
+                    trim -= W.popleft()[1]
+                else:
+                    W[0][1] -= trim
+                    trim = 0
+        length = sum(segment[1] for segment in W)
+        if length < Beta_max:
+            W.append([p, Beta_max - length])
+
+    # Backward pass, the final level is where W_T stops decreasing
+    levels = np.zeros(T + 1)
+    levels[T] = _level_at(W, 0)
+    for t in range(T - 1, -1, -1):
+        p = price_kwh[t]
+        low = selling_price_discount * p if resell else -np.inf
+        level = min(_level_at(snapshots[t], p), max(levels[t + 1] + demand[t], _level_at(snapshots[t], low)))
+        levels[t] = min(max(level, 0), Beta_max)
+
+    delta = np.diff(levels)
+    delta[np.abs(delta) < tolerance] = 0
+    charge = np.maximum(delta, 0)
+    discharge = np.maximum(-delta, 0)
+    to_load = np.minimum(discharge, demand)
+
+    E = np.zeros((3, 3, T))
+    E[0, 1] = charge
+    E[1, 2] = to_load
+    E[1, 0] = discharge - to_load
+    E[0, 2] = demand - to_load
+    y2tch = (charge > 0).astype(float)
+    y2td = (discharge > 0).astype(float)
+    # ESS min charge/discharge 1MWh
+    if np.any(charge[charge > 0] < 1) or np.any(to_load[discharge > 0] < 1):
+        return None
+
+    cost = (float(price_kwh @ (E[0, 1] + E[0, 2]) - selling_price_discount * (price_kwh @ E[1, 0]))
+            + total_battery_cost)
+    return cost, {'battery_power': levels[:T], 'y2tch': y2tch, 'y2td': y2td, 'E': E}
+
+
+class ArbitrageModel:
+    # Drop-in for the battery models (update, optimize, Status, objVal, solution) that uses the
+    # fast path when it applies and fallback(), the MILP model, otherwise
+
+    def __init__(self, prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9, resell=True,
+                 fallback=None):
+        self.T = len(prices)
+        self.Beta_max = Beta_max
+        self.total_battery_cost = total_battery_cost
+        self.selling_price_discount = selling_price_discount
+        self.resell = resell
+        self.fallback = fallback
+        self.fallback_model = None
+        self.params = {}
+        self.prices = np.asarray(prices, dtype=float)
+        self.demand = np.broadcast_to(np.asarray(demand, dtype=float), (self.T,))
+        self.initial_power = 0
+        self.Status = 0
+        self.objVal = None
+        self.used_fast_path = False
+        self._solution = None
+
+    def update(self, prices=None, demand=None, initial_power=None):
+        if prices is not None:
+            self.prices = np.asarray(prices, dtype=float)[:self.T]
+        if demand is not None:
+            self.demand = np.broadcast_to(np.asarray(demand, dtype=float), (self.T,))
+        if initial_power is not None:
+            self.initial_power = initial_power
+
+    def set_param(self, name, value):
+        # Solver parameter of the fallback model, kept until it is built
+        self.params[name] = value
+        if self.fallback_model is not None:
+            self.fallback_model.set_param(name, value)
+
+    def shift_start(self, periods):
+        if self.fallback_model is not None:
+            self.fallback_model.shift_start(periods)
+
+    def optimize(self):
+        result = None
+        if arbitrage_applies(self.prices, 1, self.selling_price_discount) and np.all(self.demand >= 1):
+            result = arbitrage_schedule(self.prices, self.demand, self.Beta_max, self.total_battery_cost,
+                                        self.selling_price_discount, self.resell, self.initial_power)
+        self.used_fast_path = result is not None
+        if result is not None:
+            self.Status = OPTIMAL
+            self.objVal, self._solution = result
+            return self.Status
+
+        if self.fallback_model is None:
+            self.fallback_model = self.fallback()
+            for name, value in self.params.items():
+                self.fallback_model.set_param(name, value)
+        self.fallback_model.update(self.prices, self.demand, self.initial_power)
+        self.Status = self.fallback_model.optimize()
+        # BatteryModel.objVal raises without a solution
+        self.objVal = self.fallback_model.objVal if self.Status == OPTIMAL else None
+        self._solution = None
+        return self.Status
+
+    def solution(self):
+        return self._solution if self.used_fast_path else self.fallback_model.solution()
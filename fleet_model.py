@@ -0,0 +1,209 @@
+from functools import partial
+
+import numpy as np
+import scipy.sparse as sp
+
+from battery_matrix import INFEASIBLE, OPTIMAL, SUBOPTIMAL, MatrixModel
+from result_cache import cached_solve, get_cache
+
+# Fleet of N batteries behind one site connection.
+# Each battery has its own capacity, DC_AC_efficiency and daily cost, all of them serve the same
+# load and share the site import/export limits (kW per period, None for no limit). The model
+# uses the exact linear formulation of battery_matrix.py, built with Kronecker products so
+# every constraint family is one sparse block whatever the fleet size.
+#
+# Variables: E02 (T, grid to load at the site) followed by the per-battery blocks below,
+# each of length N*T and ordered battery by battery.
+
+BATTERY_VARIABLES = ('E01', 'E10', 'E12', 'battery_power', 'y2tch', 'y2td')
+
+
+def build_fleet_matrices(T, capacities, efficiencies, import_limit=None, export_limit=None, relax=False):
+    N = len(capacities)
+    capacity = np.repeat(np.asarray(capacities, dtype=float), T)
+    eta = np.repeat(np.asarray(efficiencies, dtype=float), T)
+
+    site = sp.identity(T, format='csr')
+    battery = sp.identity(N * T, format='csr')
+    total = sp.kron(np.ones((1, N)), site, format='csr')  # sums a per-battery block over the fleet
+    previous = sp.kron(sp.identity(N), sp.eye(T, k=-1), format='csr')  # row (n, t) picks (n, t-1)
+
+    def diag(values):
+        return sp.diags(values, format='csr')
+
+    families = [
+        # Fulfill load demand from the grid and the whole fleet
+        ('LoadDemand', {'E02': site, 'E12': total}, '=', np.zeros(T)),
+        # ESS does not charge and discharge simultaneously
+        ('ChargeDischarge', {'y2tch': battery, 'y2td': battery}, '<', np.ones(N * T)),
+        # ESS discharge does not exceed its current power
+        ('DischargeLimit', {'E10': battery, 'E12': battery, 'battery_power': -diag(eta)}, '<', np.zeros(N * T)),
+        ('DischargeLimit_M', {'E10': battery, 'E12': battery, 'y2td': -diag(eta * capacity)}, '<', np.zeros(N * T)),
+        # ESS charge does not exceed what’s left
+        ('ChargeLimit', {'E01': diag(eta), 'battery_power': battery}, '<', capacity),
+        ('ChargeLimit_M', {'E01': diag(eta), 'y2tch': -diag(capacity)}, '<', np.zeros(N * T)),
+        # ESS min charge/discharge 1MWh
+        ('ChargeConstraint', {'E01': battery, 'y2tch': -battery}, '>', np.zeros(N * T)),
+        ('DischargeConstraint', {'E12': battery, 'y2td': -battery}, '>', np.zeros(N * T)),
+        # ESS current power is based on previous round power, row (n, 0) is the initial power
+        ('PowerUpdate', {'battery_power': battery - previous, 'E01': -diag(eta) @ previous,
+                         'E10': diag(1 / eta) @ previous, 'E12': diag(1 / eta) @ previous}, '=', np.zeros(N * T)),
+    ]
+    # Shared site connection
+    if import_limit is not None:
+        families.append(('ImportLimit', {'E02': site, 'E01': total}, '<', np.broadcast_to(import_limit, (T,))))
+    if export_limit is not None:
+        families.append(('ExportLimit', {'E10': total}, '<', np.broadcast_to(export_limit, (T,))))
+
+    sizes = {'E02': T, **{name: N * T for name in BATTERY_VARIABLES}}
+    blocks_rows = []
+    sense, rhs, rows = [], [], {}
+    row = 0
+    for name, blocks, family_sense, family_rhs in families:
+        n_rows = len(family_rhs)
+        blocks_rows.append(sp.hstack([blocks.get(v, sp.csr_matrix((n_rows, size))) for v, size in sizes.items()]))
+        sense.append(np.full(n_rows, family_sense))
+        rhs.append(np.asarray(family_rhs, dtype=float))
+        rows[name] = np.arange(row, row + n_rows)
+        row += n_rows
+
+    upper = {'E01': capacity / eta, 'battery_power': capacity, 'y2tch': np.ones(N * T), 'y2td': np.ones(N * T)}
+    lb = np.zeros(T + len(BATTERY_VARIABLES) * N * T)
+    ub = np.concatenate([np.full(size, np.inf) if v not in upper else upper[v] for v, size in sizes.items()])
+    integrality = np.zeros(len(lb), dtype=int)
+    if not relax:
+        integrality[T + BATTERY_VARIABLES.index('y2tch') * N * T:] = 1
+
+    A = sp.vstack(blocks_rows, format='csr')
+    return A, np.concatenate(sense), np.concatenate(rhs), rows, lb, ub, integrality
+
+
+class FleetModel(MatrixModel):
+
+    def __init__(self, prices, demand, capacities, efficiencies, battery_costs, import_limit=None,
+                 export_limit=None, selling_price_discount=0.9, relax=False, solver='highs', name="Fleet", env=None):
+        if relax and any(eta != 1 for eta in efficiencies):
+            raise ValueError("The LP formulation is only exact when every DC_AC_efficiency is 1")
+        super().__init__(float(np.sum(battery_costs)), solver, name, env)
+
+        self.T = T = len(prices)
+        self.N = len(capacities)
+        self.selling_price_discount = selling_price_discount
+        self.A, self.sense, self.rhs, self.rows, self.lb, self.ub, self.integrality = build_fleet_matrices(
+            T, capacities, efficiencies, import_limit, export_limit, relax)
+        self.c = np.zeros(len(self.lb))
+
+        self.update(prices, demand)
+
+    def _block(self, name):
+        if name == 'E02':
+            return slice(0, self.T)
+        i = BATTERY_VARIABLES.index(name)
+        size = self.N * self.T
+        return slice(self.T + i * size, self.T + (i + 1) * size)
+
+    def update(self, prices=None, demand=None, import_limit=None, export_limit=None):
+        T, N = self.T, self.N
+        if prices is not None:
+            price_kwh = np.asarray(prices, dtype=float)[:T] / 1000
+            self.c[self._block('E02')] = price_kwh
+            self.c[self._block('E01')] = np.tile(price_kwh, N)
+            self.c[self._block('E10')] = np.tile(-self.selling_price_discount * price_kwh, N)
+        if demand is not None:
+            self.rhs[self.rows['LoadDemand']] = np.broadcast_to(np.asarray(demand, dtype=float), (T,))
+        if import_limit is not None:
+            self.rhs[self.rows['ImportLimit']] = np.broadcast_to(np.asarray(import_limit, dtype=float), (T,))
+        if export_limit is not None:
+            self.rhs[self.rows['ExportLimit']] = np.broadcast_to(np.asarray(export_limit, dtype=float), (T,))
+        self.push_data()
+
+    def solution(self):
+        solution = {'E02': self.solution_x[self._block('E02')]}
+        for name in BATTERY_VARIABLES:
+            solution[name] = self.solution_x[self._block(name)].reshape(self.N, self.T)
+        return solution
+
+
+def fleet_cost(prices, solution, battery_costs, selling_price_discount=0.9):
+    price_kwh = np.asarray(prices, dtype=float) / 1000
+    return float(np.sum(price_kwh * (solution['E02'] + solution['E01'].sum(axis=0)))
+                 - selling_price_discount * np.sum(price_kwh * solution['E10'].sum(axis=0))
+                 + np.sum(battery_costs))
+
+
+def solve_fleet_decomposed(prices, demand, capacities, efficiencies, battery_costs, import_limit=None,
+                           export_limit=None, selling_price_discount=0.9, relax=False, solver='highs',
+                           passes=5, tolerance=1e-6, cache=None):
+    # Block-coordinate decomposition for large fleets: each battery is re-solved on its own
+    # against the load and site headroom left by the rest of the fleet, pass after pass, until
+    # the fleet cost stops improving. Every step keeps the fleet schedule feasible and never
+    # increases its cost, but the result is a local optimum and not a proven one, so the status
+    # is SUBOPTIMAL (the full model was 0.3% cheaper on a 3-battery day). It starts from the idle
+    # fleet, so the load must fit under the import limit on its own.
+    # cache as in make_battery_model(), the whole decomposition is one cache entry.
+    cache = get_cache(cache)
+    if cache is not None:
+        solve = partial(solve_fleet_decomposed, prices, demand, capacities, efficiencies, battery_costs, import_limit,
+                        export_limit, selling_price_discount, relax, solver, passes, tolerance, cache=False)
+        return cached_solve(cache, solve, prices, demand, capacities, efficiencies, battery_costs,
+                            model='fleet_decomposed', import_limit=import_limit, export_limit=export_limit,
+                            selling_price_discount=selling_price_discount, relax=relax, solver=solver, passes=passes,
+                            tolerance=tolerance)
+    T, N = len(prices), len(capacities)
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), (T,))
+    import_limit = None if import_limit is None else np.broadcast_to(np.asarray(import_limit, dtype=float), (T,))
+    export_limit = None if export_limit is None else np.broadcast_to(np.asarray(export_limit, dtype=float), (T,))
+
+    if import_limit is not None and np.any(demand > import_limit):
+        return INFEASIBLE, None, None
+
+    fleet = {name: np.zeros((N, T)) for name in BATTERY_VARIABLES}
+    subproblems = [FleetModel(prices, demand, [capacities[n]], [efficiencies[n]], [0], import_limit, export_limit,
+                              selling_price_discount, relax, solver, name=f"Battery {n}") for n in range(N)]
+
+    def site_solution():
+        return {'E02': demand - fleet['E12'].sum(axis=0), **fleet}
+
+    cost = fleet_cost(prices, site_solution(), battery_costs, selling_price_discount)
+    for _ in range(passes):
+        previous_cost = cost
+        for n, subproblem in enumerate(subproblems):
+            others = {name: fleet[name].sum(axis=0) - fleet[name][n] for name in ('E01', 'E10', 'E12')}
+            subproblem.update(demand=demand - others['E12'],
+                              import_limit=None if import_limit is None else import_limit - others['E01'],
+                              export_limit=None if export_limit is None else export_limit - others['E10'])
+            if subproblem.optimize() != OPTIMAL:
+                continue
+            battery = subproblem.solution()
+            for name in BATTERY_VARIABLES:
+                fleet[name][n] = battery[name][0]
+        cost = fleet_cost(prices, site_solution(), battery_costs, selling_price_discount)
+        if previous_cost - cost <= tolerance * abs(previous_cost):
+            break
+
+    return SUBOPTIMAL, cost, site_solution()
+
+
+def solve_fleet(prices, demand, capacities, efficiencies, battery_costs, import_limit=None, export_limit=None,
+                selling_price_discount=0.9, relax=False, solver='highs', max_fleet_size=20, cache=None):
+    # One model up to max_fleet_size batteries, decomposition above that: its schedule is feasible
+    # but not proven optimal and comes with SUBOPTIMAL instead of OPTIMAL.
+    # cache as in make_battery_model(), the model is only built on a miss.
+    if len(capacities) > max_fleet_size:
+        return solve_fleet_decomposed(prices, demand, capacities, efficiencies, battery_costs, import_limit,
+                                      export_limit, selling_price_discount, relax, solver, cache=cache)
+
+    cache = get_cache(cache)
+    if cache is not None:
+        solve = partial(solve_fleet, prices, demand, capacities, efficiencies, battery_costs, import_limit,
+                        export_limit, selling_price_discount, relax, solver, max_fleet_size, cache=False)
+        return cached_solve(cache, solve, prices, demand, capacities, efficiencies, battery_costs, model='fleet',
+                            import_limit=import_limit, export_limit=export_limit,
+                            selling_price_discount=selling_price_discount, relax=relax, solver=solver)
+
+    fleet_model = FleetModel(prices, demand, capacities, efficiencies, battery_costs, import_limit, export_limit,
+                             selling_price_discount, relax, solver)
+    status = fleet_model.optimize()
+    if status != OPTIMAL:
+        return status, None, None
+    return status, fleet_model.objVal, fleet_model.solution()
@@ -0,0 +1,110 @@
+import os
+
+import numpy as np
+from scipy.signal import lfilter
+
+from price_store import load_price_table
+
+# Price forecast error model from a historical file with both the actual (WEP) and forecast
+# (USEP) prices, as in m2_price_forecast_error.py. The errors actual - forecast ($/MWh) give
+# per-period (1-48) means and standard deviations, the lag-1 autocorrelation of the
+# standardized errors (AR(1)) and the correlation between the periods of a day. The statistics
+# are computed once per file and cached in .cache/ next to it.
+#
+# price_paths() draws S x T price scenarios around a nominal forecast in one vectorized draw:
+#   'independent' - per-period mean and std, no correlation
+#   'ar1'         - per-period mean and std, AR(1) correlation across periods and days
+#   'cholesky'    - per-period mean and std, full within-day correlation, days independent
+
+METHODS = ('independent', 'ar1', 'cholesky')
+PERIODS_PER_DAY = 48
+_CACHE_VERSION = 2  # part of the cache fingerprint, bumped when the statistics change
+
+_statistics = {}
+
+
+def compute_error_statistics(file_path, actual='WEP', forecast='USEP', shrinkage=0.1):
+    # shrinkage pulls the correlation towards the identity, a month of days is fewer than the
+    # 48 periods so the sample correlation alone is singular
+    table = load_price_table(file_path)
+    errors = (table[actual] - table[forecast]) * 1000
+    periods = table['period'] - 1
+
+    mean = np.bincount(periods, errors, PERIODS_PER_DAY) / np.bincount(periods, minlength=PERIODS_PER_DAY)
+    std = np.sqrt(np.bincount(periods, (errors - mean[periods]) ** 2, PERIODS_PER_DAY)
+                  / np.bincount(periods, minlength=PERIODS_PER_DAY))
+    standardized = (errors - mean[periods]) / np.where(std > 0, std, 1)[periods]
+    phi = float(np.corrcoef(standardized[1:], standardized[:-1])[0, 1])
+
+    days = errors[:len(errors) // PERIODS_PER_DAY * PERIODS_PER_DAY].reshape(-1, PERIODS_PER_DAY)
+    correlation = (1 - shrinkage) * np.corrcoef(days, rowvar=False) + shrinkage * np.identity(PERIODS_PER_DAY)
+
+    return {'mean': mean, 'std': std, 'phi': np.float64(phi), 'correlation': correlation,
+            'rmse': np.float64(np.sqrt(np.mean(errors ** 2)))}
+
+
+def error_statistics(file_path, actual='WEP', forecast='USEP', shrinkage=0.1):
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    fingerprint = np.array([stat.st_mtime_ns, stat.st_size, shrinkage * 1e9, _CACHE_VERSION], dtype=np.int64)
+    key = (file_path, actual, forecast)
+    if key in _statistics and np.array_equal(_statistics[key]['fingerprint'], fingerprint):
+        return _statistics[key]
+
+    cache_path = os.path.join(os.path.dirname(file_path), '.cache',
+                              f'{os.path.basename(file_path)}.errors_{actual}_{forecast}.npz')
+    statistics = None
+    if os.path.exists(cache_path):
+        with np.load(cache_path) as cached:
+            if np.array_equal(cached['fingerprint'], fingerprint):
+                statistics = {name: cached[name] for name in cached.files}
+    if statistics is None:
+        statistics = compute_error_statistics(file_path, actual, forecast, shrinkage)
+        statistics['fingerprint'] = fingerprint
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        temporary = f'{cache_path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, **statistics)
+        os.replace(temporary, cache_path)
+
+    statistics['phi'], statistics['rmse'] = float(statistics['phi']), float(statistics['rmse'])
+    _statistics[key] = statistics
+    return statistics
+
+
+def standard_paths(statistics, n, T, method='ar1', seed=None, first_period=1):
+    # (n, T) unit-variance errors with the correlation of the method, the price noise of each
+    # period is its std times these
+    if method not in METHODS:
+        raise ValueError(f"Unknown method {method!r}, expected one of {METHODS}")
+    rng = np.random.default_rng(seed)
+    offset = first_period - 1
+
+    if method == 'cholesky':
+        days = -(-(offset + T) // PERIODS_PER_DAY)
+        L = np.linalg.cholesky(statistics['correlation'])
+        return (rng.standard_normal((n, days, PERIODS_PER_DAY)) @ L.T).reshape(n, -1)[:, offset:offset + T]
+
+    z = rng.standard_normal((n, T))
+    if method == 'ar1':
+        z = ar1_filter(z, statistics['phi'])
+    return z
+
+
+def ar1_filter(z, phi):
+    # z_t = phi z_t-1 + sqrt(1 - phi^2) eps_t along the last axis, started from the stationary distribution
+    z = np.array(z, dtype=float)
+    z[..., 0] /= np.sqrt(1 - phi ** 2)
+    return lfilter([np.sqrt(1 - phi ** 2)], [1, -phi], z, axis=-1)
+
+
+def price_paths(price_nominal, statistics, n, method='ar1', seed=None, first_period=1, bias=True):
+    # (n, T) prices in $/MWh, price_nominal starts at period first_period (1-48) of a day.
+    # bias adds the mean error of each period, seed is a seed or a np.random.Generator.
+    price_nominal = np.asarray(price_nominal, dtype=float)
+    T = len(price_nominal)
+    periods = (first_period - 1 + np.arange(T)) % PERIODS_PER_DAY
+    noise = statistics['std'][periods] * standard_paths(statistics, n, T, method, seed, first_period)
+    if bias:
+        noise += statistics['mean'][periods]
+    return price_nominal + noise
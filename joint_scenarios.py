@@ -0,0 +1,131 @@
+from functools import partial
+
+import numpy as np
+
+from battery_matrix import OPTIMAL, OTHER
+from battery_model import FORMULATIONS
+from dp_engine import solve_steps
+from forecast_error import PERIODS_PER_DAY, ar1_filter, standard_paths
+from profiling import profiler
+from scenario_runner import _solve, battery_setup, run_scenarios
+
+# Joint price and demand uncertainty.
+# joint_paths() draws (S, T) price and demand matrices together: the price errors come from
+# forecast_error.py, the demand errors are AR(1) with a given correlation to the price errors
+# of the same period. Demand means and standard deviations are a number or a time-of-day
+# profile (one value per period of the day). evaluate_scenarios() runs one solver path over
+# every scenario in batches and returns the cost columns of result_analysis.py, so
+# cost_summary() reports the distribution of savings against cost_wo_battery.
+#
+# Paths: 'fast' (solver-free dispatch, HiGHS when it does not apply), 'highs', 'gurobi'
+# (the MILP of battery_matrix.py) or 'dp' (solve_steps of dp_engine.py: charges and discharges
+# in multiples of step kWh with the same DC_AC_efficiency, discount and resell, so its costs
+# are the MILP's up to the step: a few cents a day at 1.5 kWh on a 150 kWh battery, about 0.4
+# without resell, where the discharges stop short of the demand). The formulations all have
+# the MILP's optimum, the DP takes any of them.
+
+PATHS = ('fast', 'highs', 'gurobi', 'dp')
+
+
+def _by_period(values, T, first_period=1):
+    # A number, a time-of-day profile with one value per period of the day (starting at period 1,
+    # rotated to first_period) or a (T,) array of the horizon's periods
+    values = np.asarray(values, dtype=float)
+    if values.ndim == 0:
+        return np.broadcast_to(values, (T,))
+    if values.ndim != 1 or len(values) not in (T, PERIODS_PER_DAY):
+        raise ValueError(f"Expected a number, {PERIODS_PER_DAY} periods of the day or {T} periods, "
+                         f"got shape {values.shape}")
+    if len(values) == PERIODS_PER_DAY:
+        return values[(first_period - 1 + np.arange(T)) % PERIODS_PER_DAY]
+    return values
+
+
+def joint_paths(price_nominal, statistics, demand_mean, demand_std, n, correlation=0.0, method='ar1',
+                demand_phi=0.0, seed=None, first_period=1, bias=True):
+    # (prices (n, T) in $/MWh, demand (n, T) in kWh), demand is clipped at 0
+    rng = np.random.default_rng(seed)
+    price_nominal = np.asarray(price_nominal, dtype=float)
+    T = len(price_nominal)
+    periods = (first_period - 1 + np.arange(T)) % PERIODS_PER_DAY
+
+    price_z = standard_paths(statistics, n, T, method, rng, first_period)
+    prices = price_nominal + statistics['std'][periods] * price_z
+    if bias:
+        prices += statistics['mean'][periods]
+
+    demand_z = rng.standard_normal((n, T))
+    if demand_phi:
+        demand_z = ar1_filter(demand_z, demand_phi)
+    demand_z = correlation * price_z + np.sqrt(1 - correlation ** 2) * demand_z
+    demand = _by_period(demand_mean, T, first_period) + _by_period(demand_std, T, first_period) * demand_z
+    return prices, np.maximum(demand, 0)
+
+
+# ----------------------------------------------------------------
+# Evaluation
+
+def _joint_setup(threads, prices, demand, **model_args):
+    # The scenario matrices stay in the worker state instead of being sent with every task
+    return battery_setup(threads, prices=prices[0], demand=demand[0], **model_args), prices, demand
+
+
+def _dp_setup(threads, prices, demand, total_battery_cost, **dp_args):
+    return prices, demand, total_battery_cost, dp_args
+
+
+def _dp_scenario(state, sample, rng):
+    prices, demand, total_battery_cost, dp_args = state
+    with profiler.stage('solve'):
+        min_cost, _, _ = solve_steps(prices[sample] / 1000, demand[sample], **dp_args)
+    return sample, OPTIMAL, min_cost + total_battery_cost
+
+
+def _joint_scenario(state, sample, rng):
+    battery_model, prices, demand = state
+    with profiler.stage('update'):
+        battery_model.update(prices[sample], demand[sample])
+    _solve(battery_model)
+    status = battery_model.Status
+    return sample, status, battery_model.objVal if status == OPTIMAL else np.nan
+
+
+def evaluate_scenarios(prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9,
+                       DC_AC_efficiency=1, path='fast', formulation='linear', resell=True, batch_size=1000,
+                       workers=1, threads=1, step=1.5):
+    # Cost columns (S,) of every scenario, prices in $/MWh and demand in kWh as (S, T), step
+    # (kWh) is the charge and discharge step of the 'dp' path
+    if path not in PATHS:
+        raise ValueError(f"Unknown path {path!r}, expected one of {PATHS}")
+    if formulation not in FORMULATIONS:
+        raise ValueError(f"Unknown formulation {formulation!r}, expected one of {FORMULATIONS}")
+    prices = np.asarray(prices, dtype=float)
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), prices.shape)
+    S = len(prices)
+    results = {'sample': np.arange(S), 'status': np.full(S, OPTIMAL), 'cost_w_battery': np.full(S, np.nan),
+               'cost_wo_battery': np.sum(prices * demand, axis=1) / 1000}
+
+    if path == 'dp':
+        setup = partial(_dp_setup, prices=prices, demand=demand, total_battery_cost=total_battery_cost,
+                        battery_capacity=Beta_max, step=step, selling_price_discount=selling_price_discount, DC_AC_efficiency=DC_AC_efficiency,
+                        resell=resell)
+        scenario = _dp_scenario
+    else:
+        setup = partial(_joint_setup, prices=prices, demand=demand, Beta_max=Beta_max,
+                        total_battery_cost=total_battery_cost, selling_price_discount=selling_price_discount,
+                        DC_AC_efficiency=DC_AC_efficiency, formulation=formulation, resell=resell,
+                        solver='highs' if path == 'fast' else path, fast_path=path == 'fast')
+        scenario = _joint_scenario
+    chunksize = max(1, min(batch_size, S // (4 * max(workers or 1, 1))))
+    for sample, status, cost in run_scenarios(setup, scenario, S, workers=workers, threads=threads,
+                                              chunksize=chunksize):
+        results['status'][sample] = status if status is not None else OTHER
+        results['cost_w_battery'][sample] = cost
+
+    results['cost_diff'] = results['cost_wo_battery'] - results['cost_w_battery']
+    return results
+
+
+def successful(results):
+    keep = results['status'] == OPTIMAL
+    return {name: values[keep] for name, values in results.items()}
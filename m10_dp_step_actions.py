@@ -0,0 +1,75 @@
+import time
+
+import numpy as np
+
+from battery_matrix import OPTIMAL, make_battery_model
+from dp_engine import solve_steps, step_actions
+from price_store import select_prices
+
+# Resell DP with partial charges and discharges (see step_actions in dp_engine.py), compared
+# with the MILP on one day, then run on a month of half-hourly prices
+
+# 1. Parameter
+
+# 1.1 Time
+T = 48  # 1 day, every 30 minutes
+
+# 1.2 Price ($/kWh)
+prices = select_prices('data/USEP_08Nov2023.csv', 'USEP')[:T]
+month_prices = select_prices('data/WEP_10Oct2023_to_09Nov2023.csv', 'WEP')  # 31 days, 1488 periods
+
+# 1.3 Demand in kwh
+demand = 111.87 * 0.5
+
+# 1.4 Battery
+number_of_battery = 1
+battery_capacity = 150 * number_of_battery
+battery_cost = 11.35 # per day
+total_battery_cost = battery_cost*number_of_battery  # per day
+selling_price_discount = 0.9
+DC_AC_efficiency = 0.94
+
+# 1.5 Actions: charge or discharge multiples of step kWh, at most max_rate kWh per period
+# (None for the capacity, as in the MILP)
+step = 1.5
+max_rate = None
+
+# 1.6 Month run: a finer grid, step a multiple of its spacing
+month_n_states = 2001
+month_step = 3
+month_max_rate = 75
+
+# ----------------------------------------------------------------
+
+# 2. One day, DP against MILP
+
+actions = step_actions(battery_capacity, step, max_rate, max_rate, selling_price_discount, DC_AC_efficiency)
+start = time.perf_counter()
+min_cost, decisions, battery_level = solve_steps(prices, demand, battery_capacity, step, None, max_rate, max_rate,
+                                                 selling_price_discount, DC_AC_efficiency)
+elapsed = time.perf_counter() - start
+print(f"DP: {len(actions)} actions, cost with battery {min_cost + total_battery_cost:.4f} in {elapsed:.3f} s")
+
+start = time.perf_counter()
+battery_model = make_battery_model(prices * 1000, demand, battery_capacity, total_battery_cost,
+                                   selling_price_discount, DC_AC_efficiency, 'linear', solver='highs')
+if battery_model.optimize() == OPTIMAL:
+    print(f"MILP: cost with battery {battery_model.objVal:.4f} in {time.perf_counter() - start:.3f} s")
+
+for t in range(T):
+    print(f"Decision {t}: {actions[decisions[t]][0]} battery level {battery_level[t]:g}")
+print("Origin Cost:", np.sum(demand * prices))
+
+# ----------------------------------------------------------------
+
+# 3. One month
+
+start = time.perf_counter()
+month_cost, month_decisions, _ = solve_steps(month_prices, demand, battery_capacity, month_step, month_n_states,
+                                             month_max_rate, month_max_rate, selling_price_discount,
+                                             DC_AC_efficiency)
+elapsed = time.perf_counter() - start
+n_actions = len(step_actions(battery_capacity, month_step, month_max_rate, month_max_rate))
+print(f"Month: {len(month_prices)} periods, {month_n_states} levels, {n_actions} actions in {elapsed:.2f} s")
+print(f"Month cost with battery {month_cost + total_battery_cost * len(month_prices) / T:.2f}, "
+      f"without battery {np.sum(demand * month_prices):.2f}")
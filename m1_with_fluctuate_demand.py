@@ -1,11 +1,10 @@
 import numpy as np
-from gurobipy import Model, GRB
 from price_calculator import get_price_list
-import csv
 
-output_file_path = 'data/m2_output_data_1h.csv'
+from battery_matrix import INFEASIBLE, OPTIMAL, UNBOUNDED, make_battery_model
+from schedule_output import print_schedule, schedule_array, write_schedule
 
-model = Model("Optimization")
+output_file_path = 'data/m2_output_data_1h.csv'
 
 # 1. Parameter
 
@@ -37,62 +36,33 @@ total_battery_cost = battery_cost*number_of_battery  # per day
 single_battery_capacity = 150 # Battery capacity is fixed
 Beta_max = single_battery_capacity * number_of_battery  # maximum battery capacity (define this)
 
-# ----------------------------------------------------------------
-E = model.addVars(3, 3, T, name="E")  # Energy variables Eijt
-y2tch = model.addVars(T, vtype=GRB.BINARY, name="y2tch")  # Binary variables for ESS charge state
-y2td = model.addVars(T, vtype=GRB.BINARY, name="y2td")  # Binary variables for ESS discharge state
-battery_power = model.addVars(T, name="battery_power")  # Current power of ESS
+# 1.5 Formulation: 'bilinear' (original), 'linear' (big-M MILP) or 'lp' (DC_AC_efficiency 1 only)
+formulation = 'bilinear'
 
-# ----------------------------------------------------------------
+# 1.6 Solver: 'gurobi' or 'highs' (scipy, no license needed)
+solver = 'gurobi'
 
-model.setObjective(sum((ctb[t]/1000) * (E[0, 2, t] + E[0, 1, t])
-                    - selling_price_discount * (ctb[t]/1000) * E[1, 0, t] for t in range(T))
-                    + total_battery_cost
-                    , GRB.MINIMIZE)
+# 1.7 Fast path: exact dispatch without a solver when DC_AC_efficiency is 1, the solver otherwise
+fast_path = True
 
 # ----------------------------------------------------------------
-# Fulfill load demand
-model.addConstrs((E[0, 2, t] + E[1, 2, t] == Ed[t] for t in range(T)), "LoadDemand")
-
-# ESS does not charge and discharge simultaneously
-model.addConstrs((y2tch[t] + y2td[t] <= 1 for t in range(T)), "ChargeDischarge")
-
-# ESS discharge does not exceed its current power
-model.addConstrs((E[1, 2, t] + E[1, 0, t] <= battery_power[t] * y2td[t] for t in range(T)), "DischargeLimit")
-
-# ESS charge does not exceed what’s left
-model.addConstrs((E[0, 1, t] <= (Beta_max - battery_power[t]) * y2tch[t] for t in range(T)), "ChargeLimit")
-model.addConstrs((E[0, 1, t] <= Beta_max for t in range(T)), "ChargeLimit_2")
-
-# ESS power does not exceed its max capacity and is non-negative
-for t in range(T):
-    model.addConstr(battery_power[t] >= 0, f"PowerLowerBound_{t}")
-    model.addConstr(battery_power[t] <= Beta_max, f"PowerUpperBound_{t}")
-
-# ESS min charge/discharge 1MWh
-model.addConstrs((E[0, 1, t] >= y2tch[t] for t in range(T)), "ChargeConstraint")
-model.addConstrs((E[1, 2, t] >= y2td[t] for t in range(T)), "DischargeConstraint")
-
-# ESS current power is based on previous round power
-for t in range(1, T):
-    model.addConstr(battery_power[t] == battery_power[t-1] - (E[1, 2, t-1] + E[1, 0, t-1]) * y2td[t-1] +
-                    E[0, 1, t-1] * y2tch[t-1], "PowerUpdate")
-
-# Battery fully discharged at t=1
-model.addConstr(battery_power[0] == 0, "InitialDischarge")
+battery_model = make_battery_model(ctb, Ed, Beta_max, total_battery_cost, selling_price_discount, 1,
+                                   formulation, solver=solver, fast_path=fast_path)
 
 # ----------------------------------------------------------------
 
-model.optimize()
+battery_model.optimize()
 
-if model.Status == GRB.OPTIMAL:
+if battery_model.Status == OPTIMAL:
     print("Optimal solution found.")
-elif model.Status == GRB.INFEASIBLE:
+    # (T, 13) array of the price and the solution, extracted in one call
+    schedule = schedule_array(ctb, battery_model.solution())
+elif battery_model.Status == INFEASIBLE:
     print("Model is infeasible.")
-elif model.Status == GRB.UNBOUNDED:
+elif battery_model.Status == UNBOUNDED:
     print("Model is unbounded.")
 else:
-    print("Optimization ended with status:", model.Status)
+    print("Optimization ended with status:", battery_model.Status)
 print('--------------------------------------------------')
 print(f"Average hourly power consumption: {Ed} kwh")
 print(f"Number of battery: {number_of_battery}")
@@ -100,35 +70,13 @@ print(f"Total battery cost: ${total_battery_cost}")
 
 print(f"Max battery capacity: {Beta_max} kWh")
 print('--------------------------------------------------')
-if model.Status == GRB.OPTIMAL:
-    for t in range(T):
-        label = ['Grid', 'ESS', 'Load']
-        print(f"Time {t}: Electricity Price = {ctb[t]/1000} ,Battery Power = {battery_power[t].X}, ESS Charge = {y2tch[t].X}, ESS Discharge = {y2td[t].X}")
-        for i in range(3):
-            for j in range(3):
-                if E[i, j, t].X != 0:
-                    print(f"{label[i]} to {label[j]} at {t} = {E[i, j, t].X}")
-        print('--------------------------------------------------')
+if battery_model.Status == OPTIMAL:
+    print_schedule(schedule)
 
 print(f'Cost without battery: $ {cost_wo_battery}')
-print(f'Cost with battery: $ {model.objVal}')
-print(f'Cost difference: $ {cost_wo_battery - model.objVal}')
+print(f'Cost with battery: $ {battery_model.objVal}')
+print(f'Cost difference: $ {cost_wo_battery - battery_model.objVal}')
 
 # write data in csv
-with open(output_file_path, mode='w', newline='') as csv_file:
-    writer = csv.writer(csv_file)
-
-    # Write header
-    header = ['Time', 'Electricity Price', 'Battery Power', 'ESS Charge', 'ESS Discharge']
-    for i in range(3):
-        for j in range(3):
-            header.append(f'E[{i},{j}]')
-    writer.writerow(header)
-
-    # Write data
-    for t in range(T):
-        row = [t, ctb[t]/1000, battery_power[t].X, y2tch[t].X, y2td[t].X]
-        for i in range(3):
-            for j in range(3):
-                row.append(E[i, j, t].X)
-        writer.writerow(row)
\ No newline at end of file
+if battery_model.Status == OPTIMAL:
+    write_schedule(output_file_path, schedule)
@@ -1,9 +1,12 @@
-from gurobipy import Model, GRB
-import pandas as pd
-import numpy as np
-import json
+import os
+from functools import partial
 
-from sklearn.metrics import mean_squared_error as mse
+from forecast_error import error_statistics
+from price_store import select_prices
+from profiling import profiler
+from result_analysis import cost_summary, load_result_arrays, print_cost_summary
+from result_store import ResultWriter
+from scenario_runner import battery_setup, error_model_scenario, price_scenario, run_scenarios
 
 # 1. Global Parameter
 
@@ -12,16 +15,17 @@ T = 48 # 1 day, every 30 minutes
 
 # 1.2 Price ($/MWh)
 # Price forecast, as nominal
-forecast_price = pd.read_csv('./data/USEP_08Nov2023_to_14Nov2023.csv')
-price_nominal = forecast_price['USEP ($/MWh)'].tolist()
-
-# Use historical data to calculate the RMSE of the price forecast, as deviation
-historical_price = pd.read_csv('./data/WEP_10Oct2023_to_09Nov2023.csv')
-actual_price= historical_price['WEP ($/MWh)']
-predicted_price =historical_price['USEP ($/MWh)']
-price_rmse= mse(actual_price, predicted_price, squared=False)
+price_nominal = select_prices('./data/USEP_08Nov2023_to_14Nov2023.csv', 'USEP', unit='MWh').tolist()
+
+# Use historical data (WEP actual, USEP forecast) to calculate the forecast error, cached per file
+error_stats = error_statistics('./data/WEP_10Oct2023_to_09Nov2023.csv', 'WEP', 'USEP')
+price_rmse = error_stats['rmse']
 print(f'The forecast model error is: {price_rmse: .2f} $/MWh')
 
+# Error model: None draws each period around the nominal with the global RMSE (independent),
+# 'independent', 'ar1' or 'cholesky' use the per-period error statistics (see forecast_error.py)
+error_model = None
+
 selling_price_discount = 0.9
 
 # 1.3 Demand in kwh
@@ -40,131 +44,62 @@ Beta_max = single_battery_capacity_kwh * number_of_battery  # maximum battery ca
 # 1.5 Sample size
 sample_size = 1000
 
-# ----------------------------------------------------------------
-
-# 2. Model Setup
-
-def model_price_error_setup():
-
-    model = Model("Price Forecast Error")
-
-    # Set parameters
-    prices = np.random.normal(price_nominal, price_rmse, T)
-    cost_wo_battery = sum(Ed * (price/1000) for price in prices)
-
-    # Add variables
-
-    E = model.addVars(3, 3, T, name="E")  # Energy variables Eijt
-    y2tch = model.addVars(T, vtype=GRB.BINARY, name="y2tch")  # Binary variables for ESS charge state
-    y2td = model.addVars(T, vtype=GRB.BINARY, name="y2td")  # Binary variables for ESS discharge state
-    battery_power = model.addVars(T, name="battery_power")  # Current power of ESS
-
-    # Set objective function
-
-    model.setObjective(sum((prices[t]/1000) * (E[0, 2, t] + E[0, 1, t])
-                        - selling_price_discount * (prices[t]/1000) * E[1, 0, t] for t in range(T))
-                        + total_battery_cost
-                        , GRB.MINIMIZE)
-
-    # Add constraints
-
-    # Fulfill load demand
-    model.addConstrs((E[0, 2, t] + E[1, 2, t] == Ed for t in range(T)), "LoadDemand")
+# 1.6 Formulation: 'bilinear' (original), 'linear' (big-M MILP) or 'lp' (DC_AC_efficiency 1 only)
+formulation = 'bilinear'
+solver = 'gurobi'  # or 'highs' (scipy, no license needed)
 
-    # ESS does not charge and discharge simultaneously
-    model.addConstrs((y2tch[t] + y2td[t] <= 1 for t in range(T)), "ChargeDischarge")
+# 1.7 Parallel run
+seed = 2023
+workers = os.cpu_count()
+threads_per_worker = 1  # Gurobi threads in each worker process
+results_dir = './data/results_m3_1'  # .npz chunks, an interrupted run resumes from the stored samples
+restart = False  # replace the stored samples when the parameters below changed since they were written
 
-    # ESS discharge does not exceed its current power
-    model.addConstrs((E[1, 2, t] + E[1, 0, t] <= DC_AC_efficiency * battery_power[t] * y2td[t] for t in range(T)), "DischargeLimit")
+# 1.8 Profiling: per-stage timings and solver statistics (BATTERY_PROFILE=1 also times the price loading)
+profile = False
+trace_file = './data/m3_1_profile.json'
+if profile:
+    profiler.enable()
 
-    # ESS charge does not exceed what’s left
-    model.addConstrs((DC_AC_efficiency * E[0, 1, t] <= (Beta_max - battery_power[t]) * y2tch[t] for t in range(T)), "ChargeLimit")
-    model.addConstrs((DC_AC_efficiency * E[0, 1, t] <= Beta_max for t in range(T)), "ChargeLimit_2")
-
-    # ESS power does not exceed its max capacity and is non-negative
-    for t in range(T):
-        model.addConstr(battery_power[t] >= 0, f"PowerLowerBound_{t}")
-        model.addConstr(battery_power[t] <= Beta_max, f"PowerUpperBound_{t}")
-
-    # ESS min charge/discharge 1MWh
-    model.addConstrs((E[0, 1, t] >= y2tch[t] for t in range(T)), "ChargeConstraint")
-    model.addConstrs((E[1, 2, t] >= y2td[t] for t in range(T)), "DischargeConstraint")
-
-    # ESS current power is based on previous round power
-    for t in range(1, T):
-        model.addConstr(battery_power[t] == battery_power[t-1] - (E[1, 2, t-1] + E[1, 0, t-1]) * y2td[t-1] / DC_AC_efficiency +
-                        DC_AC_efficiency * E[0, 1, t-1] * y2tch[t-1], "PowerUpdate")
-
-    # Battery fully discharged at t=1
-    model.addConstr(battery_power[0] == 0, "InitialDischarge")
+# ----------------------------------------------------------------
 
-    model.setParam( 'OutputFlag', False )
+# 2. Model Setup
 
-    return model, prices, cost_wo_battery, E, y2tch, y2td, battery_power
+# Each worker builds the model once, each sample only updates the price coefficients of the objective
+setup = partial(battery_setup, prices=price_nominal[:T], demand=Ed, Beta_max=Beta_max,
+                total_battery_cost=total_battery_cost, selling_price_discount=selling_price_discount,
+                DC_AC_efficiency=DC_AC_efficiency, formulation=formulation, solver=solver,
+                name="Price Forecast Error")
+if error_model is None:
+    scenario = partial(price_scenario, price_nominal=price_nominal[:T], price_rmse=price_rmse, Ed=Ed)
+else:
+    scenario = partial(error_model_scenario, price_nominal=price_nominal[:T], statistics=error_stats,
+                       method=error_model, Ed=Ed)
 
 # ----------------------------------------------------------------
 
 # 3. Model Run
 
-result_all = []
-
-
-for i in range(sample_size):
-
-    result_sample = {'sample': i, 'cost_w/o_battery': 0, 'time_steps': {}}
-
-    model, prices, cost_wo_battery, E, y2tch, y2td, battery_power = model_price_error_setup()
-    model.optimize()
-
-    if model.Status == GRB.OPTIMAL:
-        result_sample['cost_w/o_battery'] = cost_wo_battery
-        result_sample['cost_w_battery'] = model.objVal
-        result_sample['cost_diff'] = cost_wo_battery - model.objVal
-
-        for t in range (T):
-            result_sample['time_steps'][t] = {
-                'price': prices[t]/1000,
-                'battery_power': battery_power[t].X,
-                'y2tch': y2tch[t].X,
-                'y2td': y2td[t].X,
-                'E': {}
-            }
-            for j in range(3):
-                for k in range(3):
-                    result_sample['time_steps'][t]['E'][f'{j}_{k}'] = E[j, k, t].X
-
-    result_all.append(result_sample)
+# Each finished sample is streamed to the result store
+# Everything that changes the samples, a results_dir written with other values is not resumed
+fingerprint = {'T': T, 'seed': seed, 'price_nominal': price_nominal[:T], 'price_rmse': price_rmse,
+               'error_model': error_model, 'Ed': Ed, 'Beta_max': Beta_max, 'total_battery_cost': total_battery_cost,
+               'selling_price_discount': selling_price_discount, 'DC_AC_efficiency': DC_AC_efficiency,
+               'formulation': formulation, 'solver': solver}
+with ResultWriter(results_dir, fingerprint=fingerprint, restart=restart) as writer:
+    for record in run_scenarios(setup, scenario, sample_size, seed, workers, threads_per_worker,
+                                skip=writer.completed()):
+        writer.append(record)
 
-result_df = pd.DataFrame(result_all)
+results = load_result_arrays(results_dir)
 
-# Save to JSON
-with open('./data/results_m3_1.json', 'w') as f:
-    json.dump(result_all, f)
+if profiler.enabled:
+    profiler.print_summary()
+    profiler.write_trace(trace_file)
 
 # ----------------------------------------------------------------
 
 # 4. Result Analysis
 
-# Initialize sums
-total_cost_wo_battery = 0
-total_cost_with_battery = 0
-total_cost_difference = 0
-successful_samples = 0
-
-# Loop through all results and sum the required values
-for result in result_all:
-    if 'cost_w_battery' in result:  # This checks if the optimization was successful
-        total_cost_wo_battery += result['cost_w/o_battery']
-        total_cost_with_battery += result['cost_w_battery']
-        total_cost_difference += result['cost_diff']
-        successful_samples += 1
-
-# Calculate averages
-average_cost_wo_battery = total_cost_wo_battery / successful_samples if successful_samples > 0 else 0
-average_cost_with_battery = total_cost_with_battery / successful_samples if successful_samples > 0 else 0
-average_cost_difference = total_cost_difference / successful_samples if successful_samples > 0 else 0
-
-# Print or store the averages as needed
-print(f"Average cost without battery: {average_cost_wo_battery}")
-print(f"Average cost with battery: {average_cost_with_battery}")
-print(f"Average cost difference: {average_cost_difference}")
+# Mean, median, quantiles and confidence interval of the costs over the successful samples
+print_cost_summary(cost_summary(results))
@@ -1,9 +1,11 @@
 import math
 
 import numpy as np
-import pandas as pd
 import csv
 
+from dp_engine import resell_actions, solve
+from price_store import select_prices
+
 output_file_path = 'data/m3_dp_resell_48.csv'
 
 # Constants and Inputs
@@ -23,53 +25,14 @@ total_battery_cost = battery_cost*number_of_battery  # per day
 
 # technician_cost = 89.4  # /kWh
 
-df = pd.read_csv('data/USEP_08Nov2023.csv')
-prices = df['USEP ($/MWh)'].tolist()
-
-for i in range(len(prices)):
-    prices[i] = prices[i] / 1000
-
-# Memoization Table
-memo = {}
-
-def find_min_cost(t, battery_level):
-    # Base case: end of the time horizon
-    if t == T:
-        return 0, [], []
-
-    # Check if the state has been computed before
-    if (t, battery_level) in memo:
-        return memo[(t, battery_level)]
-
-    # Decision 1: Charge the battery by 50%
-    cost_charge = battery_capacity * prices[t]
-    new_battery_level_charge = min(battery_level + battery_capacity, battery_capacity)
-    future_cost_charge, future_decisions_charge, future_charge_level = find_min_cost(t + 1, new_battery_level_charge)
-    total_cost_charge = cost_charge + demand[t] * prices[t] + future_cost_charge
-
-    # Decision 2: Discharge all from the battery
-    discharge_amount = min(battery_level, demand[t])
-    resell_amount = battery_level - discharge_amount
-    new_battery_level_discharge = 0
-    future_cost_discharge, future_decisions_discharge, future_discharge_level = find_min_cost(t + 1, new_battery_level_discharge)
-    total_cost_discharge = (demand[t] - discharge_amount) * prices[t] + future_cost_discharge - resell_amount * prices[t] * 0.9
-
-    # Decision 3: Do nothing
-    future_cost_do_nothing, future_decisions_do_nothing, future_do_nothing_level = find_min_cost(t + 1, battery_level)
-    total_cost_do_nothing = demand[t] * prices[t] + future_cost_do_nothing
-
-    target = min(total_cost_do_nothing, total_cost_charge, total_cost_discharge)
-    if target == total_cost_do_nothing:
-        memo[(t, battery_level)] = (total_cost_do_nothing, ["Do Nothing"] + future_decisions_do_nothing, [battery_level] + future_do_nothing_level)
-    elif target == total_cost_charge:
-        memo[(t, battery_level)] = (total_cost_charge, ["Charge"] + future_decisions_charge, [new_battery_level_charge] + future_charge_level)
-    else:
-        memo[(t, battery_level)] = (total_cost_discharge, ["Discharge"] + future_decisions_discharge, [new_battery_level_discharge] + future_discharge_level)
-
-    return memo[(t, battery_level)]
+# Prices in $/kWh
+prices = select_prices('data/USEP_08Nov2023.csv', 'USEP').tolist()
 
 # Compute the optimal decisions
-min_cost, optimal_decisions, battery_level = find_min_cost(0, 0)
+# resell_actions only reach an empty or a full battery, so a 2-level grid is exact
+n_states = 2
+actions = resell_actions(battery_capacity, 0.9)
+min_cost, optimal_decisions, battery_level = solve(prices, demand, actions, battery_capacity, n_states)
 
 # Output
 for i in range(len(optimal_decisions)):
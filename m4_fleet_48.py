@@ -0,0 +1,89 @@
+import csv
+
+from battery_matrix import INFEASIBLE, OPTIMAL, SUBOPTIMAL, UNBOUNDED
+from fleet_model import solve_fleet
+from price_store import select_prices
+
+output_file_path = './data/m4_fleet_output_data_48.csv'
+
+# 1. Parameter
+
+# 1.1 Time
+T = 48 # 1 day, every 30 minutes
+
+# 1.2 Price ($/MWh)
+ctb = select_prices('./data/USEP_08Nov2023.csv', 'USEP', unit='MWh').tolist()
+
+selling_price_discount = 0.9
+
+# 1.3 Demand in kwh
+Ed = 111.87 * 0.5 * 3
+cost_wo_battery = sum(Ed * (price/1000) for price in ctb)
+
+# 1.4 Battery fleet, one entry per battery
+single_battery_capacity_kwh = [150, 150, 100]
+DC_AC_efficiency = [1, 0.94, 0.94]
+battery_cost = [11.35, 11.35, 8.5] # per day
+
+total_battery_cost = sum(battery_cost)  # per day
+
+# 1.5 Site grid connection in kwh per period (None for no limit)
+import_limit = 300
+export_limit = 200
+
+# 1.6 Solver: 'highs' (scipy, no license needed) or 'gurobi'
+solver = 'highs'
+max_fleet_size = 20  # larger fleets are solved battery by battery
+
+# ----------------------------------------------------------------
+
+status, objVal, solution = solve_fleet(ctb, Ed, single_battery_capacity_kwh, DC_AC_efficiency, battery_cost,
+                                       import_limit, export_limit, selling_price_discount, solver=solver,
+                                       max_fleet_size=max_fleet_size)
+
+if status == OPTIMAL:
+    print("Optimal solution found.")
+elif status == SUBOPTIMAL:
+    print("Feasible solution found by decomposition, not proven optimal.")
+elif status == INFEASIBLE:
+    print("Model is infeasible.")
+elif status == UNBOUNDED:
+    print("Model is unbounded.")
+else:
+    print("Optimization ended with status:", status)
+print('--------------------------------------------------')
+print(f"Average hourly power consumption: {Ed} kwh")
+print(f"Number of battery: {len(single_battery_capacity_kwh)}")
+print(f"Total battery cost: ${total_battery_cost}")
+
+print(f"Max battery capacity: {sum(single_battery_capacity_kwh)} kWh")
+print('--------------------------------------------------')
+if status in (OPTIMAL, SUBOPTIMAL):
+    for t in range(T):
+        print(f"Time {t}: Electricity Price = {ctb[t]/1000}, Grid to Load = {solution['E02'][t]}")
+        for n in range(len(single_battery_capacity_kwh)):
+            print(f"  Battery {n}: Battery Power = {solution['battery_power'][n, t]}, "
+                  f"ESS Charge = {solution['y2tch'][n, t]}, ESS Discharge = {solution['y2td'][n, t]}, "
+                  f"Grid to ESS = {solution['E01'][n, t]}, ESS to Load = {solution['E12'][n, t]}, "
+                  f"ESS to Grid = {solution['E10'][n, t]}")
+        print('--------------------------------------------------')
+
+    print(f'Cost without battery: $ {cost_wo_battery}')
+    print(f'Cost with battery: $ {objVal}')
+    print(f'Cost difference: $ {cost_wo_battery - objVal}')
+
+    # write data in csv
+    with open(output_file_path, mode='w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+
+        # Write header
+        header = ['Time', 'Battery', 'Electricity Price', 'Battery Power', 'ESS Charge', 'ESS Discharge',
+                  'E[0,1]', 'E[1,0]', 'E[1,2]', 'Site E[0,2]']
+        writer.writerow(header)
+
+        # Write data
+        for t in range(T):
+            for n in range(len(single_battery_capacity_kwh)):
+                writer.writerow([t, n, ctb[t]/1000, solution['battery_power'][n, t], solution['y2tch'][n, t],
+                                 solution['y2td'][n, t], solution['E01'][n, t], solution['E10'][n, t],
+                                 solution['E12'][n, t], solution['E02'][t]])
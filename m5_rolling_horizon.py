@@ -0,0 +1,57 @@
+import numpy as np
+
+from price_store import select_prices
+from rolling_horizon import rolling_horizon
+from schedule_output import schedule_array, write_schedule
+
+output_file_path = './data/m5_rolling_horizon_output_data.csv'
+
+# 1. Parameter
+
+# 1.1 Time
+periods_per_day = 48  # every 30 minutes
+window = 48  # periods optimized at each step, 1 day every 30 minutes
+commit = 1  # periods dispatched before re-optimizing
+dispatch_cadence = 30 * 60  # seconds between dispatches
+
+# 1.2 Price ($/MWh), a week or a month of periods
+ctb = select_prices('./data/USEP_08Nov2023_to_14Nov2023.csv', 'USEP', unit='MWh').tolist()
+T = len(ctb)
+
+selling_price_discount = 0.9
+
+# 1.3 Demand in kwh
+Ed = 111.87 * 0.5
+cost_wo_battery = sum(Ed * (price/1000) for price in ctb)
+
+# 1.4 Battery
+number_of_battery = 1
+battery_cost = 11.35 # per day
+DC_AC_efficiency = 0.94
+
+total_battery_cost = battery_cost*number_of_battery  # per day
+
+single_battery_capacity_kwh = 150 # Battery capacity is fixed
+Beta_max = single_battery_capacity_kwh * number_of_battery  # maximum battery capacity (define this)
+
+# 1.5 Formulation and solver, see battery_model.py and battery_matrix.py
+formulation = 'linear'
+solver = 'gurobi'
+
+# ----------------------------------------------------------------
+
+schedule = rolling_horizon(ctb, Ed, Beta_max, total_battery_cost, selling_price_discount, DC_AC_efficiency,
+                           window, commit, formulation, solver, periods_per_day=periods_per_day)
+latency = schedule['latency']
+
+print(f"Periods: {T}, windows solved: {len(latency)}")
+print(f"Solve latency per window: mean {latency.mean() * 1000:.1f} ms, "
+      f"p95 {np.percentile(latency, 95) * 1000:.1f} ms, max {latency.max() * 1000:.1f} ms")
+print(f"Slowest window uses {latency.max() / dispatch_cadence:.6%} of the {dispatch_cadence / 60:.0f}-minute dispatch cadence")
+print('--------------------------------------------------')
+print(f'Cost without battery: $ {cost_wo_battery}')
+print(f'Cost with battery: $ {schedule["cost"]}')
+print(f'Cost difference: $ {cost_wo_battery - schedule["cost"]}')
+
+# write data in csv, the latency is the solve that committed the period
+write_schedule(output_file_path, schedule_array(ctb, schedule), {'Solve Latency': latency[np.arange(T) // commit]})
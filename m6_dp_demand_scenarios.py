@@ -0,0 +1,57 @@
+import time
+
+import numpy as np
+
+from dp_engine import resell_actions, solve_batch
+from price_store import select_prices
+
+# Demand stress test of the resell DP (m3_dp_resell_48.py) on many scenarios at once
+
+# 1. Parameter
+
+# 1.1 Time
+T = 48  # 1 day, every 30 minutes
+
+# 1.2 Price ($/kWh)
+prices = select_prices('data/USEP_08Nov2023.csv', 'USEP')
+
+# 1.3 Demand scenarios in kwh
+sample_size = 100000
+consumption_mean = 111.87 * 0.5
+consumption_std_dev = 4.93
+seed = 2023
+
+# 1.4 Battery
+number_of_battery = 1
+battery_capacity = 150 * number_of_battery
+battery_cost = 16.93 # per day
+total_battery_cost = battery_cost*number_of_battery  # per day
+selling_price_discount = 0.9
+
+# 1.5 DP grid, resell_actions only reach an empty or a full battery
+n_states = 2
+
+# ----------------------------------------------------------------
+
+rng = np.random.default_rng(seed)
+demand = rng.normal(consumption_mean, consumption_std_dev, (sample_size, T))
+scenario_prices = np.broadcast_to(prices, (sample_size, T))
+
+start = time.perf_counter()
+actions = resell_actions(battery_capacity, selling_price_discount)
+min_cost, decisions, battery_level = solve_batch(scenario_prices, demand, actions, battery_capacity, n_states)
+elapsed = time.perf_counter() - start
+
+cost_with_battery = min_cost + total_battery_cost
+cost_wo_battery = np.sum(demand * scenario_prices, axis=1)
+cost_difference = cost_wo_battery - cost_with_battery
+
+print(f"{sample_size} scenarios in {elapsed:.2f} s ({sample_size / elapsed:.0f} scenarios per second)")
+print(f"Average cost without battery: {cost_wo_battery.mean()}")
+print(f"Average cost with battery: {cost_with_battery.mean()}")
+print(f"Average cost difference: {cost_difference.mean()}")
+print(f"Cost difference 5%-95%: {np.quantile(cost_difference, 0.05)} to {np.quantile(cost_difference, 0.95)}")
+
+# Share of scenarios taking each decision per period
+for a, (name, _) in enumerate(actions):
+    print(f"{name}: {np.round(np.mean(decisions == a, axis=0), 2).tolist()}")
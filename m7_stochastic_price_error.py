@@ -0,0 +1,113 @@
+import time
+
+import numpy as np
+
+from battery_matrix import OPTIMAL, make_battery_model
+from forecast_error import error_statistics, price_paths
+from price_store import select_prices
+from scenario_reduction import reduce_scenarios
+from stochastic_model import FIRST_STAGE, SCHEDULE, commitment_costs, solve_stochastic
+
+# Price forecast error as one two-stage stochastic program (see m2_price_forecast_error.py for
+# the perfect-foresight solve of every sample): the price samples are reduced to a few
+# representative scenarios and a single solve gives one battery schedule for all of them.
+
+# 1. Parameter
+
+# 1.1 Time
+T = 48 # 1 day, every 30 minutes
+
+# 1.2 Price ($/MWh)
+# Price forecast, as nominal
+price_nominal = select_prices('./data/USEP_08Nov2023_to_14Nov2023.csv', 'USEP', unit='MWh')[:T]
+
+# Use historical data (WEP actual, USEP forecast) to calculate the forecast error, cached per file
+error_stats = error_statistics('./data/WEP_10Oct2023_to_09Nov2023.csv', 'WEP', 'USEP')
+price_rmse = error_stats['rmse']
+print(f'The forecast model error is: {price_rmse: .2f} $/MWh')
+
+selling_price_discount = 0.9
+
+# 1.3 Demand in kwh
+Ed = 111.87 * 0.5
+
+# 1.4 Battery
+number_of_battery = 1
+battery_cost = 11.35 # per day
+DC_AC_efficiency = 1
+
+total_battery_cost = battery_cost*number_of_battery  # per day
+
+single_battery_capacity_kwh = 150 # Battery capacity is fixed
+Beta_max = single_battery_capacity_kwh * number_of_battery  # maximum battery capacity (define this)
+
+# 1.5 Scenarios
+sample_size = 1000
+seed = 2023
+n_scenarios = 10  # representative scenarios after reduction
+reduction = 'kmeans'  # keeps the mean price, or 'fast_forward' to keep original samples
+# None draws each period independently with the global RMSE, 'independent', 'ar1' or
+# 'cholesky' use the per-period error statistics (see forecast_error.py)
+error_model = None
+
+# 1.6 Stochastic model
+# FIRST_STAGE commits to when the battery charges and discharges, the amounts are recourse per
+# scenario. SCHEDULE commits to the whole schedule, with only the prices uncertain that is the
+# deterministic model at the mean price of the reduced scenarios.
+first_stage = FIRST_STAGE
+relax = False
+solver = 'highs'  # or 'gurobi'
+
+# ----------------------------------------------------------------
+
+# 2. Scenarios
+rng = np.random.default_rng(seed)
+if error_model is None:
+    price_samples = rng.normal(price_nominal, price_rmse, (sample_size, T))
+else:
+    price_samples = price_paths(price_nominal, error_stats, sample_size, error_model, rng)
+
+start = time.perf_counter()
+scenarios, probabilities = reduce_scenarios(price_samples, n_scenarios, reduction, seed=seed)
+reduction_time = time.perf_counter() - start
+
+# 3. Model Run
+start = time.perf_counter()
+# Identical runs are read from the result cache when BATTERY_CACHE is set
+status, stochastic_cost, stochastic_solution = solve_stochastic(scenarios, Ed, Beta_max, total_battery_cost,
+                                                                probabilities, selling_price_discount,
+                                                                DC_AC_efficiency, relax, first_stage=first_stage,
+                                                                solver=solver)
+solve_time = time.perf_counter() - start
+if status != OPTIMAL:
+    raise RuntimeError(f"Stochastic model ended with status {status}")
+
+# Deterministic schedule on the nominal forecast, for comparison
+start = time.perf_counter()
+nominal_model = make_battery_model(price_nominal, Ed, Beta_max, total_battery_cost, selling_price_discount,
+                                   DC_AC_efficiency, 'lp' if relax else 'linear', solver=solver, builder='matrix')
+nominal_model.optimize()
+nominal_time = time.perf_counter() - start
+
+# ----------------------------------------------------------------
+
+# 4. Result Analysis
+print(f"Reduced {sample_size} samples to {len(scenarios)} scenarios in {reduction_time:.3f} s, "
+      f"stochastic solve {solve_time:.3f} s, deterministic solve {nominal_time:.3f} s")
+print(f"Expected cost over the reduced scenarios: {stochastic_cost}")
+if set(SCHEDULE) <= set(first_stage):
+    print("The whole schedule is first stage: the same schedule as the deterministic model at the mean scenario price")
+
+# The first-stage commitments of both models on every price sample, the recourse optimized per sample
+cost_wo_battery = price_samples @ np.full(T, Ed) / 1000
+nominal = nominal_model.solution()
+E = nominal['E']
+nominal = dict(nominal, E01=E[0, 1], E02=E[0, 2], E10=E[1, 0], E12=E[1, 2])
+for name, commitments in (('Stochastic', stochastic_solution), ('Nominal', nominal)):
+    cost_with_battery = commitment_costs(commitments, price_samples, Ed, Beta_max, total_battery_cost,
+                                         selling_price_discount, DC_AC_efficiency, first_stage=first_stage,
+                                         solver=solver)
+    cost_difference = cost_wo_battery - cost_with_battery
+    print(f"{name} commitments: average cost with battery {cost_with_battery.mean()}, "
+          f"average cost difference {cost_difference.mean()}, "
+          f"5%-95% {np.quantile(cost_difference, 0.05)} to {np.quantile(cost_difference, 0.95)}")
@@ -0,0 +1,48 @@
+import os
+
+from price_store import select_prices
+from sizing_sweep import best_sizes, sweep_sizes, write_frontier
+
+output_file_path = './data/m8_sizing_frontier.csv'
+
+# 1. Parameter
+
+# 1.1 Time
+T = 48 # 1 day, every 30 minutes
+
+# 1.2 Price ($/MWh)
+ctb = select_prices('./data/USEP_08Nov2023.csv', 'USEP', unit='MWh').tolist()
+
+# 1.3 Demand in kwh
+Ed = 111.87 * 0.5
+
+# 1.4 Battery grids
+single_battery_capacity_kwh = [50, 100, 150, 200, 300]
+number_of_battery = [1, 2, 3]
+DC_AC_efficiency = [0.94, 1]
+selling_price_discount = [0.8, 0.9]
+
+
+def battery_cost(capacity):
+    return 11.35 * capacity / 150 # per day, 11.35 for a 150 kWh battery
+
+
+# 1.5 Solver and parallel run
+solver = 'highs'  # or 'gurobi'
+workers = os.cpu_count()
+threads_per_worker = 1
+prune = True  # False solves every grid point for a complete frontier
+
+# ----------------------------------------------------------------
+
+frontier = sweep_sizes(ctb, Ed, single_battery_capacity_kwh, number_of_battery, DC_AC_efficiency,
+                       selling_price_discount, battery_cost, solver=solver, workers=workers,
+                       threads=threads_per_worker, prune=prune)
+write_frontier(output_file_path, frontier)
+
+solved = sum(frontier['status'] == 'solved')
+print(f"{len(frontier['status'])} grid points, {solved} solved, the others interpolated or pruned")
+for (efficiency, discount), k in best_sizes(frontier).items():
+    print(f"Efficiency {efficiency}, discount {discount}: {frontier['count'][k]} x {frontier['capacity'][k]} kWh, "
+          f"total cost $ {frontier['total_cost'][k]:.2f} (operating $ {frontier['operating_cost'][k]:.2f}, "
+          f"battery $ {frontier['battery_cost'][k]:.2f})")
@@ -0,0 +1,83 @@
+import os
+import time
+
+import numpy as np
+
+from forecast_error import error_statistics
+from joint_scenarios import evaluate_scenarios, joint_paths, successful
+from price_store import select_prices
+from result_analysis import cost_summary, print_cost_summary
+
+# Savings of the battery under joint price and demand uncertainty: the price follows the
+# forecast error model of the historical file, the demand a time-of-day profile with AR(1)
+# errors correlated with the price errors (see joint_scenarios.py)
+
+# 1. Parameter
+
+# 1.1 Time
+T = 48  # 1 day, every 30 minutes
+
+# 1.2 Price ($/MWh)
+# Price forecast, as nominal
+price_nominal = select_prices('./data/USEP_08Nov2023.csv', 'USEP', unit='MWh')[:T]
+
+# Forecast error of the historical file (WEP actual, USEP forecast), cached per file
+error_stats = error_statistics('./data/WEP_10Oct2023_to_09Nov2023.csv', 'WEP', 'USEP')
+error_model = 'ar1'  # 'independent', 'ar1' or 'cholesky'
+
+# 1.3 Demand in kwh
+# A number, or a time-of-day profile with one value per period of the day
+consumption_mean = 111.87 * 0.5
+consumption_std_dev = 4.93
+demand_phi = 0.5  # AR(1) coefficient of the demand errors (assumed)
+correlation = 0.3  # correlation of the demand and price errors of a period (assumed)
+
+# 1.4 Battery
+number_of_battery = 1
+battery_cost = 11.35 # per day
+DC_AC_efficiency = 1
+selling_price_discount = 0.9
+
+total_battery_cost = battery_cost*number_of_battery  # per day
+
+single_battery_capacity_kwh = 150 # Battery capacity is fixed
+Beta_max = single_battery_capacity_kwh * number_of_battery  # maximum battery capacity (define this)
+
+# 1.5 Scenarios
+sample_size = 10000
+seed = 2023
+
+# 1.6 Solver path: 'fast' (solver-free dispatch, HiGHS when it does not apply), 'dp' (step DP,
+# see step_actions in dp_engine.py), 'highs' or 'gurobi' (MILP, one solve per scenario)
+path = 'fast'
+batch_size = 1000
+dp_step = 1.5  # kWh, charge and discharge step of the 'dp' path
+workers = os.cpu_count()
+
+# ----------------------------------------------------------------
+
+# 2. Scenarios
+
+start = time.perf_counter()
+prices, demand = joint_paths(price_nominal, error_stats, consumption_mean, consumption_std_dev, sample_size,
+                             correlation, error_model, demand_phi, seed)
+print(f"{sample_size} joint scenarios drawn in {time.perf_counter() - start:.2f} s")
+
+# ----------------------------------------------------------------
+
+# 3. Model Run
+
+start = time.perf_counter()
+results = evaluate_scenarios(prices, demand, Beta_max, total_battery_cost, selling_price_discount,
+                             DC_AC_efficiency, path, batch_size=batch_size, workers=workers, step=dp_step)
+elapsed = time.perf_counter() - start
+print(f"{sample_size} scenarios on the {path} path in {elapsed:.2f} s "
+      f"({sample_size / elapsed:.0f} scenarios per second)")
+
+# ----------------------------------------------------------------
+
+# 4. Result Analysis
+
+# Mean, median, quantiles and confidence interval of the costs over the successful samples
+print_cost_summary(cost_summary(successful(results)))
+print(f"Share of scenarios where the battery saves money: {np.mean(results['cost_diff'] > 0):.1%}")
@@ -1,25 +1,48 @@
-import pandas as pd
+import numpy as np
 
+from price_store import select_prices
 
-def get_price_list(file_path):
-    power_prices_data = pd.read_csv(file_path)
+PERIODS_PER_DAY = 48  # 30-minute market periods
+
+STATISTICS = {
+    'mean': np.mean,
+    'median': np.median,
+    'std': np.std,
+    'min': np.min,
+    'max': np.max,
+}
 
-    power_prices_data.head()
 
-    # Creating a helper column for grouping by every two half-hour periods
-    power_prices_data['Hour_Group'] = (power_prices_data['PERIOD'] - 1) // 2
+def profile_from_prices(prices, periods_per_day=24, statistic='mean'):
+    # Daily profile of a price series with a whole number of days of 30-minute periods.
+    # The last axis is reshaped to (days, periods_per_day, periods per bucket): each bucket is
+    # averaged within the day, then `statistic` is taken across the days. Leading axes are kept,
+    # so (S, days * 48) scenario prices give (S, periods_per_day) profiles.
+    # statistic is a name of STATISTICS, a quantile in [0, 1] or a list of quantiles, which adds
+    # a leading quantile axis.
+    prices = np.asarray(prices, dtype=float)
+    if PERIODS_PER_DAY % periods_per_day:
+        raise ValueError(f"periods_per_day must divide {PERIODS_PER_DAY}, got {periods_per_day}")
+    if prices.shape[-1] % PERIODS_PER_DAY:
+        raise ValueError(f"Expected whole days of {PERIODS_PER_DAY} periods, got {prices.shape[-1]} periods")
 
-    # Grouping by date and Hour_Group, then calculating the average USEP for each hour
-    hourly_avg_prices_corrected = power_prices_data.groupby(['DATE', 'Hour_Group'])['USEP ($/MWh)'].mean().reset_index()
+    days = prices.shape[-1] // PERIODS_PER_DAY
+    buckets = prices.reshape(prices.shape[:-1] + (days, periods_per_day, -1)).mean(axis=-1)
 
-    # Rename columns for clarity
-    hourly_avg_prices_corrected.rename(columns={'Hour_Group': 'Hour', 'USEP ($/MWh)': 'Average_USEP'}, inplace=True)
+    if isinstance(statistic, str):
+        if statistic not in STATISTICS:
+            raise ValueError(f"Unknown statistic {statistic!r}, expected one of {tuple(STATISTICS)} or quantiles")
+        return STATISTICS[statistic](buckets, axis=-2)
+    return np.quantile(buckets, statistic, axis=-2)
 
-    # Display the first few rows of the corrected aggregated data
-    hourly_avg_prices_corrected.head()
 
-    # Grouping by the hour and calculating the average USEP across all days
-    average_hourly_price = hourly_avg_prices_corrected.groupby('Hour')['Average_USEP'].mean().reset_index()
+def price_profile(file_path, column='USEP', periods_per_day=24, statistic='mean', start_date=None, end_date=None,
+                  unit='MWh'):
+    # Profile of one price column of a USEP/WEP file, in $/MWh like the CSV or in $/kWh
+    prices = select_prices(file_path, column, start_date, end_date, unit=unit)
+    return profile_from_prices(prices, periods_per_day, statistic)
 
-    ctb_list = average_hourly_price['Average_USEP'].tolist()
-    return ctb_list
\ No newline at end of file
+
+def get_price_list(file_path):
+    # Average hourly USEP ($/MWh) across all days of the file
+    return price_profile(file_path).tolist()
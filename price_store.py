@@ -0,0 +1,111 @@
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from profiling import profiler
+
+# Cached, columnar store for the USEP/WEP price files.
+# Each CSV is parsed once into a structured NumPy array with one row per DATE and PERIOD and
+# one float column per '($/MWh)' price, converted to $/kWh and named without the unit
+# ('USEP', 'WEP', ...). The array is saved next to the CSV in .cache/<file>.npy and loaded
+# memory-mapped afterwards. The cache is rebuilt when the CSV's mtime and size changed and
+# its SHA-256 no longer matches. Tables are also kept in memory for the life of the process.
+
+_tables = {}
+
+
+def _parse_date(text):
+    for date_format in ('%d-%b-%Y', '%d-%b-%y'):
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            pass
+    raise ValueError(f"Unrecognized DATE {text!r}")
+
+
+def _sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def parse_price_csv(file_path):
+    with open(file_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        # Some exports end with empty ',,,' rows
+        rows = [row for row in reader if len(row) > 2 and row[1]]
+
+    price_columns = [(i, name.replace('($/MWh)', '').strip()) for i, name in enumerate(header) if name.endswith('($/MWh)')]
+    dtype = [('date', 'datetime64[D]'), ('period', 'i2')] + [(name, 'f8') for _, name in price_columns]
+
+    table = np.empty(len(rows), dtype=dtype)
+    table['date'] = [_parse_date(row[1]) for row in rows]
+    table['period'] = [int(row[2]) for row in rows]
+    for i, name in price_columns:
+        table[name] = np.array([row[i] for row in rows], dtype=float) / 1000
+    return table
+
+
+def load_price_table(file_path):
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    fingerprint = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    cached = _tables.get(file_path)
+    if cached is not None and cached[0] == fingerprint:
+        return cached[1]
+
+    cache_dir = os.path.join(os.path.dirname(file_path), '.cache')
+    table_path = os.path.join(cache_dir, os.path.basename(file_path) + '.npy')
+    meta_path = os.path.join(cache_dir, os.path.basename(file_path) + '.json')
+
+    meta = None
+    if os.path.exists(table_path) and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+    if meta is not None and all(meta.get(key) == value for key, value in fingerprint.items()):
+        valid = True
+    else:
+        # Touched or copied files keep their cache when the content is unchanged
+        fingerprint['sha256'] = _sha256(file_path)
+        valid = meta is not None and meta.get('sha256') == fingerprint['sha256']
+        if not valid:
+            os.makedirs(cache_dir, exist_ok=True)
+            # Write to temporary files and rename, so concurrent workers never read a partial cache
+            temporary = f'{table_path}.{os.getpid()}.tmp'
+            with open(temporary, 'wb') as f:
+                np.save(f, parse_price_csv(file_path))
+            os.replace(temporary, table_path)
+        with open(f'{meta_path}.{os.getpid()}.tmp', 'w') as f:
+            json.dump(fingerprint, f)
+        os.replace(f'{meta_path}.{os.getpid()}.tmp', meta_path)
+
+    table = np.load(table_path, mmap_mode='r')
+    _tables[file_path] = ({'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}, table)
+    return table
+
+
+def select_prices(file_path, column='USEP', start_date=None, end_date=None, periods=None, unit='kWh'):
+    # Prices of one column between two dates (inclusive, 'YYYY-MM-DD') and for some periods (1-48)
+    with profiler.stage('load'):
+        table = load_price_table(file_path)
+    mask = np.ones(len(table), dtype=bool)
+    if start_date is not None:
+        mask &= table['date'] >= np.datetime64(start_date, 'D')
+    if end_date is not None:
+        mask &= table['date'] <= np.datetime64(end_date, 'D')
+    if periods is not None:
+        mask &= np.isin(table['period'], periods)
+
+    prices = np.array(table[column][mask])
+    if unit == 'MWh':
+        return prices * 1000
+    return prices
@@ -0,0 +1,142 @@
+import json
+import os
+import time
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+# Opt-in per-stage timers for the model pipeline (load, build, sample, update, solve, extract,
+# write) and the solver statistics of every solve, tagged with the current scenario.
+#
+#   from profiling import profiler
+#   profiler.enable()
+#   with profiler.stage('solve'):
+#       battery_model.optimize()
+#   profiler.print_summary()
+#   profiler.write_trace('trace.json')
+#
+# Disabled (the default, or BATTERY_PROFILE=1 to enable) stage() returns one shared no-op
+# context manager and solver() returns at once. Worker processes of run_scenarios send their
+# events back with each result, so the summary covers the whole run.
+
+_NULL = nullcontext()
+
+
+def solver_stats(battery_model):
+    # Node count, MIP gap and runtime of the last solve of any battery model
+    if getattr(battery_model, 'cache_hit', None) is not None:
+        if battery_model.cache_hit:
+            return {'solver': 'cache'}
+        battery_model = battery_model.solver_model
+    if getattr(battery_model, 'used_fast_path', None) is not None:
+        if battery_model.used_fast_path:
+            return {'solver': 'fast'}
+        battery_model = battery_model.fallback_model
+    model = getattr(battery_model, 'gurobi_model', None) or getattr(battery_model, 'model', None)
+    if model is not None:
+        stats = {'solver': 'gurobi', 'runtime': model.Runtime}
+        if model.IsMIP:
+            stats.update(node_count=model.NodeCount, mip_gap=model.MIPGap if model.SolCount > 0 else None)
+        return stats
+    result = getattr(battery_model, 'highs_result', None)
+    if result is None:
+        return {'solver': 'highs'}
+    return {'solver': 'highs', 'node_count': getattr(result, 'mip_node_count', None),
+            'mip_gap': getattr(result, 'mip_gap', None)}
+
+
+class Profiler:
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.scenario = None
+        self.events = []  # (scenario, stage, start, seconds)
+        self.solves = []  # solver_stats() with the scenario
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        self.events, self.solves = [], []
+
+    def stage(self, name):
+        return self._timed(name) if self.enabled else _NULL
+
+    @contextmanager
+    def _timed(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.events.append((self.scenario, name, start, time.perf_counter() - start))
+
+    def solver(self, battery_model):
+        if self.enabled:
+            self.solves.append(dict(solver_stats(battery_model), scenario=self.scenario))
+
+    def take(self):
+        # Events since the last take(), for sending them from a worker process
+        if not self.enabled:
+            return None
+        taken = self.events, self.solves
+        self.reset()
+        return taken
+
+    def merge(self, taken):
+        if taken is not None:
+            self.events.extend(taken[0])
+            self.solves.extend(taken[1])
+
+    def summary(self):
+        # Per stage: calls, total, mean and max seconds, share of the timed total
+        stages = {}
+        for _, name, _, seconds in self.events:
+            stages.setdefault(name, []).append(seconds)
+        total = sum(sum(seconds) for seconds in stages.values()) or 1
+        summary = {name: {'calls': len(seconds), 'total': float(np.sum(seconds)), 'mean': float(np.mean(seconds)),
+                          'max': float(np.max(seconds)), 'share': float(np.sum(seconds)) / total}
+                   for name, seconds in stages.items()}
+
+        runtimes = [s['runtime'] for s in self.solves if s.get('runtime') is not None]
+        nodes = [s['node_count'] for s in self.solves if s.get('node_count') is not None]
+        gaps = [s['mip_gap'] for s in self.solves if s.get('mip_gap') is not None]
+        solver = {'solves': len(self.solves), 'fast_path': sum(s['solver'] == 'fast' for s in self.solves),
+                  'cached': sum(s['solver'] == 'cache' for s in self.solves)}
+        if runtimes:
+            solver['runtime'] = {'total': float(np.sum(runtimes)), 'mean': float(np.mean(runtimes))}
+        if nodes:
+            solver['node_count'] = {'mean': float(np.mean(nodes)), 'max': float(np.max(nodes))}
+        if gaps:
+            solver['mip_gap'] = {'mean': float(np.mean(gaps)), 'max': float(np.max(gaps))}
+        return {'stages': summary, 'solver': solver, 'scenarios': len({e[0] for e in self.events} - {None})}
+
+    def print_summary(self):
+        summary = self.summary()
+        print(f"{'stage':10} {'calls':>8} {'total s':>10} {'mean ms':>10} {'max ms':>10} {'share':>7}")
+        for name, stage in sorted(summary['stages'].items(), key=lambda item: -item[1]['total']):
+            print(f"{name:10} {stage['calls']:8d} {stage['total']:10.3f} {stage['mean'] * 1000:10.3f} "
+                  f"{stage['max'] * 1000:10.3f} {stage['share']:7.1%}")
+        solver = summary['solver']
+        line = f"{solver['solves']} solves, {solver['fast_path']} on the fast path, {solver['cached']} from the cache"
+        if 'runtime' in solver:
+            line += f", solver runtime {solver['runtime']['total']:.3f} s"
+        if 'node_count' in solver:
+            line += f", mean node count {solver['node_count']['mean']:.1f}"
+        if 'mip_gap' in solver:
+            line += f", max MIP gap {solver['mip_gap']['max']:.2e}"
+        print(line)
+
+    def write_trace(self, file_path):
+        # Every event and solve, with starts relative to the first event
+        origin = min((e[2] for e in self.events), default=0)
+        trace = {
+            'events': [{'scenario': scenario, 'stage': name, 'start': start - origin, 'seconds': seconds}
+                       for scenario, name, start, seconds in self.events],
+            'solves': self.solves,
+            'summary': self.summary(),
+        }
+        with open(file_path, 'w') as f:
+            json.dump(trace, f, default=lambda value: value.item() if isinstance(value, np.generic) else str(value))
+
+
+profiler = Profiler(enabled=os.environ.get('BATTERY_PROFILE', '') not in ('', '0'))
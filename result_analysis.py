@@ -0,0 +1,100 @@
+import numpy as np
+from scipy.stats import norm
+
+from battery_matrix import OPTIMAL
+from result_store import read_results
+
+# Analysis of Monte Carlo result sets stored by result_store.py.
+# Results are loaded as (samples,) cost columns and (samples, T) step arrays, every statistic
+# is one NumPy reduction over the sample axis and the plots are aggregated over samples, so
+# 100k-sample studies take seconds and give readable figures.
+
+COST_COLUMNS = ('cost_wo_battery', 'cost_w_battery', 'cost_diff')
+STEP_ARRAYS = ('price', 'battery_power', 'y2tch', 'y2td') + tuple(f'E_{i}_{j}' for i in range(3) for j in range(3))
+
+
+def load_result_arrays(directory, successful_only=True):
+    # Costs as (S,) arrays and steps as (S, T) arrays, S the number of (successful) samples
+    samples, steps = read_results(directory)
+    S = len(samples['sample'])
+    T = len(steps['t']) // S if S else 0
+
+    keep = samples['status'] == OPTIMAL if successful_only else np.ones(S, dtype=bool)
+    results = {name: samples[name][keep] for name in ('sample', 'status') + COST_COLUMNS}
+    for name in STEP_ARRAYS:
+        results[name] = steps[name].reshape(S, T)[keep]
+    return results
+
+
+def summarize(values, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), confidence=0.95):
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    mean = float(np.mean(values)) if n else np.nan
+    std = float(np.std(values, ddof=1)) if n > 1 else np.nan
+    # Normal approximation of the confidence interval of the mean
+    half_width = norm.ppf(0.5 + confidence / 2) * std / np.sqrt(n) if n > 1 else np.nan
+    return {
+        'n': n,
+        'mean': mean,
+        'median': float(np.median(values)) if n else np.nan,
+        'std': std,
+        'quantiles': dict(zip(quantiles, np.quantile(values, quantiles).tolist())) if n else {},
+        'ci': (mean - half_width, mean + half_width),
+    }
+
+
+def cost_summary(results, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), confidence=0.95):
+    return {name: summarize(results[name], quantiles, confidence) for name in COST_COLUMNS}
+
+
+def decision_frequency(results):
+    # Share of samples charging, discharging and idle in each period, (3, T) in that order
+    charge = np.mean(results['y2tch'] > 0.5, axis=0)
+    discharge = np.mean(results['y2td'] > 0.5, axis=0)
+    return np.vstack([charge, discharge, 1 - charge - discharge])
+
+
+def print_cost_summary(summary):
+    names = {'cost_wo_battery': 'Cost without battery', 'cost_w_battery': 'Cost with battery',
+             'cost_diff': 'Cost difference'}
+    for name, stats in summary.items():
+        quantiles = ', '.join(f"q{q:g}={value:.4f}" for q, value in stats['quantiles'].items())
+        print(f"{names[name]}: mean {stats['mean']:.4f} (CI {stats['ci'][0]:.4f} to {stats['ci'][1]:.4f}), "
+              f"median {stats['median']:.4f}, std {stats['std']:.4f}, {quantiles} over {stats['n']} samples")
+
+
+def plot_results(results, battery_capacity=None, bins=50, file_path=None):
+    # One figure: decision frequency heatmap, battery power density per period and cost savings density
+    import matplotlib.pyplot as plt
+
+    S, T = results['battery_power'].shape
+    fig, (ax_decision, ax_power, ax_saving) = plt.subplots(3, 1, figsize=(12, 12))
+
+    image = ax_decision.imshow(decision_frequency(results), aspect='auto', cmap='viridis', vmin=0, vmax=1,
+                               interpolation='nearest')
+    ax_decision.set_yticks(range(3), ['Charge', 'Discharge', 'Idle'])
+    ax_decision.set_xlabel('Time Step')
+    ax_decision.set_title(f'Share of {S} samples per decision and time step')
+    fig.colorbar(image, ax=ax_decision)
+
+    top = battery_capacity if battery_capacity is not None else max(float(np.nanmax(results['battery_power'])), 1)
+    density, _, _ = np.histogram2d(np.broadcast_to(np.arange(T), (S, T)).ravel(), results['battery_power'].ravel(),
+                                   bins=(T, bins), range=((-0.5, T - 0.5), (0, top)))
+    image = ax_power.imshow(density.T / S, origin='lower', aspect='auto', cmap='magma',
+                            extent=(-0.5, T - 0.5, 0, top), interpolation='nearest')
+    ax_power.set_xlabel('Time Step')
+    ax_power.set_ylabel('Battery Power (kWh)')
+    ax_power.set_title('Battery power density')
+    fig.colorbar(image, ax=ax_power)
+
+    ax_saving.hist(results['cost_diff'], bins=bins, density=True)
+    ax_saving.axvline(np.mean(results['cost_diff']), color='k', linestyle='--', label='Mean')
+    ax_saving.set_xlabel('Cost difference ($)')
+    ax_saving.set_ylabel('Density')
+    ax_saving.set_title('Cost savings with battery')
+    ax_saving.legend()
+
+    fig.tight_layout()
+    if file_path is not None:
+        fig.savefig(file_path)
+    return fig
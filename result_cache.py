@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from battery_matrix import INF_OR_UNBD, INFEASIBLE, OPTIMAL, SUBOPTIMAL, UNBOUNDED
+
+# Persistent, content-addressed cache of solved battery models.
+# The key is the SHA-256 of the input arrays (prices, demand, initial power, ... as float64
+# bytes) and the model parameters, the value is the status, objective value and solution (the
+# arrays of the model's solution()) in one .npz file per key. Reads refresh the file's mtime and writes
+# evict the least recently used files once the directory grows past max_bytes, so several
+# processes can share one directory.
+#
+#   BATTERY_CACHE=./data/.cache/results python m1_sell_back_48.py
+#
+# make_battery_model() wraps its model in CachedModel when a cache is given or BATTERY_CACHE is
+# set, the solver model is then only built on the first miss. One-shot solves (solve_fleet,
+# solve_stochastic) go through cached_solve(). Not cached on purpose: the DP engine (no solver
+# model) and the solver checks and benchmarks (benchmark.py, check_*.py, compare_solvers.py),
+# which exist to time or compare the solves themselves.
+
+_CACHE_VERSION = 3  # part of every key, bumped when the models' results change
+_UNKEYED_PARAMS = ('Threads', 'OutputFlag', 'LogToConsole')  # solver parameters that do not change results
+_FINAL_STATUSES = (OPTIMAL, INFEASIBLE, INF_OR_UNBD, UNBOUNDED)  # not time or node limits
+_SOLVED = (OPTIMAL, SUBOPTIMAL)  # statuses stored with their objective value and solution
+_SOLUTION_PREFIX = 'solution_'
+
+
+def _json_value(value):
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return str(value)
+
+
+def cache_key(*arrays, **params):
+    digest = hashlib.sha256(f'battery-cache-{_CACHE_VERSION}'.encode())
+    for values in arrays:
+        values = np.ascontiguousarray(values, dtype=np.float64)
+        digest.update(str(values.shape).encode())
+        digest.update(values.tobytes())
+    digest.update(json.dumps(params, sort_keys=True, default=_json_value).encode())
+    return digest.hexdigest()
+
+
+class ResultCache:
+
+    def __init__(self, directory, max_bytes=256 << 20):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None  # bytes in the directory, counted on the first write
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        # {'status', 'objVal', 'solution': {name: array} or None} or None
+        path = self._path(key)
+        try:
+            with np.load(path) as cached:
+                result = {name: cached[name] for name in cached.files}
+            os.utime(path)
+        except (FileNotFoundError, OSError, ValueError):
+            # Missing, evicted by another process or a partial file
+            self.misses += 1
+            return None
+        self.hits += 1
+        status = int(result['status'])
+        solution = {name[len(_SOLUTION_PREFIX):]: values for name, values in result.items()
+                    if name.startswith(_SOLUTION_PREFIX)}
+        return {'status': status, 'objVal': float(result['objVal']) if status in _SOLVED else None,
+                'solution': solution if status in _SOLVED else None}
+
+    def put(self, key, status, objVal=None, solution=None):
+        values = {'status': status, 'objVal': np.nan if objVal is None else objVal}
+        values.update({_SOLUTION_PREFIX + name: array for name, array in (solution or {}).items()})
+        path = self._path(key)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, **values)
+        size = os.path.getsize(temporary)
+        os.replace(temporary, path)
+
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += size
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.npz'):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        # Least recently used first, down to max_bytes
+        entries = sorted(self._entries())
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._size = 0
+
+
+_caches = {}
+
+
+def get_cache(cache=None):
+    # A ResultCache, a directory, None for BATTERY_CACHE (unset: no cache) or False for no cache
+    if cache is None:
+        cache = os.environ.get('BATTERY_CACHE') or False
+    if cache is False or isinstance(cache, ResultCache):
+        return cache or None
+    directory = os.path.abspath(os.fspath(cache))
+    if directory not in _caches:
+        _caches[directory] = ResultCache(directory)
+    return _caches[directory]
+
+
+class CachedModel:
+    # Drop-in for the battery models (update, optimize, Status, objVal, solution) that looks the
+    # inputs up in a ResultCache before solving and builds the model with build() on the first miss
+
+    def __init__(self, cache, build, prices, demand, **params):
+        self.cache = cache
+        self.build = build
+        self.params = params
+        self.T = len(prices)
+        self.prices = np.asarray(prices, dtype=float)[:self.T]
+        self.demand = np.broadcast_to(np.asarray(demand, dtype=float), (self.T,))
+        self.initial_power = 0
+        self.solver_model = None
+        self.solver_params = {}
+        self._battery = {}
+        self.Status = 0
+        self.objVal = None
+        self.cache_hit = False
+        self._solution = None
+
+    def update(self, prices=None, demand=None, initial_power=None):
+        if prices is not None:
+            self.prices = np.asarray(prices, dtype=float)[:self.T]
+        if demand is not None:
+            self.demand = np.broadcast_to(np.asarray(demand, dtype=float), (self.T,))
+        if initial_power is not None:
+            self.initial_power = initial_power
+
+    def set_param(self, name, value):
+        self.solver_params[name] = value
+        if self.solver_model is not None:
+            self.solver_model.set_param(name, value)
+
+    def set_battery(self, Beta_max=None, DC_AC_efficiency=None, selling_price_discount=None, total_battery_cost=None):
+        # MatrixBatteryModel.set_battery, passed on at the next miss
+        changes = {'Beta_max': Beta_max, 'DC_AC_efficiency': DC_AC_efficiency,
+                   'selling_price_discount': selling_price_discount, 'total_battery_cost': total_battery_cost}
+        changes = {name: value for name, value in changes.items() if value is not None}
+        self.params.update(changes)
+        self._battery.update(changes)
+
+    def shift_start(self, periods):
+        if self.solver_model is not None:
+            self.solver_model.shift_start(periods)
+
+    def key(self):
+        params = {name: value for name, value in self.solver_params.items() if name not in _UNKEYED_PARAMS}
+        return cache_key(self.prices, self.demand, self.initial_power, **self.params, solver_params=params)
+
+    def optimize(self):
+        key = self.key()
+        cached = self.cache.get(key)
+        self.cache_hit = cached is not None
+        if cached is not None:
+            self.Status, self.objVal, self._solution = cached['status'], cached['objVal'], cached['solution']
+            return self.Status
+
+        if self.solver_model is None:
+            self.solver_model = self.build()
+            for name, value in self.solver_params.items():
+                self.solver_model.set_param(name, value)
+        if self._battery:
+            self.solver_model.set_battery(**self._battery)
+            self._battery = {}
+        self.solver_model.update(self.prices, self.demand, self.initial_power)
+        self.Status = self.solver_model.optimize()
+        # BatteryModel.objVal raises without a solution, MatrixModel keeps the last optimal one
+        self.objVal = self.solver_model.objVal if self.Status == OPTIMAL else None
+        self._solution = None
+
+        if self.Status == OPTIMAL:
+            self._solution = self.solver_model.solution()
+        if self.Status in _FINAL_STATUSES:
+            self.cache.put(key, self.Status, self.objVal, self._solution)
+        return self.Status
+
+    def solution(self):
+        return self._solution
+
+
+def cached_solve(cache, solve, *arrays, **params):
+    # (status, objVal, solution) of solve() for a one-shot model, keyed by arrays and params.
+    # SUBOPTIMAL is kept when it comes with a solution, the deterministic result of a heuristic
+    # such as solve_fleet_decomposed(), and not when a solver gave up without one.
+    key = cache_key(*arrays, **params)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached['status'], cached['objVal'], cached['solution']
+    status, objVal, solution = solve()
+    if status in _FINAL_STATUSES:
+        cache.put(key, status, objVal if status == OPTIMAL else None, solution if status == OPTIMAL else None)
+    elif status == SUBOPTIMAL and solution is not None:
+        cache.put(key, status, objVal, solution)
+    return status, objVal, solution
@@ -0,0 +1,157 @@
+import glob
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from profiling import profiler
+
+# Columnar sink for the Monte Carlo results.
+# Finished scenarios are buffered and written every chunk_size samples as one .npz chunk with
+# two tables: one row per sample (sample, status, costs) and one row per sample and time step
+# (sample, t, price, battery_power, y2tch, y2td, E_i_j). Chunks are written to a temporary file
+# and renamed, so a crash loses at most the buffered samples, and a new writer on the same
+# directory reports the samples already stored through completed() so the run can resume.
+# The writer's fingerprint (seed, T, model and scenario parameters) is kept in run.json, a
+# directory holding another run's samples is only resumed when the fingerprints match.
+
+SAMPLE_COLUMNS = ('sample', 'status', 'cost_wo_battery', 'cost_w_battery', 'cost_diff')
+STEP_COLUMNS = ('sample', 't', 'price', 'battery_power', 'y2tch', 'y2td') + tuple(
+    f'E_{i}_{j}' for i in range(3) for j in range(3))
+
+
+def _chunk_paths(directory):
+    return sorted(glob.glob(os.path.join(directory, 'chunk_*.npz')))
+
+
+def _json_value(value):
+    # Arrays by their SHA-256, so long price vectors stay short in run.json
+    if isinstance(value, np.ndarray):
+        return 'sha256:' + hashlib.sha256(np.ascontiguousarray(value, dtype=np.float64).tobytes()).hexdigest()
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def run_fingerprint(fingerprint):
+    # The JSON form of a fingerprint dict, as stored in run.json
+    return json.loads(json.dumps(fingerprint, sort_keys=True, default=_json_value))
+
+
+def sample_record(sample, status, prices, cost_wo_battery, objective=None, solution=None):
+    # One scenario as flat arrays, the solution is the dict of BatteryModel.solution()
+    T = len(prices)
+    record = {
+        'sample': sample,
+        'status': status,
+        'cost_wo_battery': cost_wo_battery,
+        'cost_w_battery': np.nan if objective is None else objective,
+        'cost_diff': np.nan if objective is None else cost_wo_battery - objective,
+        'price': np.asarray(prices, dtype=float) / 1000,
+    }
+    for name in ('battery_power', 'y2tch', 'y2td'):
+        record[name] = np.full(T, np.nan) if solution is None else np.asarray(solution[name], dtype=float)
+    record['E'] = np.full((3, 3, T), np.nan) if solution is None else np.asarray(solution['E'], dtype=float)
+    return record
+
+
+class ResultWriter:
+
+    def __init__(self, directory, chunk_size=100, fingerprint=None, restart=False):
+        # A directory with the samples of a run whose fingerprint differs (or is unknown) raises
+        # ValueError, or is emptied first with restart=True
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.buffer = []
+        os.makedirs(directory, exist_ok=True)
+        chunks = _chunk_paths(directory)
+
+        if fingerprint is not None:
+            fingerprint = run_fingerprint(fingerprint)
+            run_path = os.path.join(directory, 'run.json')
+            stored = None
+            if os.path.exists(run_path):
+                with open(run_path) as f:
+                    stored = json.load(f)
+            if chunks and stored != fingerprint:
+                if not restart:
+                    raise ValueError(f"{directory} holds the results of a different run (seed or parameters "
+                                     f"changed), use another directory or restart=True to replace them")
+                for path in chunks:
+                    os.remove(path)
+                chunks = []
+            if stored != fingerprint:
+                temporary = f'{run_path}.{os.getpid()}.tmp'
+                with open(temporary, 'w') as f:
+                    json.dump(fingerprint, f, indent=1)
+                os.replace(temporary, run_path)
+        self.n_chunks = len(chunks)
+
+    def completed(self):
+        # Samples already written by this or an earlier run
+        done = set()
+        for path in _chunk_paths(self.directory):
+            with np.load(path) as chunk:
+                done.update(chunk['sample'].tolist())
+        return done
+
+    def append(self, record):
+        self.buffer.append(record)
+        if len(self.buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+        records, self.buffer = self.buffer, []
+        with profiler.stage('write'):
+            self._write_chunk(records)
+
+    def _write_chunk(self, records):
+        T = len(records[0]['price'])
+
+        columns = {name: np.array([r[name] for r in records]) for name in SAMPLE_COLUMNS}
+        columns['status'] = columns['status'].astype(np.int16)
+        columns['step_sample'] = np.repeat(columns['sample'], T)
+        columns['step_t'] = np.tile(np.arange(T, dtype=np.int32), len(records))
+        for name in ('price', 'battery_power', 'y2tch', 'y2td'):
+            columns[f'step_{name}'] = np.concatenate([r[name] for r in records])
+        E = np.stack([r['E'] for r in records])  # (n, 3, 3, T)
+        for i in range(3):
+            for j in range(3):
+                columns[f'step_E_{i}_{j}'] = E[:, i, j].ravel()
+
+        path = os.path.join(self.directory, f'chunk_{self.n_chunks:05d}.npz')
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, **columns)
+        os.replace(temporary, path)
+        self.n_chunks += 1
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_results(directory):
+    # (samples, steps) column dicts of every chunk, ordered by sample
+    chunks = []
+    for path in _chunk_paths(directory):
+        with np.load(path) as chunk:
+            chunks.append({name: chunk[name] for name in chunk.files})
+    if not chunks:
+        return {name: np.empty(0) for name in SAMPLE_COLUMNS}, {name: np.empty(0) for name in STEP_COLUMNS}
+
+    samples = {name: np.concatenate([c[name] for c in chunks]) for name in SAMPLE_COLUMNS}
+    steps = {name: np.concatenate([c[f'step_{name}'] for c in chunks]) for name in STEP_COLUMNS}
+
+    sample_order = np.argsort(samples['sample'], kind='stable')
+    step_order = np.lexsort((steps['t'], steps['sample']))
+    return ({name: column[sample_order] for name, column in samples.items()},
+            {name: column[step_order] for name, column in steps.items()})
@@ -0,0 +1,62 @@
+import time
+
+import numpy as np
+
+from battery_matrix import OPTIMAL, make_battery_model
+
+# Receding-horizon (model-predictive) dispatch over multi-day price files.
+# Each step solves a `window`-period model, commits its first `commit` periods and carries the
+# battery power at the end of them into the next window in place of InitialDischarge == 0.
+# The model is built once, every window only updates prices, demand and the initial power and
+# starts from the previous solution shifted by `commit` periods. Past the end of the data the
+# window sees the prices `window` periods earlier, a persistence forecast (the data repeated when
+# it is shorter than a window).
+
+
+def rolling_horizon(prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9, DC_AC_efficiency=1,
+                    window=48, commit=1, formulation='linear', solver='gurobi', initial_power=0, periods_per_day=48):
+    # total_battery_cost is per day, charged for N / periods_per_day days
+    prices = np.asarray(prices, dtype=float)
+    N = len(prices)
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), (N,))
+    # Persistence padding of window periods, repeating the data when it is shorter than a window
+    tail = (N - window + np.arange(window)) % N
+    padded_prices = np.concatenate([prices, prices[tail]])
+    padded_demand = np.concatenate([demand, demand[tail]])
+
+    battery_model = make_battery_model(padded_prices[:window], padded_demand[:window], Beta_max, total_battery_cost,
+                                       selling_price_discount, DC_AC_efficiency, formulation, solver=solver)
+
+    schedule = {'battery_power': np.zeros(N), 'y2tch': np.zeros(N), 'y2td': np.zeros(N), 'E': np.zeros((3, 3, N))}
+    latency = []
+    power = initial_power
+
+    for start in range(0, N, commit):
+        battery_model.update(prices=padded_prices[start:start + window], demand=padded_demand[start:start + window],
+                             initial_power=power)
+        if start > 0:
+            battery_model.shift_start(commit)
+
+        solve_start = time.perf_counter()
+        status = battery_model.optimize()
+        latency.append(time.perf_counter() - solve_start)
+        if status != OPTIMAL:
+            raise RuntimeError(f"Window starting at period {start} ended with status {status}")
+
+        solution = battery_model.solution()
+        n = min(commit, N - start)
+        for name in ('battery_power', 'y2tch', 'y2td'):
+            schedule[name][start:start + n] = solution[name][:n]
+        schedule['E'][:, :, start:start + n] = solution['E'][:, :, :n]
+
+        # Battery power at the start of the first uncommitted period
+        E = solution['E']
+        power = (solution['battery_power'][n - 1] - (E[1, 2, n - 1] + E[1, 0, n - 1]) / DC_AC_efficiency
+                 + DC_AC_efficiency * E[0, 1, n - 1])
+
+    E = schedule['E']
+    price_kwh = prices / 1000
+    schedule['cost'] = (np.sum(price_kwh * (E[0, 2] + E[0, 1])) - selling_price_discount * np.sum(price_kwh * E[1, 0])
+                        + total_battery_cost * N / periods_per_day)
+    schedule['latency'] = np.array(latency)
+    return schedule
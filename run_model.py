@@ -0,0 +1,306 @@
+import argparse
+import copy
+import csv
+import json
+import os
+
+import numpy as np
+
+# Single entry point for the battery models, as a Python API and a command line:
+#
+#   from run_model import run
+#   result = run('m1', config='configs/m1.toml', battery={'count': 2})
+#
+#   python run_model.py m1 --config configs/m1.toml --set battery.count=2
+#
+# Every model starts from DEFAULTS (the parameters of its original script), then the config
+# file (TOML, or YAML when PyYAML is installed), then keyword overrides. Prices and demand can
+# also be passed as arrays. Solvers, the Monte Carlo runner and matplotlib are imported inside
+# the model functions, so a DP or fast-path run does not load them.
+#
+# Models: m0 (no resell), m1 (resell), m1_demand (demand Monte Carlo), m2 (price forecast
+# error Monte Carlo), m3 (resell DP) and dp (charge/discharge DP of dynamic_programming.py).
+
+_COMMON = {
+    'time': {'periods': 48},  # 1 day, every 30 minutes
+    'prices': {'file': './data/USEP_08Nov2023.csv', 'column': 'USEP', 'start_date': None, 'end_date': None,
+               'periods_per_day': None},  # periods_per_day aggregates the file into a daily profile
+    'demand': {'mean': 111.87 * 0.5, 'std': 0},  # kWh per period
+    'battery': {'capacity_kwh': 150, 'count': 1, 'cost': 11.35, 'DC_AC_efficiency': 1,
+                'selling_price_discount': 0.9},
+    'solver': {'formulation': 'bilinear', 'solver': 'gurobi', 'fast_path': True,
+               'cache': None},  # result cache directory, None for BATTERY_CACHE, false for none
+    'output': {'file': None},
+}
+
+_MONTE_CARLO = {
+    'scenarios': {'sample_size': 1000, 'seed': 2023, 'workers': None, 'threads_per_worker': 1,
+                  'results_dir': None, 'restart': False,  # restart replaces the results of a different run
+                  'plot': False},
+}
+
+
+def _merge(base, override):
+    merged = copy.deepcopy(base)
+    for key, value in (override or {}).items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+DEFAULTS = {
+    'm0': _merge(_COMMON, {'battery': {'selling_price_discount': 0}}),
+    'm1': _COMMON,
+    'm1_demand': _merge(_merge(_COMMON, _MONTE_CARLO), {
+        'prices': {'file': './data/USEP_08Nov2023_to_14Nov2023.csv'},
+        'demand': {'std': 4.93},
+        'battery': {'DC_AC_efficiency': 0.94},
+        'scenarios': {'results_dir': './data/results_m2'},
+    }),
+    'm2': _merge(_merge(_COMMON, _MONTE_CARLO), {
+        'prices': {'file': './data/USEP_08Nov2023_to_14Nov2023.csv',
+                   'history_file': './data/WEP_10Oct2023_to_09Nov2023.csv',
+                   'error_model': None},  # None (global RMSE), 'independent', 'ar1' or 'cholesky'
+        'scenarios': {'results_dir': './data/results_m3_1'},
+    }),
+    'm3': _merge(_COMMON, {
+        'battery': {'cost': 16.93},
+        'solver': {'n_states': 2},  # resell_actions only reach an empty or a full battery
+    }),
+    'dp': _merge(_COMMON, {
+        'time': {'periods': 24},
+        'prices': {'periods_per_day': 24},
+        'demand': {'mean': 111.87, 'std': 9.86, 'seed': None},
+        'battery': {'cost': 1.41, 'charge_fraction': 0.5},  # cost per charge/discharge action
+        'solver': {'n_states': 1501},
+    }),
+}
+
+MODELS = tuple(DEFAULTS)
+
+
+def load_config(file_path):
+    if file_path.endswith(('.yaml', '.yml')):
+        import yaml
+
+        with open(file_path) as f:
+            return yaml.safe_load(f) or {}
+    import tomllib
+
+    with open(file_path, 'rb') as f:
+        return tomllib.load(f)
+
+
+def _prices(config):
+    # $/MWh as in the CSV files
+    from price_calculator import price_profile
+    from price_store import select_prices
+
+    prices_config = config['prices']
+    if prices_config['periods_per_day']:
+        prices = price_profile(prices_config['file'], prices_config['column'], prices_config['periods_per_day'],
+                               start_date=prices_config['start_date'], end_date=prices_config['end_date'])
+    else:
+        prices = select_prices(prices_config['file'], prices_config['column'], prices_config['start_date'],
+                               prices_config['end_date'], unit='MWh')
+    return prices[:config['time']['periods']]
+
+
+def _battery(config):
+    battery = config['battery']
+    return battery['capacity_kwh'] * battery['count'], battery['cost'] * battery['count']
+
+
+# ----------------------------------------------------------------
+# Models
+
+def _run_milp(config, prices, demand, resell):
+    from battery_matrix import OPTIMAL, make_battery_model
+
+    Beta_max, total_battery_cost = _battery(config)
+    solver = config['solver']
+    battery_model = make_battery_model(prices, demand, Beta_max, total_battery_cost,
+                                       config['battery']['selling_price_discount'],
+                                       config['battery']['DC_AC_efficiency'], solver['formulation'], resell,
+                                       solver['solver'], fast_path=solver['fast_path'], cache=solver['cache'])
+    status = battery_model.optimize()
+
+    cost_wo_battery = float(np.sum(demand * prices / 1000))
+    result = {'status': status, 'cost_wo_battery': cost_wo_battery}
+    if status == OPTIMAL:
+        result['solution'] = battery_model.solution()
+        result['cost_w_battery'] = battery_model.objVal
+        result['cost_diff'] = cost_wo_battery - battery_model.objVal
+        if config['output']['file']:
+            from schedule_output import schedule_array, write_schedule
+
+            write_schedule(config['output']['file'], schedule_array(prices, result['solution']))
+    return result
+
+
+# Settings that do not change the samples, left out of the results directory's fingerprint
+_RUN_ONLY = {'scenarios': {'sample_size', 'workers', 'threads_per_worker', 'results_dir', 'restart', 'plot'},
+             'solver': {'cache'}, 'output': {'file'}}
+
+
+def _run_monte_carlo(model, config, prices, scenario):
+    from functools import partial
+
+    from result_analysis import cost_summary, load_result_arrays
+    from result_store import ResultWriter
+    from scenario_runner import battery_setup, run_scenarios
+
+    Beta_max, total_battery_cost = _battery(config)
+    scenarios = config['scenarios']
+    setup = partial(battery_setup, prices=prices.tolist(), demand=config['demand']['mean'], Beta_max=Beta_max,
+                    total_battery_cost=total_battery_cost,
+                    selling_price_discount=config['battery']['selling_price_discount'],
+                    DC_AC_efficiency=config['battery']['DC_AC_efficiency'],
+                    formulation=config['solver']['formulation'], solver=config['solver']['solver'],
+                    cache=config['solver']['cache'])
+
+    fingerprint = {'model': model, 'prices': prices, 'config': {
+        section: {key: value for key, value in values.items() if key not in _RUN_ONLY.get(section, ())}
+        for section, values in config.items()}}
+    with ResultWriter(scenarios['results_dir'], fingerprint=fingerprint, restart=scenarios['restart']) as writer:
+        for record in run_scenarios(setup, scenario, scenarios['sample_size'], scenarios['seed'],
+                                    scenarios['workers'], scenarios['threads_per_worker'], skip=writer.completed()):
+            writer.append(record)
+
+    results = load_result_arrays(scenarios['results_dir'])
+    if scenarios['plot']:
+        from result_analysis import plot_results
+
+        plot_results(results, Beta_max, file_path=config['output']['file'])
+    return {'summary': cost_summary(results), 'results_dir': scenarios['results_dir']}
+
+
+def _run_dp(config, prices, demand, actions, n_states):
+    from dp_engine import solve
+
+    min_cost, decisions, levels = solve(prices / 1000, demand, actions, _battery(config)[0], n_states)
+    result = {'cost_w_battery': float(min_cost), 'cost_wo_battery': float(np.sum(demand * prices / 1000)),
+              'decisions': decisions, 'battery_level': levels}
+    if config['output']['file']:
+        with open(config['output']['file'], mode='w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['Time', 'Electricity Price', 'Battery Power', 'Battery Decision'])
+            for t in range(len(prices)):
+                writer.writerow([t, prices[t] / 1000, levels[t], decisions[t]])
+    return result
+
+
+def run(model=None, prices=None, demand=None, config=None, **overrides):
+    # model, then DEFAULTS[model] < config (file path or dict) < overrides (sections as dicts).
+    # prices and demand are arrays, or dicts overriding their config sections.
+    if isinstance(prices, dict):
+        overrides['prices'], prices = prices, None
+    if isinstance(demand, dict):
+        overrides['demand'], demand = demand, None
+    if isinstance(config, (str, os.PathLike)):
+        config = load_config(os.fspath(config))
+    config = dict(config or {})
+    model = model or config.pop('model', None)
+    config.pop('model', None)
+    if model not in DEFAULTS:
+        raise ValueError(f"Unknown model {model!r}, expected one of {MODELS}")
+    config = _merge(_merge(DEFAULTS[model], config), overrides)
+
+    prices = _prices(config) if prices is None else np.asarray(prices, dtype=float)
+    T = len(prices)
+
+    if model in ('m0', 'm1'):
+        demand = np.full(T, config['demand']['mean']) if demand is None else np.broadcast_to(demand, (T,))
+        return _run_milp(config, prices, np.asarray(demand, dtype=float), resell=model == 'm1')
+
+    if model == 'm1_demand':
+        from functools import partial
+
+        from scenario_runner import demand_scenario
+
+        scenario = partial(demand_scenario, prices=prices.tolist(), consumption_mean=config['demand']['mean'],
+                           consumption_std_dev=config['demand']['std'])
+        return _run_monte_carlo(model, config, prices, scenario)
+
+    if model == 'm2':
+        from functools import partial
+
+        from forecast_error import error_statistics
+        from scenario_runner import error_model_scenario, price_scenario
+
+        # Error of the historical forecast (WEP actual, USEP forecast) as the price deviation
+        error_stats = error_statistics(config['prices']['history_file'], 'WEP', 'USEP')
+        price_rmse = error_stats['rmse']
+        if config['prices']['error_model'] is None:
+            scenario = partial(price_scenario, price_nominal=prices, price_rmse=price_rmse,
+                               Ed=config['demand']['mean'])
+        else:
+            scenario = partial(error_model_scenario, price_nominal=prices, statistics=error_stats,
+                               method=config['prices']['error_model'], Ed=config['demand']['mean'])
+        result = _run_monte_carlo(model, config, prices, scenario)
+        result['price_rmse'] = price_rmse
+        return result
+
+    from dp_engine import charge_discharge_actions, resell_actions
+
+    capacity, total_battery_cost = _battery(config)
+    if model == 'm3':
+        demand = np.full(T, config['demand']['mean']) if demand is None else demand
+        actions = resell_actions(capacity, config['battery']['selling_price_discount'])
+        result = _run_dp(config, prices, np.asarray(demand, dtype=float), actions, config['solver']['n_states'])
+        result['cost_w_battery'] += total_battery_cost
+        return result
+
+    # dp
+    if demand is None:
+        rng = np.random.default_rng(config['demand']['seed'])
+        demand = rng.normal(config['demand']['mean'], config['demand']['std'], T)
+    actions = charge_discharge_actions(capacity, config['battery']['charge_fraction'], total_battery_cost)
+    return _run_dp(config, prices, np.asarray(demand, dtype=float), actions, config['solver']['n_states'])
+
+
+# ----------------------------------------------------------------
+# Command line
+
+def _parse_value(text):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return text
+
+
+def _printable(value):
+    if isinstance(value, dict):
+        return {key: _printable(v) for key, v in value.items() if key != 'solution'}
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a battery model")
+    parser.add_argument('model', nargs='?', choices=MODELS, help="model, or the 'model' key of the config")
+    parser.add_argument('--config', help="TOML or YAML config file")
+    parser.add_argument('--set', action='append', default=[], metavar='SECTION.KEY=VALUE',
+                        help="override one config value, e.g. battery.count=2 (JSON values)")
+    parser.add_argument('--output', help="output file, same as --set output.file=...")
+    args = parser.parse_args(argv)
+
+    overrides = {}
+    for item in args.set:
+        key, _, value = item.partition('=')
+        section, _, name = key.partition('.')
+        overrides.setdefault(section, {})[name] = _parse_value(value)
+    if args.output:
+        overrides.setdefault('output', {})['file'] = args.output
+
+    result = run(args.model, config=args.config, **overrides)
+    print(json.dumps(_printable(result), indent=2, default=str))
+
+
+if __name__ == '__main__':
+    main()
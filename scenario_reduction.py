@@ -0,0 +1,85 @@
+import numpy as np
+
+# Scenario reduction for the stochastic models.
+# Both methods compress N equally or unequally likely scenarios (rows of an (N, T) array) into
+# n representative ones with probabilities. Fast-forward selection keeps n of the original
+# scenarios, k-means returns cluster centroids.
+
+REDUCTION_METHODS = ('fast_forward', 'kmeans')
+
+
+def _distances(scenarios, centers):
+    # Euclidean distances (N, n) between the rows of both arrays
+    squared = (np.sum(scenarios ** 2, axis=1)[:, None] - 2 * scenarios @ centers.T
+               + np.sum(centers ** 2, axis=1)[None, :])
+    return np.sqrt(np.maximum(squared, 0))
+
+
+def fast_forward_selection(scenarios, n, probabilities=None):
+    # Heitsch & Roemisch forward selection: add the scenario that most reduces the
+    # probability-weighted distance of every scenario to its closest selected one, then move
+    # the probability of each dropped scenario to its closest selected one.
+    scenarios = np.asarray(scenarios, dtype=float)
+    N = len(scenarios)
+    probabilities = np.full(N, 1 / N) if probabilities is None else np.asarray(probabilities, dtype=float)
+    distance = _distances(scenarios, scenarios)
+
+    selected = []
+    closest = np.full(N, np.inf)  # distance of each scenario to the selected set
+    for _ in range(min(n, N)):
+        candidate = np.minimum(closest[:, None], distance)  # (N scenarios, N candidates)
+        objective = probabilities @ candidate
+        objective[selected] = np.inf
+        best = int(np.argmin(objective))
+        selected.append(best)
+        closest = candidate[:, best]
+
+    selected = np.array(selected)
+    assignment = np.argmin(distance[:, selected], axis=1)
+    return scenarios[selected], np.bincount(assignment, weights=probabilities, minlength=len(selected)), selected
+
+
+def kmeans_reduction(scenarios, n, probabilities=None, seed=None, iterations=100):
+    # Weighted Lloyd iterations from a k-means++ start
+    scenarios = np.asarray(scenarios, dtype=float)
+    N = len(scenarios)
+    n = min(n, N)
+    probabilities = np.full(N, 1 / N) if probabilities is None else np.asarray(probabilities, dtype=float)
+    rng = np.random.default_rng(seed)
+
+    centers = [scenarios[rng.choice(N, p=probabilities)]]
+    closest = _distances(scenarios, np.array(centers))[:, 0] ** 2
+    for _ in range(1, n):
+        weights = probabilities * closest
+        total = weights.sum()
+        index = rng.choice(N, p=weights / total) if total > 0 else rng.choice(N)
+        centers.append(scenarios[index])
+        closest = np.minimum(closest, np.sum((scenarios - scenarios[index]) ** 2, axis=1))
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+        assignment = np.argmin(_distances(scenarios, centers), axis=1)
+        weight = np.bincount(assignment, weights=probabilities, minlength=n)
+        moved = np.zeros_like(centers)
+        np.add.at(moved, assignment, probabilities[:, None] * scenarios)
+        # Empty clusters keep their center
+        occupied = weight > 0
+        moved[occupied] /= weight[occupied, None]
+        moved[~occupied] = centers[~occupied]
+        if np.allclose(moved, centers):
+            break
+        centers = moved
+
+    assignment = np.argmin(_distances(scenarios, centers), axis=1)
+    weight = np.bincount(assignment, weights=probabilities, minlength=n)
+    return centers[weight > 0], weight[weight > 0]
+
+
+def reduce_scenarios(scenarios, n, method='fast_forward', probabilities=None, seed=None):
+    # (n, T) representative scenarios and their probabilities
+    if method == 'fast_forward':
+        reduced, weight, _ = fast_forward_selection(scenarios, n, probabilities)
+        return reduced, weight
+    if method == 'kmeans':
+        return kmeans_reduction(scenarios, n, probabilities, seed)
+    raise ValueError(f"Unknown reduction method {method!r}, expected one of {REDUCTION_METHODS}")
@@ -0,0 +1,116 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+
+from battery_matrix import OPTIMAL, make_battery_model
+from forecast_error import price_paths
+from profiling import profiler
+from result_store import sample_record
+
+# Process-pool runner for the Monte Carlo studies.
+# Every scenario gets its own RNG stream spawned from one np.random.SeedSequence, so a seed
+# gives the same samples whatever the number of workers. Each worker process builds its
+# model once in setup(threads) and the results are yielded back in sample order. With the
+# profiler enabled, workers send their stage timings back with each result.
+
+_worker_state = None
+
+
+def _init_worker(setup, threads):
+    global _worker_state
+    _worker_state = setup(threads)
+
+
+def _run_scenario(scenario, task):
+    sample, seed_sequence = task
+    profiler.scenario = sample
+    return scenario(_worker_state, sample, np.random.default_rng(seed_sequence)), profiler.take()
+
+
+def run_scenarios(setup, scenario, sample_size, seed=None, workers=None, threads=1, chunksize=4, skip=()):
+    # Samples in skip, e.g. the ones already stored by an interrupted run, are not run again.
+    # The others keep their RNG stream.
+    skip = set(skip)
+    tasks = [task for task in enumerate(np.random.SeedSequence(seed).spawn(sample_size)) if task[0] not in skip]
+    workers = os.cpu_count() if workers is None else workers
+
+    if workers <= 1:
+        state = setup(threads)
+        for sample, seed_sequence in tasks:
+            profiler.scenario = sample
+            yield scenario(state, sample, np.random.default_rng(seed_sequence))
+        profiler.scenario = None
+        return
+
+    # Fork where available so the model scripts do not need a __main__ guard
+    start_methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context('fork' if 'fork' in start_methods else None)
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(setup, threads)) as executor:
+        for result, taken in executor.map(partial(_run_scenario, scenario), tasks, chunksize=chunksize):
+            profiler.merge(taken)
+            yield result
+
+
+# ----------------------------------------------------------------
+# Battery model scenarios
+
+def battery_setup(threads, **model_args):
+    with profiler.stage('build'):
+        battery_model = make_battery_model(**model_args)
+    # HiGHS milp has no thread setting and runs single-threaded
+    if model_args.get('solver', 'gurobi') == 'gurobi':
+        battery_model.set_param('Threads', threads)
+    return battery_model
+
+
+def _solve(battery_model):
+    with profiler.stage('solve'):
+        battery_model.optimize()
+    profiler.solver(battery_model)
+
+
+def sample_result(battery_model, sample, prices, cost_wo_battery):
+    prices = prices[:battery_model.T]
+    if battery_model.Status != OPTIMAL:
+        return sample_record(sample, battery_model.Status, prices, cost_wo_battery)
+    with profiler.stage('extract'):
+        solution = battery_model.solution()
+    return sample_record(sample, battery_model.Status, prices, cost_wo_battery, battery_model.objVal, solution)
+
+
+def demand_scenario(battery_model, sample, rng, prices, consumption_mean, consumption_std_dev):
+    with profiler.stage('sample'):
+        Ed = rng.normal(consumption_mean, consumption_std_dev, battery_model.T)
+    cost_wo_battery = float(np.sum(Ed * np.asarray(prices[:battery_model.T]) / 1000))
+
+    with profiler.stage('update'):
+        battery_model.update(demand=Ed)
+    _solve(battery_model)
+    return sample_result(battery_model, sample, prices, cost_wo_battery)
+
+
+def price_scenario(battery_model, sample, rng, price_nominal, price_rmse, Ed):
+    with profiler.stage('sample'):
+        prices = rng.normal(price_nominal[:battery_model.T], price_rmse)
+    cost_wo_battery = float(np.sum(Ed * prices / 1000))
+
+    with profiler.stage('update'):
+        battery_model.update(prices=prices)
+    _solve(battery_model)
+    return sample_result(battery_model, sample, prices, cost_wo_battery)
+
+
+def error_model_scenario(battery_model, sample, rng, price_nominal, statistics, method, Ed):
+    # price_scenario with a forecast_error.py error model
+    with profiler.stage('sample'):
+        prices = price_paths(price_nominal[:battery_model.T], statistics, 1, method, rng)[0]
+    cost_wo_battery = float(np.sum(Ed * prices / 1000))
+
+    with profiler.stage('update'):
+        battery_model.update(prices=prices)
+    _solve(battery_model)
+    return sample_result(battery_model, sample, prices, cost_wo_battery)
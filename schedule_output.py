@@ -0,0 +1,54 @@
+import csv
+
+import numpy as np
+
+# Battery schedules as one (T, 13) array: the price ($/kWh), battery power, charge and
+# discharge states and the 9 flows E[i,j] of every period, in the column order of the output
+# files. The console report and the CSV (or Parquet) outputs are written from the array, so a
+# solution is read from the model once, in bulk, and never per variable.
+
+SCHEDULE_COLUMNS = ('Electricity Price', 'Battery Power', 'ESS Charge', 'ESS Discharge') + tuple(
+    f'E[{i},{j}]' for i in range(3) for j in range(3))
+LABELS = ('Grid', 'ESS', 'Load')
+
+
+def schedule_array(prices, solution):
+    # prices in $/MWh, solution as returned by the battery models' solution()
+    T = len(solution['battery_power'])
+    return np.column_stack([np.asarray(prices[:T], dtype=float) / 1000, solution['battery_power'], solution['y2tch'],
+                            solution['y2td'], np.asarray(solution['E'], dtype=float).reshape(9, T).T])
+
+
+def print_schedule(schedule):
+    lines = []
+    for t, row in enumerate(schedule.tolist()):
+        lines.append(f"Time {t}: Electricity Price = {row[0]} ,Battery Power = {row[1]}, ESS Charge = {row[2]}, "
+                     f"ESS Discharge = {row[3]}")
+        for k in np.flatnonzero(schedule[t, 4:]):
+            lines.append(f"{LABELS[k // 3]} to {LABELS[k % 3]} at {t} = {row[4 + k]}")
+        lines.append('--------------------------------------------------')
+    print('\n'.join(lines))
+
+
+def write_schedule(file_path, schedule, extra_columns=None):
+    # Time column, the schedule columns, then extra_columns {name: (T,) values}.
+    # .parquet files need pyarrow, anything else is written as CSV.
+    extra_columns = extra_columns or {}
+    if file_path.endswith('.parquet'):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        columns = {'Time': np.arange(len(schedule))}
+        columns.update(zip(SCHEDULE_COLUMNS, schedule.T))
+        columns.update(extra_columns)
+        pq.write_table(pa.table(columns), file_path)
+        return
+
+    rows = schedule.tolist()
+    for values in extra_columns.values():
+        for row, value in zip(rows, np.asarray(values).tolist()):
+            row.append(value)
+    with open(file_path, mode='w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(('Time',) + SCHEDULE_COLUMNS + tuple(extra_columns))
+        writer.writerows([t] + row for t, row in enumerate(rows))
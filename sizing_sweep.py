@@ -0,0 +1,165 @@
+import csv
+import itertools
+import os
+from functools import partial
+
+import numpy as np
+
+from battery_matrix import OPTIMAL, MatrixBatteryModel
+from result_cache import CachedModel, get_cache
+from scenario_runner import run_scenarios
+
+# Battery sizing sweep over capacity, count, DC_AC_efficiency and selling_price_discount grids.
+# The operating cost (objective without the battery cost) only depends on the total capacity,
+# so every (efficiency, discount) group solves each distinct capacity * count once.
+#
+# The operating cost is non-increasing in the capacity, which prunes the grid:
+# - when the operating cost is the same at both ends of a capacity interval, it is the same
+#   everywhere inside it (the battery is saturated) and those points are not solved;
+# - when the operating cost at the right end plus the cheapest battery inside an interval
+#   cannot beat the best total cost found so far, the interval is not solved.
+# Pruned points are reported with status 'pruned' and NaN costs.
+#
+# Each group searches its capacity intervals in rounds: a round cuts every open interval of
+# every group into `sections` parts, solves the cut points in parallel through run_scenarios,
+# then prunes per group with the new costs. sections is 2 (bisection) with one worker and grows
+# with the workers per group, so a single group is spread over the workers too. More sections
+# solve more points in fewer rounds. Each worker resizes one built model between points.
+
+FRONTIER_COLUMNS = ('efficiency', 'selling_price_discount', 'capacity', 'count', 'total_capacity', 'battery_cost',
+                    'operating_cost', 'total_cost', 'status')
+
+
+def _battery_cost(battery_cost, capacity):
+    # Daily cost of one battery, a number or a function of its capacity
+    return battery_cost(capacity) if callable(battery_cost) else battery_cost
+
+
+class _CapacitySearch:
+    # Search of one group's sorted total capacities, next_points() gives the points whose
+    # operating costs the pruning needs next and record() takes their results
+
+    def __init__(self, total_capacities, min_battery_cost, prune=True, tolerance=1e-6, sections=2):
+        m = len(total_capacities)
+        self.min_battery_cost = min_battery_cost
+        self.prune = prune
+        self.tolerance = tolerance
+        self.sections = sections
+        self.operating = np.full(m, np.nan)  # NaN where pruned
+        self.status = np.full(m, 'pruned', dtype=object)
+        self.best = np.inf
+        self.ends = sorted({0, m - 1})
+        self.intervals = [(0, m - 1)]
+
+    def record(self, k, operating, status):
+        self.operating[k] = operating
+        self.status[k] = status
+        if np.isfinite(operating):
+            self.best = min(self.best, operating + self.min_battery_cost[k])
+
+    def next_points(self):
+        if self.ends:
+            points, self.ends = self.ends, []
+            return points
+
+        operating, best, tolerance = self.operating, self.best, self.tolerance
+        points, intervals = [], []
+        for i, j in self.intervals:
+            if j - i < 2:
+                continue
+            if self.prune and np.isfinite(operating[i]) and np.isfinite(operating[j]):
+                if operating[i] - operating[j] <= tolerance * abs(operating[i]):
+                    operating[i + 1:j] = operating[j]
+                    self.status[i + 1:j] = 'interpolated'
+                    continue
+                if operating[j] + np.min(self.min_battery_cost[i + 1:j]) >= best - tolerance * abs(best):
+                    continue
+            cuts = np.unique(i + (j - i) * np.arange(self.sections) // self.sections).tolist() + [j]
+            points.extend(cuts[1:-1])
+            intervals.extend(zip(cuts[:-1], cuts[1:]))
+        self.intervals = intervals
+        return points
+
+
+def _solve_point(battery_model, task, rng, points):
+    # Operating cost of one (efficiency, discount, total capacity) point
+    efficiency, selling_price_discount, total_capacity = points[task]
+    battery_model.set_battery(total_capacity, efficiency, selling_price_discount)
+    if battery_model.optimize() == OPTIMAL:
+        return task, battery_model.objVal, 'solved'
+    return task, np.nan, 'infeasible'
+
+
+def _sweep_setup(threads, prices, demand, Beta_max, resell, relax, solver, cache=None):
+    build = partial(MatrixBatteryModel, prices, demand, Beta_max, 0, DC_AC_efficiency=1, relax=relax, resell=resell,
+                    solver=solver, name="Sizing")
+    cache = get_cache(cache)
+    if cache is None:
+        battery_model = build()
+    else:
+        # Grid points solved by an earlier sweep are read from the cache
+        battery_model = CachedModel(cache, build, prices, demand, Beta_max=Beta_max, total_battery_cost=0,
+                                    selling_price_discount=0.9, DC_AC_efficiency=1, relax=relax, resell=resell,
+                                    solver=solver)
+    battery_model.set_param('Threads', threads)
+    return battery_model
+
+
+def sweep_sizes(prices, demand, capacities, counts=(1,), efficiencies=(1,), selling_price_discounts=(0.9,),
+                battery_cost=11.35, resell=True, relax=False, solver='highs', workers=1, threads=1, prune=True,
+                tolerance=1e-6, cache=None):
+    # Frontier table as a dict of columns, one row per grid point sorted by group and total capacity.
+    # battery_cost is the daily cost of one battery, a number or a function of its capacity.
+    points = [(capacity, count, count * _battery_cost(battery_cost, capacity))
+              for capacity, count in itertools.product(capacities, counts)]
+    groups = list(itertools.product(efficiencies, selling_price_discounts))
+
+    total_capacities = np.unique([capacity * count for capacity, count, _ in points])
+    min_battery_cost = np.array([min(cost for capacity, count, cost in points if capacity * count == total)
+                                 for total in total_capacities])
+    workers = os.cpu_count() if workers is None else workers
+    sections = max(2, workers // len(groups) + 1)
+    searches = [_CapacitySearch(total_capacities, min_battery_cost, prune, tolerance, sections) for _ in groups]
+
+    setup = partial(_sweep_setup, prices=prices, demand=demand, Beta_max=max(capacities) * max(counts),
+                    resell=resell, relax=relax, solver=solver, cache=cache)
+    while True:
+        # One round: the next points of every group, solved in parallel
+        tasks = [(g, k) for g, search in enumerate(searches) for k in search.next_points()]
+        if not tasks:
+            break
+        scenario = partial(_solve_point, points=[(*groups[g], total_capacities[k]) for g, k in tasks])
+        for task, operating, status in run_scenarios(setup, scenario, len(tasks), workers=min(workers, len(tasks)),
+                                                     threads=threads, chunksize=1):
+            g, k = tasks[task]
+            searches[g].record(k, operating, status)
+
+    frontier = {name: [] for name in FRONTIER_COLUMNS}
+    by_total = {total: k for k, total in enumerate(total_capacities)}
+    for (efficiency, selling_price_discount), search in zip(groups, searches):
+        for capacity, count, cost in sorted(points, key=lambda point: (point[0] * point[1], point[2])):
+            k = by_total[capacity * count]
+            row = (efficiency, selling_price_discount, capacity, count, capacity * count, cost, search.operating[k],
+                   search.operating[k] + cost, search.status[k])
+            for name, value in zip(FRONTIER_COLUMNS, row):
+                frontier[name].append(value)
+
+    return {name: np.array(values) for name, values in frontier.items()}
+
+
+def best_sizes(frontier):
+    # Row index of the cheapest total cost of each (efficiency, discount) group
+    best = {}
+    for k, key in enumerate(zip(frontier['efficiency'], frontier['selling_price_discount'])):
+        cost = frontier['total_cost'][k]
+        if np.isfinite(cost) and (key not in best or cost < frontier['total_cost'][best[key]]):
+            best[key] = k
+    return best
+
+
+def write_frontier(file_path, frontier):
+    with open(file_path, mode='w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow(FRONTIER_COLUMNS)
+        for row in zip(*(frontier[name] for name in FRONTIER_COLUMNS)):
+            writer.writerow(row)
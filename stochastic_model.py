@@ -0,0 +1,152 @@
+from functools import partial
+
+import numpy as np
+import scipy.sparse as sp
+
+from battery_matrix import OPTIMAL, VARIABLES, MatrixModel, battery_families, battery_upper_bounds
+from result_cache import cached_solve, get_cache
+
+# Two-stage stochastic battery model over K price (and demand) scenarios with probabilities.
+# The first-stage variables are shared by every scenario, the others are recourse decisions
+# taken per scenario. By default the charge/discharge commitments y2tch/y2td are first stage and
+# the energy flows are recourse, so the solution says when to charge and discharge and every
+# scenario chooses how much. A constraint family is repeated per scenario when it involves a
+# recourse variable and kept once otherwise. Same linear formulation as battery_matrix.py.
+#
+# With SCHEDULE the whole battery schedule is first stage and only the grid purchases E02 are
+# recourse. When only the prices vary E02 = demand - E12 is fixed by the schedule, so that
+# model is exactly the deterministic model at the probability-weighted mean price.
+
+FIRST_STAGE = ('y2tch', 'y2td')
+SCHEDULE = ('E01', 'E10', 'E12', 'battery_power', 'y2tch', 'y2td')
+
+
+def build_stochastic_matrices(T, K, Beta_max, DC_AC_efficiency=1, resell=True, relax=False,
+                              first_stage=FIRST_STAGE):
+    sizes = {name: T if name in first_stage else K * T for name in VARIABLES}
+    shared = sp.csr_matrix(np.ones((K, 1)))  # the same first-stage block in every scenario
+    per_scenario = sp.identity(K, format='csr')
+
+    blocks_rows = []
+    sense, rhs, rows = [], [], {}
+    row = 0
+    for name, blocks, family_sense, family_rhs in battery_families(T, Beta_max, DC_AC_efficiency):
+        if all(v in first_stage for v in blocks):
+            n_rows = T
+        else:
+            n_rows = K * T
+            blocks = {v: sp.kron(shared if v in first_stage else per_scenario, block, format='csr')
+                      for v, block in blocks.items()}
+        blocks_rows.append(sp.hstack([blocks.get(v, sp.csr_matrix((n_rows, size))) for v, size in sizes.items()]))
+        sense.append(np.full(n_rows, family_sense))
+        rhs.append(np.full(n_rows, float(family_rhs)))
+        rows[name] = np.arange(row, row + n_rows)
+        row += n_rows
+
+    upper = battery_upper_bounds(Beta_max, DC_AC_efficiency, resell)
+    lb = np.zeros(sum(sizes.values()))
+    ub = np.concatenate([np.full(size, upper[v], dtype=float) for v, size in sizes.items()])
+    integrality = np.concatenate([np.full(size, int(v in ('y2tch', 'y2td') and not relax)) for v, size in sizes.items()])
+
+    A = sp.vstack(blocks_rows, format='csr')
+    return A, np.concatenate(sense), np.concatenate(rhs), rows, lb, ub, integrality
+
+
+class StochasticBatteryModel(MatrixModel):
+
+    def __init__(self, prices, demand, Beta_max, total_battery_cost, probabilities=None, selling_price_discount=0.9,
+                 DC_AC_efficiency=1, relax=False, resell=True, first_stage=FIRST_STAGE, solver='highs',
+                 name="Stochastic", env=None):
+        if relax and DC_AC_efficiency != 1:
+            raise ValueError("The LP formulation is only exact when DC_AC_efficiency is 1")
+        super().__init__(total_battery_cost, solver, name, env)
+
+        prices = np.atleast_2d(np.asarray(prices, dtype=float))
+        self.K, self.T = K, T = prices.shape
+        self.first_stage = first_stage
+        self.selling_price_discount = selling_price_discount
+        self.sizes = {name: T if name in first_stage else K * T for name in VARIABLES}
+        self.A, self.sense, self.rhs, self.rows, self.lb, self.ub, self.integrality = build_stochastic_matrices(
+            T, K, Beta_max, DC_AC_efficiency, resell, relax, first_stage)
+        self.c = np.zeros(len(self.lb))
+
+        self.prices = prices
+        self.probabilities = np.full(K, 1 / K) if probabilities is None else np.asarray(probabilities, dtype=float)
+        self.update(prices, demand)
+
+    def _block(self, name):
+        start = 0
+        for v, size in self.sizes.items():
+            if v == name:
+                return slice(start, start + size)
+            start += size
+
+    def update(self, prices=None, demand=None, probabilities=None):
+        if prices is not None:
+            self.prices = np.atleast_2d(np.asarray(prices, dtype=float))[:, :self.T]
+        if probabilities is not None:
+            self.probabilities = np.asarray(probabilities, dtype=float)
+        if prices is not None or probabilities is not None:
+            # Probability-weighted prices of each scenario, summed over the scenarios for first-stage variables
+            weighted = self.probabilities[:, None] * self.prices / 1000
+            for name, factor in (('E01', 1), ('E02', 1), ('E10', -self.selling_price_discount)):
+                self.c[self._block(name)] = factor * (weighted.sum(axis=0) if name in self.first_stage else weighted.ravel())
+        if demand is not None:
+            load_rows = self.rows['LoadDemand']
+            shape = (self.T,) if len(load_rows) == self.T else (self.K, self.T)
+            self.rhs[load_rows] = np.broadcast_to(np.asarray(demand, dtype=float), shape).ravel()
+        self.push_data()
+
+    def solution(self):
+        # First-stage variables as (T,) arrays, recourse variables as (K, T) arrays
+        return {name: self.solution_x[self._block(name)].reshape(-1, self.T).squeeze(0) if name in self.first_stage
+                else self.solution_x[self._block(name)].reshape(self.K, self.T) for name in VARIABLES}
+
+
+def solve_stochastic(prices, demand, Beta_max, total_battery_cost, probabilities=None, selling_price_discount=0.9,
+                     DC_AC_efficiency=1, relax=False, resell=True, first_stage=FIRST_STAGE, solver='highs', cache=None):
+    # (status, objVal, solution) of one solve, cache as in make_battery_model()
+    cache = get_cache(cache)
+    if cache is not None:
+        prices = np.atleast_2d(np.asarray(prices, dtype=float))
+        probabilities = np.full(len(prices), 1 / len(prices)) if probabilities is None else probabilities
+        solve = partial(solve_stochastic, prices, demand, Beta_max, total_battery_cost, probabilities,
+                        selling_price_discount, DC_AC_efficiency, relax, resell, first_stage, solver, cache=False)
+        return cached_solve(cache, solve, prices, demand, probabilities, model='stochastic', Beta_max=Beta_max,
+                            total_battery_cost=total_battery_cost, selling_price_discount=selling_price_discount,
+                            DC_AC_efficiency=DC_AC_efficiency, relax=relax, resell=resell,
+                            first_stage=sorted(first_stage), solver=solver)
+
+    stochastic_model = StochasticBatteryModel(prices, demand, Beta_max, total_battery_cost, probabilities,
+                                              selling_price_discount, DC_AC_efficiency, relax, resell, first_stage,
+                                              solver)
+    status = stochastic_model.optimize()
+    if status != OPTIMAL:
+        return status, None, None
+    return status, stochastic_model.objVal, stochastic_model.solution()
+
+
+def schedule_costs(solution, prices, demand, total_battery_cost, selling_price_discount=0.9):
+    # Cost (S,) of a battery schedule on each of S price/demand samples, the flows are (T,) for
+    # one schedule or (S, T) for one per sample, the grid covers whatever load the battery does not
+    prices = np.atleast_2d(np.asarray(prices, dtype=float))
+    demand = np.broadcast_to(np.asarray(demand, dtype=float), prices.shape)
+    price_kwh = prices / 1000
+    grid = demand - solution['E12']
+    return (np.sum(price_kwh * (solution['E01'] + grid), axis=1)
+            - selling_price_discount * np.sum(price_kwh * solution['E10'], axis=1) + total_battery_cost)
+
+
+def commitment_costs(commitments, prices, demand, Beta_max, total_battery_cost, selling_price_discount=0.9,
+                     DC_AC_efficiency=1, resell=True, first_stage=FIRST_STAGE, solver='highs'):
+    # Cost (S,) on each of S samples when the first-stage variables are fixed to commitments
+    # ({name: (T,)}, e.g. a stochastic or nominal solution) and the recourse is optimized per
+    # sample, as one model with the samples as equally likely scenarios
+    prices = np.atleast_2d(np.asarray(prices, dtype=float))
+    model = StochasticBatteryModel(prices, demand, Beta_max, total_battery_cost, None, selling_price_discount,
+                                   DC_AC_efficiency, False, resell, first_stage, solver, name="Evaluation")
+    for name in first_stage:
+        model.lb[model._block(name)] = model.ub[model._block(name)] = commitments[name]
+    if model.optimize() != OPTIMAL:
+        raise RuntimeError(f"The commitments are infeasible, status {model.Status}")
+    return schedule_costs(model.solution(), prices, demand, total_battery_cost, selling_price_discount)
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+# The modules live at the repository root and read their data from ./data
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from price_store import select_prices  # noqa: E402
+
+T = 48  # 1 day, every 30 minutes
+Ed = 111.87 * 0.5
+Beta_max = 150
+total_battery_cost = 11.35
+selling_price_discount = 0.9
+
+
+def price_days(file_name, column, unit='MWh'):
+    prices = select_prices(os.path.join(ROOT, 'data', file_name), column, unit=unit)
+    return [prices[day * T:(day + 1) * T] for day in range(len(prices) // T)]
+
+
+@pytest.fixture(scope='session')
+def usep_day():
+    return price_days('USEP_08Nov2023.csv', 'USEP')[0]
+
+
+@pytest.fixture(scope='session')
+def wep_days():
+    return price_days('WEP_01Nov2023_to_07Nov2023.csv', 'WEP')
+
+
+@pytest.fixture(autouse=True)
+def no_environment_cache(monkeypatch):
+    # BATTERY_CACHE would answer the solves below from disk
+    monkeypatch.delenv('BATTERY_CACHE', raising=False)
@@ -0,0 +1,96 @@
+import os
+
+import numpy as np
+import pytest
+
+from battery_matrix import OPTIMAL, make_battery_model
+from conftest import ROOT, Beta_max, Ed, selling_price_discount, total_battery_cost
+from dp_engine import charge_discharge_actions, solve, solve_batch, solve_steps
+from price_calculator import get_price_list
+
+# The vectorized engine against the memoized recursion it replaced (dynamic_programming.py)
+
+
+def find_min_cost(prices, demand, battery_capacity, battery_cost):
+    memo = {}
+
+    def recurse(t, battery_level):
+        if t == len(prices):
+            return 0, [], []
+        if (t, battery_level) in memo:
+            return memo[(t, battery_level)]
+
+        new_level_charge = min(battery_level + 0.5 * battery_capacity, battery_capacity)
+        cost_charge, decisions_charge, levels_charge = recurse(t + 1, new_level_charge)
+        total_charge = 0.5 * battery_capacity * prices[t] + demand[t] * prices[t] + cost_charge + battery_cost
+
+        discharge_amount = min(battery_level, demand[t])
+        new_level_discharge = max(battery_level - discharge_amount, 0)
+        cost_discharge, decisions_discharge, levels_discharge = recurse(t + 1, new_level_discharge)
+        total_discharge = (demand[t] - discharge_amount) * prices[t] + cost_discharge + battery_cost
+
+        cost_nothing, decisions_nothing, levels_nothing = recurse(t + 1, battery_level)
+        total_nothing = demand[t] * prices[t] + cost_nothing
+
+        target = min(total_nothing, total_charge, total_discharge)
+        if target == total_nothing:
+            memo[(t, battery_level)] = (total_nothing, ['Do Nothing'] + decisions_nothing,
+                                        [battery_level] + levels_nothing)
+        elif target == total_charge:
+            memo[(t, battery_level)] = (total_charge, ['Charge'] + decisions_charge,
+                                        [new_level_charge] + levels_charge)
+        else:
+            memo[(t, battery_level)] = (total_discharge, ['Discharge'] + decisions_discharge,
+                                        [new_level_discharge] + levels_discharge)
+        return memo[(t, battery_level)]
+
+    return recurse(0, 0)
+
+
+@pytest.fixture(scope='module')
+def hourly_prices():
+    # $/kWh, the 24 hourly prices of dynamic_programming.py
+    return np.array(get_price_list(os.path.join(ROOT, 'data', 'USEP_08Nov2023.csv'))) / 1000
+
+
+@pytest.fixture(scope='module')
+def demand_draws():
+    # Draws as in dynamic_programming.py, the seeds where the next levels fall between grid
+    # levels and the value table interpolates first, then random ones
+    seeds = (131, 334, 338, 578) + tuple(range(36))
+    return np.array([np.random.RandomState(seed).normal(111.87, 9.86, 24) for seed in seeds])
+
+
+@pytest.mark.parametrize('battery_cost', [0, 1.41, 5])
+def test_solve_matches_recursion(hourly_prices, demand_draws, battery_cost):
+    prices = hourly_prices
+    actions = charge_discharge_actions(Beta_max, 0.5, battery_cost)
+    for demand in demand_draws:
+        expected_cost, expected_decisions, expected_levels = find_min_cost(prices, demand, Beta_max, battery_cost)
+        min_cost, decisions, levels = solve(prices, demand, actions, Beta_max)
+        assert decisions == expected_decisions
+        assert np.allclose(levels, expected_levels)
+        assert min_cost == pytest.approx(expected_cost, abs=1e-9)
+
+
+def test_solve_batch_matches_solve(hourly_prices, demand_draws):
+    prices = np.tile(hourly_prices, (len(demand_draws), 1))
+    actions = charge_discharge_actions(Beta_max, 0.5, 1.41)
+    min_cost, decisions, levels = solve_batch(prices, demand_draws, actions, Beta_max, batch_size=7)
+    for s, demand in enumerate(demand_draws):
+        expected_cost, expected_decisions, expected_levels = solve(prices[s], demand, actions, Beta_max)
+        assert [actions[a][0] for a in decisions[s]] == expected_decisions
+        assert np.allclose(levels[s], expected_levels)
+        assert min_cost[s] == pytest.approx(expected_cost, abs=1e-9)
+
+
+@pytest.mark.parametrize('DC_AC_efficiency, resell', [(1, True), (0.94, True), (1, False)])
+def test_solve_steps_is_close_to_milp(usep_day, DC_AC_efficiency, resell):
+    # Steps of 1.5 kWh cannot stop exactly at the demand, the MILP can
+    min_cost, _, levels = solve_steps(usep_day / 1000, Ed, Beta_max, 1.5, selling_price_discount=selling_price_discount,
+                                      DC_AC_efficiency=DC_AC_efficiency, resell=resell)
+    battery_model = make_battery_model(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount,
+                                       DC_AC_efficiency, 'linear', resell, solver='highs')
+    assert battery_model.optimize() == OPTIMAL
+    assert battery_model.objVal - 1e-6 <= min_cost + total_battery_cost <= battery_model.objVal + 1
+    assert np.all((levels >= 0) & (levels <= Beta_max))
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+from battery_matrix import INFEASIBLE, OPTIMAL, MatrixBatteryModel, make_battery_model
+from conftest import Beta_max, Ed, selling_price_discount, total_battery_cost
+from fast_dispatch import arbitrage_schedule
+
+# The solver-free dispatch against the MILP (LP formulation, exact with DC_AC_efficiency 1)
+
+
+@pytest.mark.parametrize('resell', [False, True])
+def test_fast_path_matches_milp(wep_days, resell):
+    for prices in wep_days:
+        cost, solution = arbitrage_schedule(prices, Ed, Beta_max, total_battery_cost, selling_price_discount, resell)
+        battery_model = MatrixBatteryModel(prices, Ed, Beta_max, total_battery_cost, selling_price_discount,
+                                           relax=True, resell=resell)
+        assert battery_model.optimize() == OPTIMAL
+        assert cost == pytest.approx(battery_model.objVal, rel=1e-6)
+        assert np.all((solution['battery_power'] >= -1e-9) & (solution['battery_power'] <= Beta_max + 1e-9))
+
+
+@pytest.mark.parametrize('initial_power', [0, 60, Beta_max])
+def test_fast_path_initial_power(usep_day, initial_power):
+    fast = make_battery_model(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 1, 'linear',
+                              solver='highs', fast_path=True)
+    milp = make_battery_model(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 1, 'linear',
+                              solver='highs')
+    for battery_model in (fast, milp):
+        battery_model.update(initial_power=initial_power)
+        assert battery_model.optimize() == OPTIMAL
+    assert fast.used_fast_path
+    assert fast.objVal == pytest.approx(milp.objVal, rel=1e-6)
+
+
+@pytest.mark.parametrize('initial_power', [-1, Beta_max + 50])
+def test_initial_power_outside_capacity_is_left_to_milp(usep_day, initial_power):
+    assert arbitrage_schedule(usep_day, Ed, Beta_max, total_battery_cost, initial_power=initial_power) is None
+    battery_model = make_battery_model(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 1,
+                                       'linear', solver='highs', fast_path=True)
+    battery_model.update(initial_power=initial_power)
+    assert battery_model.optimize() == INFEASIBLE
+    assert not battery_model.used_fast_path
+    assert battery_model.objVal is None
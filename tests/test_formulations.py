@@ -0,0 +1,44 @@
+import pytest
+
+from battery_matrix import OPTIMAL, make_battery_model
+from conftest import Beta_max, Ed, selling_price_discount, total_battery_cost
+
+# The linear formulations against the bilinear one (check_formulations.py on a few days).
+# The bilinear model is solved by Gurobi on 16-period windows, the largest the size-limited
+# license takes, and skipped without gurobipy.
+
+CASES = [
+    # (DC_AC_efficiency, resell)
+    (1, False),
+    (1, True),
+    (0.94, True),
+]
+
+
+def objective(prices, formulation, DC_AC_efficiency, resell, solver='highs', builder=None):
+    battery_model = make_battery_model(prices, Ed, Beta_max, total_battery_cost, selling_price_discount,
+                                       DC_AC_efficiency, formulation, resell, solver, builder=builder)
+    if solver == 'gurobi':
+        battery_model.set_param('OutputFlag', 0)
+        battery_model.set_param('MIPGap', 0)
+    assert battery_model.optimize() == OPTIMAL
+    return battery_model.objVal
+
+
+@pytest.mark.parametrize('DC_AC_efficiency, resell', CASES)
+def test_linear_forms_agree_on_highs(wep_days, DC_AC_efficiency, resell):
+    for prices in wep_days[:3]:
+        linear = objective(prices, 'linear', DC_AC_efficiency, resell)
+        # On HiGHS the bilinear formulation is solved through its exact linear form
+        assert objective(prices, 'bilinear', DC_AC_efficiency, resell) == pytest.approx(linear, rel=1e-6)
+        if DC_AC_efficiency == 1:
+            assert objective(prices, 'lp', DC_AC_efficiency, resell) == pytest.approx(linear, rel=1e-6)
+
+
+@pytest.mark.parametrize('DC_AC_efficiency, resell', CASES)
+def test_linear_matches_gurobi_bilinear(usep_day, DC_AC_efficiency, resell):
+    pytest.importorskip('gurobipy')
+    for start in (0, 16, 32):
+        prices = usep_day[start:start + 16]
+        bilinear = objective(prices, 'bilinear', DC_AC_efficiency, resell, 'gurobi', 'tupledict')
+        assert objective(prices, 'linear', DC_AC_efficiency, resell) == pytest.approx(bilinear, rel=1e-6)
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from battery_matrix import INFEASIBLE, OPTIMAL, SUBOPTIMAL, make_battery_model
+from conftest import Beta_max, Ed, selling_price_discount, total_battery_cost
+from result_cache import ResultCache, cache_key, cached_solve
+
+
+def test_cached_model_hit_and_miss(tmp_path, usep_day):
+    cache = ResultCache(tmp_path)
+    battery_model = make_battery_model(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 0.94,
+                                       'linear', solver='highs', cache=cache)
+    assert battery_model.optimize() == OPTIMAL
+    assert not battery_model.cache_hit
+    objVal, solution = battery_model.objVal, battery_model.solution()
+
+    # A new model with the same inputs is answered from disk without building the solver model
+    again = make_battery_model(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 0.94, 'linear',
+                               solver='highs', cache=cache)
+    assert again.optimize() == OPTIMAL
+    assert again.cache_hit and again.solver_model is None
+    assert again.objVal == objVal
+    assert all(np.array_equal(again.solution()[name], values) for name, values in solution.items())
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Any input change is a new key
+    again.update(initial_power=20)
+    assert again.optimize() == OPTIMAL
+    assert not again.cache_hit
+
+
+def test_infeasible_status_is_cached_without_a_solution(tmp_path, usep_day):
+    cache = ResultCache(tmp_path)
+    for expected_hit in (False, True):
+        battery_model = make_battery_model(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 1,
+                                           'linear', solver='highs', cache=cache)
+        battery_model.update(initial_power=Beta_max + 50)
+        assert battery_model.optimize() == INFEASIBLE
+        assert battery_model.cache_hit == expected_hit
+        assert battery_model.objVal is None and battery_model.solution() is None
+
+
+def test_eviction_keeps_recently_used_entries(tmp_path):
+    cache = ResultCache(tmp_path)
+    solution = {'x': np.zeros(1000)}
+    for n in range(3):
+        cache.put(cache_key(np.array([n])), OPTIMAL, float(n), solution)
+        os.utime(cache._path(cache_key(np.array([n]))), ns=(n * 10 ** 9, n * 10 ** 9))
+    entry_size = cache.size() // 3
+
+    # Reading the oldest entry makes it the most recent, the next oldest goes first
+    assert cache.get(cache_key(np.array([0])))['objVal'] == 0
+    cache.max_bytes = 3 * entry_size
+    cache.put(cache_key(np.array([3])), OPTIMAL, 3.0, solution)
+    assert cache.get(cache_key(np.array([1]))) is None
+    assert [cache.get(cache_key(np.array([n])))['objVal'] for n in (0, 2, 3)] == [0, 2, 3]
+    assert cache.size() <= cache.max_bytes
+
+
+def test_cached_solve_keeps_heuristic_results(tmp_path):
+    cache = ResultCache(tmp_path)
+    calls = []
+
+    def solve(status, solution):
+        calls.append(status)
+        return status, None if solution is None else 1.5, solution
+
+    for _ in range(2):
+        assert cached_solve(cache, lambda: solve(SUBOPTIMAL, {'x': np.ones(3)}), np.ones(3), model='a')[1] == 1.5
+        # A solver that stopped without a solution is asked again
+        assert cached_solve(cache, lambda: solve(SUBOPTIMAL, None), np.ones(3), model='b') == (SUBOPTIMAL, None, None)
+    assert calls == [SUBOPTIMAL] * 3
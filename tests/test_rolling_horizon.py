@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from battery_matrix import OPTIMAL, make_battery_model
+from conftest import Beta_max, Ed, selling_price_discount, total_battery_cost
+from rolling_horizon import rolling_horizon
+
+
+@pytest.mark.parametrize('N, commit', [(1, 1), (30, 1), (47, 5), (48, 4)])
+def test_short_input(usep_day, N, commit):
+    schedule = rolling_horizon(usep_day[:N], Ed, Beta_max, total_battery_cost, selling_price_discount, 0.94,
+                               window=48, commit=commit, solver='highs')
+    assert len(schedule['battery_power']) == N
+    assert len(schedule['latency']) == -(-N // commit)
+    assert np.all((schedule['battery_power'] >= -1e-9) & (schedule['battery_power'] <= Beta_max + 1e-9))
+
+
+def test_one_window_is_the_day_model(usep_day):
+    # Committing the whole day at once is the single-day MILP
+    schedule = rolling_horizon(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 0.94,
+                               window=48, commit=48, solver='highs')
+    battery_model = make_battery_model(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 0.94,
+                                       'linear', solver='highs')
+    assert battery_model.optimize() == OPTIMAL
+    assert schedule['cost'] == pytest.approx(battery_model.objVal, rel=1e-6)
+
+
+def test_battery_cost_per_day(usep_day):
+    # The daily battery cost is charged for N / periods_per_day days
+    hourly = rolling_horizon(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 0.94, window=24,
+                             commit=24, solver='highs', periods_per_day=24)
+    half_hourly = rolling_horizon(usep_day, Ed, Beta_max, total_battery_cost, selling_price_discount, 0.94,
+                                  window=24, commit=24, solver='highs')
+    assert hourly['cost'] - half_hourly['cost'] == pytest.approx(total_battery_cost)
@@ -0,0 +1,30 @@
+import numpy as np
+
+from conftest import Ed
+from sizing_sweep import best_sizes, sweep_sizes
+
+CAPACITIES = [25, 50, 75, 100, 150, 200, 300]
+COUNTS = [1, 2, 3]
+
+
+def battery_cost(capacity):
+    return 11.35 * capacity / 150
+
+
+def test_pruned_sweep_finds_the_exhaustive_best(usep_day):
+    full = sweep_sizes(usep_day, Ed, CAPACITIES, COUNTS, battery_cost=battery_cost, prune=False)
+    pruned = sweep_sizes(usep_day, Ed, CAPACITIES, COUNTS, battery_cost=battery_cost)
+    assert np.all(full['status'] == 'solved')
+    assert np.sum(pruned['status'] == 'solved') < len(pruned['status'])
+    for key, k in best_sizes(full).items():
+        assert pruned['total_cost'][best_sizes(pruned)[key]] == full['total_cost'][k]
+
+
+def test_one_group_over_several_workers(usep_day):
+    # More workers cut the intervals into more sections: other points are solved, the same best
+    serial = sweep_sizes(usep_day, Ed, CAPACITIES, COUNTS, battery_cost=battery_cost, workers=1)
+    parallel = sweep_sizes(usep_day, Ed, CAPACITIES, COUNTS, battery_cost=battery_cost, workers=3)
+    solved = (serial['status'] == 'solved') & (parallel['status'] == 'solved')
+    assert np.allclose(serial['total_cost'][solved], parallel['total_cost'][solved])
+    [serial_best], [parallel_best] = best_sizes(serial).values(), best_sizes(parallel).values()
+    assert parallel['total_cost'][parallel_best] == serial['total_cost'][serial_best]